@@ -1,23 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, session
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func, text
 from flask_login import LoginManager, UserMixin, login_user, login_required, current_user, logout_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import email_service
+import email_outbox
+import sales_rollup
+import ticket_store
 from geopy.geocoders import Nominatim
 import os
+import threading
+import time
 
 # --- IMPORT CRITIC: Motorul de Rutare ---
 # Asigura-te ca ai fisierul routing_engine.py in acelasi folder!
 import routing_engine 
+import geocoding
+import jobs
+import live_index
+import live_feed
+import trip_segments
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'cheie_secreta_bucuresti'
 
 # --- CONFIGURARE BAZA DE DATE ---
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://postgres:@localhost/transport_times'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://postgres:@localhost/transport_times')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Starea job-urilor de rutare asincrone (fișier SQLite comun tuturor workerilor de pe aceeași mașină)
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', jobs.JOBS_DB)
+# Fluxuri live (SSE) deschise per proces; fiecare ține ocupat un worker / thread cât e deschis.
+# Cu workeri sync (gunicorn fără -k gthread / gevent) setați LIVE_STREAM_MAX=0: hărțile folosesc polling.
+app.config['LIVE_STREAM_MAX'] = int(os.environ.get('LIVE_STREAM_MAX', live_feed.MAX_SUBSCRIBERS))
+# Cache-ul persistent al geocodării (SQLite)
+app.config['GEOCODE_CACHE'] = os.environ.get('GEOCODE_CACHE', geocoding.CACHE_FILE)
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -31,13 +48,60 @@ db_params_routing = {
     "host": "localhost"
 }
 
+# Motorul de graf: 'networkx' (implicit) sau 'csr' (array-uri NumPy, memorie mult mai mică)
+ROUTING_ENGINE = os.environ.get('ROUTING_ENGINE', 'networkx')
+# Căutarea drumului: 'dijkstra' (implicit), 'astar', 'bidirectional' sau 'ch' (preprocesare la încărcare);
+# toate dau același rezultat, diferă doar numărul de noduri vizitate
+ROUTING_ALGORITHM = os.environ.get('ROUTING_ALGORITHM', 'dijkstra')
+# Legarea adreselor de rețea: 'nearest' (cea mai apropiată stație) sau 'multi' (mai multe stații din jur)
+ROUTING_SNAP = os.environ.get('ROUTING_SNAP', 'nearest')
+
+def _new_transport_graph():
+    return routing_engine.TransportGraph(db_params_routing, engine=ROUTING_ENGINE,
+                                         algorithm=ROUTING_ALGORITHM, snap=ROUTING_SNAP)
+
 # Inițializăm graful global (Se încarcă la pornirea serverului)
 try:
-    transport_graph = routing_engine.TransportGraph(db_params_routing)
+    transport_graph = _new_transport_graph()
 except Exception as e:
     print(f"ATENTIE: Graful nu s-a putut initializa (poate baza de date e goala?): {e}")
     transport_graph = None
 
+def _activate_graph(new_graph):
+    # Schimbul e o singură atribuire: cererile în curs termină pe graful vechi, cele noi îl văd pe cel nou
+    global transport_graph
+    old_graph, transport_graph = transport_graph, new_graph
+    if old_graph is not None and old_graph is not new_graph:
+        old_graph.retire()  # procesele od_matrix ale grafului vechi se opresc după lucrul în curs
+        _reset_live_index()  # regenerarea a citit date GTFS noi; harta live le încarcă la următoarea cerere
+
+# Geocodare: gazetar din numele stațiilor, apoi cache persistent, apoi Nominatim (un singur client)
+geocoder = geocoding.Geocoder(
+    Nominatim(user_agent="app_transport_bucuresti_proiect_v5", timeout=geocoding.GEOCODE_TIMEOUT),
+    cache=geocoding.GeocodeCache(app.config['GEOCODE_CACHE']),
+    gazetteer=lambda: transport_graph.gazetteer() if transport_graph else None
+)
+
+# Calculele de rută pornite prin /calculate_route/async (pool mărginit, rezultatele țin câteva minute).
+# Starea job-urilor stă în fișierul SQLite app.config['JOBS_DB'], comun tuturor workerilor,
+# ca interogarea /calculate_route/jobs/<id> să poată ajunge la oricare proces.
+route_jobs = jobs.JobRunner(max_workers=4, max_pending=64, ttl=300, name='route',
+                            store=jobs.JobStore(app.config['JOBS_DB'], ttl=300))
+
+graph_rebuilder = routing_engine.GraphRebuilder(
+    _new_transport_graph,
+    on_ready=_activate_graph
+)
+
+def _patch_graph(*route_names):
+    """ Aplică pe graful încărcat modificarea rutelor (doar straturile lor), fără regenerare completă """
+    if not transport_graph or not transport_graph.is_loaded: return  # la încărcare citește oricum datele noi
+    try:
+        transport_graph.refresh_route_layers(*[name for name in route_names if name])
+    except Exception as e:
+        print(f"⚠️ Actualizare incrementală graf eșuată: {e}")
+        flash("Graful de rutare nu a putut fi actualizat; folosește Reset Cache.", "warning")
+
 @login_manager.user_loader
 def load_user(user_id):
     return Users.query.get(int(user_id))
@@ -61,6 +125,19 @@ class Ticket(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.now)
     expire_time = db.Column(db.DateTime, nullable=False)
     user = db.relationship('Users', backref=db.backref('tickets', lazy=True))
+    # portofelul caută biletele unui utilizator care nu au expirat încă
+    __table_args__ = (db.Index('ix_tickets_user_expire', 'user_id', 'expire_time'),)
+
+class TicketArchive(db.Model):
+    """ Biletele expirate, mutate periodic din tickets (vezi ticket_store.py); același id ca în tickets """
+    __tablename__ = 'tickets_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    type = db.Column(db.String(50), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime)
+    expire_time = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
 
 class Route(db.Model):
     __tablename__ = 'routes'
@@ -75,6 +152,60 @@ class SoldTickets(db.Model):
     price = db.Column(db.Numeric(10,2))
     purchase_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SalesRollup(db.Model):
+    """ Vânzările agregate pe tip de bilet și oră / zi / total (vezi sales_rollup.py) """
+    __tablename__ = 'sales_rollup'
+    period = db.Column(db.String(4), primary_key=True)  # hour | day | all
+    bucket = db.Column(db.DateTime, primary_key=True)
+    ticket_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class EmailOutbox(db.Model):
+    """ Emailuri de trimis în fundal (vezi email_outbox.py) """
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON cu datele mesajului (ex: detaliile biletului)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending | sending | sent | dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),)
+
+# Trimiterea emailurilor: un singur thread, o conexiune SMTP refolosită
+email_worker = email_outbox.OutboxWorker(app, db, EmailOutbox)
+
+# Biletele active pentru portofel (cache per utilizator) și arhivarea periodică a celor expirate
+active_tickets = ticket_store.ActiveTickets(Ticket)
+ticket_archiver = ticket_store.ArchiveJob(app, db, Ticket, TicketArchive)
+
+def create_tables():
+    """ Tabelele care lipsesc (db.create_all nu șterge nimic) și indexurile adăugate ulterior în modele """
+    db.create_all()
+    # ex: ix_tickets_user_expire (portofelul) pe o tabelă tickets creată înainte să existe în model
+    for index in Ticket.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+_schema_ready = threading.Event()
+
+@app.before_request
+def _start_background_workers():
+    # la prima cerere a fiecărui proces: tabelele noi (ex: sales_rollup, fără care cumpărarea nu ar
+    # număra vânzarea) chiar dacă /fix_db nu a fost rulat după actualizare
+    if not _schema_ready.is_set():
+        try:
+            create_tables()
+        except Exception as e:
+            print(f"⚠️ Nu pot crea tabelele lipsă: {e}")
+        _schema_ready.set()
+    # pornesc la prima cerere; outbox-ul trimite și mesajele rămase de la o rulare anterioară
+    email_worker.start()
+    ticket_archiver.start()
+
 
 # ================== RUTE AUTENTIFICARE ==================
 
@@ -131,13 +262,9 @@ def index():
 @app.route('/tickets')
 @login_required
 def tickets():
-    now = datetime.now()
-    active_tickets = Ticket.query.filter(
-        Ticket.user_id == current_user.id, 
-        Ticket.expire_time > now
-    ).order_by(Ticket.expire_time.desc()).all()
-    
-    return render_template('tickets.html', active_tickets=active_tickets)
+    # din cache; reîncărcat (index user_id + expire_time) dacă utilizatorul a cumpărat între timp
+    tickets = active_tickets.get(current_user.id, changed_at=session.get('tickets_changed_at'))
+    return render_template('tickets.html', active_tickets=tickets)
 
 # --- PROCESARE CUMPĂRARE SI EMAIL ---
 @app.route('/buy_ticket', methods=['POST'])
@@ -158,38 +285,38 @@ def buy_ticket():
 
     if ticket_type in prices:
         duration_minutes = durations[ticket_type]
-        expire_time = datetime.now() + timedelta(minutes=duration_minutes)
+        now = datetime.now()
+        expire_time = now + timedelta(minutes=duration_minutes)
         
         new_ticket = Ticket(
             user_id=current_user.id,
             type=names[ticket_type],
             price=prices[ticket_type],
+            timestamp=now,
             expire_time=expire_time
         )
         
         db.session.add(new_ticket)
+        # statisticile din admin, actualizate în aceeași tranzacție cu biletul
+        sales_rollup.record_sale(db.session, names[ticket_type], prices[ticket_type], now)
+        db.session.flush()  # id-ul biletului, pentru email
+
+        # --- EMAIL (outbox) ---
+        # Emailul se salvează în aceeași tranzacție cu biletul și e trimis de worker-ul din fundal,
+        # deci un server SMTP lent nu mai încetinește cumpărarea
+        ticket_info = {
+            'id': new_ticket.id,
+            'type': names[ticket_type],
+            'price': f"{prices[ticket_type]:.2f}",
+            'expiry': expire_time.strftime('%d.%m.%Y %H:%M')
+        }
+        email_worker.enqueue(current_user.email, 'ticket', ticket_info)
         db.session.commit()
-        
-        # --- TRIMITERE EMAIL ---
-        try:
-            ticket_info = {
-                'id': new_ticket.id,
-                'type': names[ticket_type],
-                'price': f"{prices[ticket_type]:.2f}",
-                'expiry': expire_time.strftime('%d.%m.%Y %H:%M')
-            }
-            
-            # Trimitem emailul la adresa utilizatorului logat
-            email_sent = email_service.send_ticket_email(current_user.email, ticket_info)
-            
-            if email_sent:
-                flash(f"✅ Bilet cumpărat! Confirmarea a fost trimisă pe {current_user.email}.", "success")
-            else:
-                flash(f"✅ Bilet cumpărat, dar emailul de confirmare nu a putut fi trimis.", "warning")
-                
-        except Exception as e:
-            print(f"Eroare proces email: {e}")
-            flash(f"✅ Bilet cumpărat! (Eroare sistem email)", "warning")
+        email_worker.wake()
+        active_tickets.invalidate(current_user.id)
+        session['tickets_changed_at'] = time.time()  # și pentru cache-ul celorlalte procese
+
+        flash(f"✅ Bilet cumpărat! Confirmarea va fi trimisă pe {current_user.email}.", "success")
 
     else:
         flash("❌ Tip bilet invalid!", "danger")
@@ -197,121 +324,130 @@ def buy_ticket():
     return redirect(url_for('tickets'))
 
 # ================== LOGICA DE RUTARE (Calculate Route) ==================
-@app.route('/calculate_route', methods=['POST'])
-def calculate_route():
-    data = request.json
+def _render_route_html(result, start_addr, time_value):
+    """ HTML-ul cu etapele rutei, afișat în panoul hărții """
+    vehicles = [leg for leg in result['details'] if leg['type'] == 'transit']
+    nr_schimburi = len(vehicles) - 1 if len(vehicles) > 0 else 0
+
+    # Construire HTML Răspuns
+    html_details = f'''
+    <div class="d-flex justify-content-between align-items-center mb-3">
+        <div>
+            <span class="badge bg-success mb-1">Ruta Optimă</span><br>
+            <small class="text-muted"><i class="fa-solid fa-clock"></i> Plecare: {time_value.split("T")[1] if time_value else "Acum"}</small>
+        </div>
+        <div class="text-end">
+            <small class="fw-bold text-primary">{len(result['details'])} etape</small><br>
+            <small class="text-muted">{nr_schimburi} schimburi</small>
+        </div>
+    </div>
+    {f'<div class="alert alert-warning small py-2">{result["warning"]}</div>' if result.get('warning') else ''}
+    
+    <div class="route-step mb-2 pb-2 border-bottom">
+        <i class="fa-solid fa-location-dot text-success me-2"></i>
+        <small>Plecare din:</small> <br><b>{start_addr}</b>
+    </div>
+    
+    <div class="route-step mb-3">
+        <i class="fa-solid fa-person-walking text-secondary me-2"></i>
+        <small>Mergi la stația:</small> <b>{result["start_stop"]}</b>
+    </div>
+    '''
+    
+    for leg in result['details']:
+        if leg['line'] == 'Mers pe jos' or leg['type'] == 'transfer':
+            html_details += f'''
+            <div class="d-flex align-items-center mb-3 ms-2 ps-2 border-start">
+                <div class="text-secondary">
+                    <i class="fa-solid fa-person-walking fa-lg me-3"></i>
+                </div>
+                <div>
+                    <small class="text-muted d-block">Transfer / Mers pe jos</small>
+                    <span class="small">Către: <b>{leg["from"]}</b></span>
+                </div>
+            </div>
+            '''
+        else:
+            badge_class = "bg-primary"
+            if leg['line'].startswith('M'): badge_class = "bg-danger"
+            if leg['line'].startswith('N'): badge_class = "bg-dark"
+            
+            html_details += f'''
+            <div class="card border-0 shadow-sm mb-3">
+                <div class="card-body p-2 d-flex align-items-center">
+                    <span class="badge {badge_class} me-3 py-2 px-3 fs-6">{leg["line"]}</span>
+                    <div class="border-start ps-3">
+                        <small class="text-muted d-block">Ia din stația:{" la " + leg["departure"] if leg.get("departure") else ""}</small>
+                        <b class="text-dark">{leg["from"]}</b>
+                    </div>
+                    <div class="ms-auto text-end">
+                        <small class="text-muted d-block">{leg.get('duration_fmt', '')}</small>
+                        <small class="text-secondary" style="font-size:0.75rem">{leg.get('stops_count', 0)} stații</small>
+                    </div>
+                </div>
+            </div>
+            '''
+        
+    html_details += f'''
+    <div class="route-step mt-3 pt-2 border-top">
+        <i class="fa-solid fa-flag-checkered text-danger me-2"></i>
+        <small>Coboară la:</small> <b>{result["end_stop"]}</b>
+        <div class="mt-2 text-center text-muted small">
+            <i class="fa-solid fa-hourglass-half"></i> Durată totală estimată: <b>{result.get('total_duration', 'N/A')}</b>
+        </div>
+    </div>
+    '''
+    return html_details
+
+def _compute_route(data):
+    """ Geocodare + rutare pentru o cerere de rută; întoarce (răspuns JSON, cod HTTP) """
     start_addr = data.get('start')
     end_addr = data.get('end')
     time_type = data.get('time_type')   
     time_value = data.get('time_value') 
+    mode = data.get('mode', 'graph')   # 'graph' (estimare) sau 'timetable' (orar real)
+    snap = data.get('snap')            # 'nearest' / 'multi'; implicit ROUTING_SNAP
     
     print(f"🔍 Caut ruta: {start_addr} -> {end_addr} @ {time_value}") 
 
-    geolocator = Nominatim(user_agent="app_transport_bucuresti_proiect_v5")
-    
+    # Ambele adrese se geocodează în paralel, cu limită de timp
     try:
-        def smart_query(addr):
-            if "," in addr: return addr
-            return f"{addr}, Romania"
-
-        loc_start = geolocator.geocode(smart_query(start_addr))
-        loc_end = geolocator.geocode(smart_query(end_addr))
+        loc_start, loc_end = geocoder.geocode_many([start_addr, end_addr])
+    except geocoding.GeocodeTimeout:
+        return {'error': 'Serviciul de geocodare nu a răspuns la timp. Încearcă din nou.'}, 504
+    
+    if not loc_start:
+        return {'error': f'Nu am putut localiza adresa de plecare: {start_addr}'}, 404
+    if not loc_end:
+        return {'error': f'Nu am putut localiza adresa de destinație: {end_addr}'}, 404
         
-        if not loc_start:
-            return jsonify({'error': f'Nu am putut localiza adresa de plecare: {start_addr}'}), 404
-        if not loc_end:
-            return jsonify({'error': f'Nu am putut localiza adresa de destinație: {end_addr}'}), 404
-            
-        if not transport_graph:
-             return jsonify({'error': 'Motorul de rutare nu este inițializat corect.'}), 500
+    if not transport_graph:
+         return {'error': 'Motorul de rutare nu este inițializat corect.'}, 500
+
+    result = transport_graph.find_route(
+        (loc_start.latitude, loc_start.longitude),
+        (loc_end.latitude, loc_end.longitude),
+        time_value=time_value,
+        mode=mode,
+        snap=snap
+    )
+    
+    if "error" in result:
+        print(f"❌ Eroare Algoritm: {result['error']}")
+        return {'error': result['error']}, 200
 
-        result = transport_graph.find_route(
-            (loc_start.latitude, loc_start.longitude),
-            (loc_end.latitude, loc_end.longitude),
-            time_value=time_value
-        )
-        
-        if "error" in result:
-            print(f"❌ Eroare Algoritm: {result['error']}")
-            return jsonify({'error': result['error']})
-            
-        vehicles = [leg for leg in result['details'] if leg['type'] == 'transit']
-        nr_schimburi = len(vehicles) - 1 if len(vehicles) > 0 else 0
-
-        # Construire HTML Răspuns
-        html_details = f'''
-        <div class="d-flex justify-content-between align-items-center mb-3">
-            <div>
-                <span class="badge bg-success mb-1">Ruta Optimă</span><br>
-                <small class="text-muted"><i class="fa-solid fa-clock"></i> Plecare: {time_value.split("T")[1] if time_value else "Acum"}</small>
-            </div>
-            <div class="text-end">
-                <small class="fw-bold text-primary">{len(result['details'])} etape</small><br>
-                <small class="text-muted">{nr_schimburi} schimburi</small>
-            </div>
-        </div>
-        
-        <div class="route-step mb-2 pb-2 border-bottom">
-            <i class="fa-solid fa-location-dot text-success me-2"></i>
-            <small>Plecare din:</small> <br><b>{start_addr}</b>
-        </div>
-        
-        <div class="route-step mb-3">
-            <i class="fa-solid fa-person-walking text-secondary me-2"></i>
-            <small>Mergi la stația:</small> <b>{result["start_stop"]}</b>
-        </div>
-        '''
-        
-        for leg in result['details']:
-            if leg['line'] == 'Mers pe jos' or leg['type'] == 'transfer':
-                html_details += f'''
-                <div class="d-flex align-items-center mb-3 ms-2 ps-2 border-start">
-                    <div class="text-secondary">
-                        <i class="fa-solid fa-person-walking fa-lg me-3"></i>
-                    </div>
-                    <div>
-                        <small class="text-muted d-block">Transfer / Mers pe jos</small>
-                        <span class="small">Către: <b>{leg["from"]}</b></span>
-                    </div>
-                </div>
-                '''
-            else:
-                badge_class = "bg-primary"
-                if leg['line'].startswith('M'): badge_class = "bg-danger"
-                if leg['line'].startswith('N'): badge_class = "bg-dark"
-                
-                html_details += f'''
-                <div class="card border-0 shadow-sm mb-3">
-                    <div class="card-body p-2 d-flex align-items-center">
-                        <span class="badge {badge_class} me-3 py-2 px-3 fs-6">{leg["line"]}</span>
-                        <div class="border-start ps-3">
-                            <small class="text-muted d-block">Ia din stația:</small>
-                            <b class="text-dark">{leg["from"]}</b>
-                        </div>
-                        <div class="ms-auto text-end">
-                            <small class="text-muted d-block">{leg.get('duration_fmt', '')}</small>
-                            <small class="text-secondary" style="font-size:0.75rem">{leg.get('stops_count', 0)} stații</small>
-                        </div>
-                    </div>
-                </div>
-                '''
-            
-        html_details += f'''
-        <div class="route-step mt-3 pt-2 border-top">
-            <i class="fa-solid fa-flag-checkered text-danger me-2"></i>
-            <small>Coboară la:</small> <b>{result["end_stop"]}</b>
-            <div class="mt-2 text-center text-muted small">
-                <i class="fa-solid fa-hourglass-half"></i> Durată totală estimată: <b>{result.get('total_duration', 'N/A')}</b>
-            </div>
-        </div>
-        '''
+    return {
+        'start_coords': [loc_start.latitude, loc_start.longitude],
+        'end_coords': [loc_end.latitude, loc_end.longitude],
+        'path_coords': result['path_coords'],
+        'html_info': _render_route_html(result, start_addr, time_value)
+    }, 200
 
-        return jsonify({
-            'start_coords': [loc_start.latitude, loc_start.longitude],
-            'end_coords': [loc_end.latitude, loc_end.longitude],
-            'path_coords': result['path_coords'],
-            'html_info': html_details
-        })
+@app.route('/calculate_route', methods=['POST'])
+def calculate_route():
+    try:
+        payload, status = _compute_route(request.json)
+        return jsonify(payload), status
 
     except Exception as e:
         print(f"❌ CRITICAL ERROR: {e}")
@@ -319,6 +455,28 @@ def calculate_route():
         traceback.print_exc()
         return jsonify({'error': f'Eroare interna server: {str(e)}'}), 500
 
+@app.route('/calculate_route/async', methods=['POST'])
+def calculate_route_async():
+    """ Pornește calculul în fundal și răspunde imediat; clientul interoghează status_url """
+    try:
+        job_id = route_jobs.submit(_compute_route, request.json)
+    except jobs.JobQueueFull:
+        return jsonify({'error': 'Prea multe cereri de rutare în curs. Încearcă din nou.'}), 503
+    return jsonify({'job_id': job_id, 'status_url': url_for('calculate_route_job', job_id=job_id)}), 202
+
+@app.route('/calculate_route/jobs/<job_id>')
+def calculate_route_job(job_id):
+    job = route_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Cererea nu mai există (expirată?). Încearcă din nou.'}), 404
+    if job['state'] == 'pending':
+        return jsonify({'state': 'pending'}), 202
+    if job['state'] == 'failed':
+        print(f"❌ CRITICAL ERROR: {job['error']}")
+        return jsonify({'error': f"Eroare interna server: {job['error']}"}), 500
+    payload, status = job['result']
+    return jsonify(payload), status
+
 # ================== RUTE ADMIN ==================
 
 @app.route('/admin')
@@ -337,16 +495,25 @@ def admin():
     
     routes = query.order_by(Route.route_short_name).limit(50).all()
 
-    # Statistici
+    # Statistici (din sales_rollup: câte un rând per tip de bilet, nu toată tabela tickets)
     try:
-        sales = db.session.query(func.sum(Ticket.price)).scalar() or 0
-        popular_data = db.session.query(Ticket.type, func.count(Ticket.id)).group_by(Ticket.type).order_by(func.count(Ticket.id).desc()).first()
-        popular = popular_data if popular_data else None
+        sales, popular, sales_by_type = sales_rollup.summary(db.session, SalesRollup)
+        sales_daily = sales_rollup.daily(db.session, SalesRollup, days=14)
     except:
+        db.session.rollback()
         sales = 0
         popular = None
+        sales_by_type = {}
+        sales_daily = []
 
-    return render_template('admin.html', routes=routes, search_query=search_query, sales=sales, popular=popular)
+    route_cache = transport_graph.route_cache.stats() if transport_graph else None
+    try:
+        outbox = email_worker.stats()
+    except Exception:
+        outbox = None
+    return render_template('admin.html', routes=routes, search_query=search_query, sales=sales, popular=popular,
+                           rebuild_status=graph_rebuilder.status(), route_cache=route_cache, email_outbox=outbox,
+                           sales_by_type=sales_by_type, sales_daily=sales_daily)
 
 
 @app.route('/admin/route/edit', methods=['POST'])
@@ -360,11 +527,16 @@ def edit_route():
     
     route = Route.query.get(r_id)
     if route:
+        old_short_name = route.route_short_name
         route.route_short_name = short_name
         route.route_long_name = long_name
         try:
             db.session.commit()
             flash(f"Ruta {short_name} a fost actualizată!", "success")
+            if (old_short_name or '').strip().upper() != short_name.strip().upper():
+                _patch_graph(old_short_name, short_name)
+            if old_short_name != short_name:
+                _reset_live_index()
         except Exception as e:
             db.session.rollback()
             flash(f"Eroare: {e}", "danger")
@@ -386,6 +558,8 @@ def delete_route():
             db.session.delete(route)
             db.session.commit()
             flash(f"Ruta {route.route_short_name} a fost ștearsă!", "success")
+            _patch_graph(route.route_short_name)
+            _reset_live_index()
         except Exception as e:
             db.session.rollback()
             flash(f"Eroare ștergere (dependențe?): {e}", "danger")
@@ -399,23 +573,125 @@ def delete_route():
 def regenerate_graph():
     if not current_user.is_admin: return redirect(url_for('index'))
     
-    try:
-        cache_file = "transport_graph_layered.pkl"
-        if os.path.exists(cache_file):
-            os.remove(cache_file)
-            print(f"🗑️ [Admin] Cache șters: {cache_file}")
-        
-        # Forțăm reîncărcarea
-        transport_graph.is_loaded = False 
-        transport_graph.load_data() 
-        flash("Graful a fost regenerat cu succes! Regulile noi sunt active.", "success")
-    except Exception as e:
-        flash(f"Eroare regenerare: {str(e)}", "danger")
+    # Graful nou se construiește în fundal; rutarea rămâne pe graful vechi până la schimb
+    if graph_rebuilder.start():
+        print("🔁 [Admin] Regenerare graf pornită în fundal")
+        flash("Regenerarea grafului a pornit în fundal. Rutele se calculează pe graful curent până la final.", "info")
+    else:
+        flash("O regenerare a grafului este deja în curs.", "warning")
         
     return redirect(url_for('admin'))
 
+@app.route('/admin/regenerate_graph/status')
+@login_required
+def regenerate_graph_status():
+    if not current_user.is_admin: return jsonify({'error': 'Acces interzis'}), 403
+    return jsonify(graph_rebuilder.status())
+
+@app.route('/admin/route_cache')
+@login_required
+def route_cache_stats():
+    """ Contoarele cache-ului de rute (hit/miss, evacuări), pentru dimensionarea lui """
+    if not current_user.is_admin: return jsonify({'error': 'Acces interzis'}), 403
+    if not transport_graph: return jsonify({'error': 'Motorul de rutare nu este inițializat'}), 503
+    return jsonify(transport_graph.route_cache.stats())
+
+# ================== BATCH ROUTING (OD MATRIX) ==================
+
+# Limitele unei cereri /api/od_matrix: celule origine x destinație (sau perechi) și drumuri complete
+OD_MAX_CELLS = 250000
+OD_MAX_PATHS = 2000
+
+@app.route('/api/od_matrix', methods=['POST'])
+@login_required
+def api_od_matrix():
+    """
+    Durate (total_minutes) pentru multe perechi origine-destinație, fără geocodare și fără HTML.
+    Corp JSON: {"origins": [...], "destinations": [...]} sau {"pairs": [[o, d], ...]};
+    un punct e un stop_id sau [lat, lon]. Opțional: "time_value", "paths": true.
+    """
+    if not transport_graph:
+        return jsonify({'error': 'Motorul de rutare nu este inițializat corect.'}), 503
+    data = request.get_json(silent=True) or {}
+    time_value = data.get('time_value')
+    paths = bool(data.get('paths'))
+
+    try:
+        if 'pairs' in data:
+            pairs = data.get('pairs') or []
+            cells = len(pairs)
+        else:
+            origins, destinations = data.get('origins') or [], data.get('destinations') or []
+            cells = len(origins) * len(destinations)
+        if not cells:
+            return jsonify({'error': 'Lipsesc originile/destinațiile.'}), 400
+        if cells > OD_MAX_CELLS or (paths and cells > OD_MAX_PATHS):
+            return jsonify({'error': f'Prea multe perechi ({cells}); maxim {OD_MAX_PATHS if paths else OD_MAX_CELLS}.'}), 400
+
+        t0 = time.perf_counter()
+        if 'pairs' in data:
+            result = transport_graph.od_pairs(pairs, time_value=time_value, paths=paths)
+        else:
+            result = transport_graph.od_matrix(origins, destinations, time_value=time_value, paths=paths)
+        print(f"🧮 OD: {cells} perechi în {time.perf_counter() - t0:.2f} s")
+        return jsonify(result)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Punct invalid: {e}'}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Eroare interna server: {str(e)}'}), 500
+
+@app.route('/api/isochrone')
+def api_isochrone():
+    """
+    Stațiile (și opțional grila) atinse în `minutes` minute dintr-un punct:
+    ?lat=..&lon=.. sau ?stop_id=.., plus minutes (implicit 30), time_value, grid=1.
+    """
+    if not transport_graph:
+        return jsonify({'error': 'Motorul de rutare nu este inițializat corect.'}), 503
+    try:
+        minutes = float(request.args.get('minutes', 30))
+        if request.args.get('stop_id'):
+            origin = request.args['stop_id']
+        else:
+            origin = (request.args.get('lat', type=float), request.args.get('lon', type=float))
+            if None in origin:
+                return jsonify({'error': 'Lipsește punctul de plecare (lat/lon sau stop_id).'}), 400
+        result = transport_graph.isochrone(origin, minutes, time_value=request.args.get('time_value'),
+                                           grid=request.args.get('grid') in ('1', 'true'))
+        return jsonify(result)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Parametri invalizi: {e}'}), 400
+
 # ================== LIVE MAP ROUTES ==================
 
+# Segmentele orarului pentru harta live, încărcate o singură dată (la prima cerere)
+_live_index = None
+_live_index_lock = threading.Lock()
+
+def get_live_index():
+    global _live_index
+    if _live_index is None:
+        with _live_index_lock:
+            if _live_index is None:
+                with db.engine.connect().execution_options(stream_results=True) as conn:
+                    _live_index = live_index.LiveIndex.load(conn)
+    return _live_index
+
+def _reset_live_index():
+    """ Numele liniilor sau orarul s-au schimbat (editare rută, regenerare graf): indexul se reîncarcă la următoarea cerere """
+    global _live_index
+    _live_index = None
+    live_broadcaster.reset()
+
+def _live_vehicles(route_name, now_sec):
+    with app.app_context():
+        return get_live_index().vehicles(route_name, now_sec)
+
+# Un singur calcul pe linie la fiecare tick, trimis tuturor hărților deschise pe acea linie
+live_broadcaster = live_feed.LiveBroadcaster(_live_vehicles, max_subscribers=app.config['LIVE_STREAM_MAX'])
+
 @app.route('/live')
 @login_required
 def live_map():
@@ -428,76 +704,87 @@ def api_live_vehicles():
     if not route_name:
         return jsonify({'error': 'No route specified'}), 400
 
+    # Pozițiile vin din indexul în memorie (căutare binară pe segmentele liniei), fără interogări SQL
     now = datetime.now()
-    current_time_str = now.strftime("%H:%M:%S")
-    
-    # Query SQL Complex: Găsește segmentele active
-    query = text("""
-        SELECT 
-            r.route_short_name,
-            t.trip_headsign,
-            s1.stop_lat as lat1, s1.stop_lon as lon1, st1.departure_time as t1,
-            s2.stop_lat as lat2, s2.stop_lon as lon2, st2.arrival_time as t2
-        FROM stop_times st1
-        JOIN stop_times st2 ON st1.trip_id = st2.trip_id AND st1.stop_sequence + 1 = st2.stop_sequence
-        JOIN trips t ON st1.trip_id = t.trip_id
-        JOIN routes r ON t.route_id = r.route_id
-        JOIN stops s1 ON st1.stop_id = s1.stop_id
-        JOIN stops s2 ON st2.stop_id = s2.stop_id
-        WHERE r.route_short_name = :r_name
-        AND st1.departure_time <= :now 
-        AND st2.arrival_time >= :now
-    """)
-    
+    now_sec = now.hour * 3600 + now.minute * 60 + now.second
     try:
-        results = db.session.execute(query, {'r_name': route_name, 'now': current_time_str}).fetchall()
-        
-        vehicles = []
-        for row in results:
-            # Funcție conversie timp
-            def to_seconds(t_val):
-                if isinstance(t_val, str):
-                    h, m, s = map(int, t_val.split(':'))
-                    return h * 3600 + m * 60 + s
-                # Dacă vine ca obiect timedelta (PostgreSQL uneori face asta)
-                if isinstance(t_val, timedelta):
-                    return t_val.total_seconds()
-                # Dacă vine ca time object
-                return t_val.hour * 3600 + t_val.minute * 60 + t_val.second
-            
-            t1_sec = to_seconds(row.t1)
-            t2_sec = to_seconds(row.t2)
-            now_sec = to_seconds(current_time_str)
-            
-            if t2_sec == t1_sec: 
-                ratio = 0.5
-            else:
-                ratio = (now_sec - t1_sec) / (t2_sec - t1_sec)
-                # Cap ratio la 0-1
-                ratio = max(0.0, min(1.0, ratio))
-            
-            lat = float(row.lat1) + (float(row.lat2) - float(row.lat1)) * ratio
-            lon = float(row.lon1) + (float(row.lon2) - float(row.lon1)) * ratio
-            
-            vehicles.append({
-                'lat': lat,
-                'lon': lon,
-                'headsign': row.trip_headsign,
-                'speed': 25 # km/h estimat
-            })
-            
+        vehicles = get_live_index().vehicles(route_name, now_sec)
         return jsonify({'vehicles': vehicles})
-        
     except Exception as e:
         print(f"Eroare Live API: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/live_positions')
+def api_live_positions():
+    """
+    Vehiculele mai multor linii (?routes=133,M2) și/sau dintr-o zonă a hărții (?bbox=vest,sud,est,nord,
+    ca map.getBounds().toBBoxString()); fără parametri, toată rețeaua. Răspuns pe coloane (vezi LiveIndex.query).
+    """
+    routes = request.args.get('routes')
+    routes = [name.strip() for name in routes.split(',') if name.strip()] if routes else None
+    bbox = request.args.get('bbox')
+    try:
+        if bbox:
+            bbox = [float(x) for x in bbox.split(',')]
+            if len(bbox) != 4:
+                raise ValueError('bbox trebuie să aibă 4 valori: vest,sud,est,nord')
+    except ValueError as e:
+        return jsonify({'error': f'Parametri invalizi: {e}'}), 400
+
+    try:
+        result = get_live_index().query(live_feed.service_seconds(), routes=routes, bbox=bbox or None)
+        return jsonify(result)
+    except Exception as e:
+        print(f"Eroare Live API: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/live_stream')
+def api_live_stream():
+    """ Server-Sent Events: snapshot la conectare, apoi doar diferențele la fiecare tick """
+    route_name = request.args.get('route')
+    if not route_name:
+        return jsonify({'error': 'No route specified'}), 400
+    try:
+        subscription = live_broadcaster.subscribe(route_name)
+    except live_feed.TooManySubscribers as e:
+        # pagina /live trece pe polling când fluxul nu se poate deschide
+        return jsonify({'error': str(e), 'poll': url_for('api_live_vehicles', route=route_name)}), 503
+    except Exception as e:
+        print(f"Eroare Live Stream: {e}")
+        return jsonify({'error': str(e)}), 500
+    return Response(subscription.events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ================== COMENZI CLI ==================
+
+@app.cli.command('build-segments')
+def build_segments_command():
+    """ (Re)construiește tabela trip_segments și indexurile ei; de rulat după fiecare import GTFS """
+    print("⏳ Construire trip_segments (self-join stop_times)...")
+    trip_segments.build(db.engine)
+    print("✅ trip_segments gata. Graful, orarul și harta live o folosesc de la următoarea încărcare.")
+
+@app.cli.command('backfill-sales')
+def backfill_sales_command():
+    """ Reface tabela sales_rollup din toate biletele existente """
+    print("⏳ Recalculare statistici vânzări din tickets...")
+    create_tables()
+    sales_rollup.backfill(db.session, Ticket, TicketArchive)
+    print("✅ sales_rollup gata.")
+
+@app.cli.command('archive-tickets')
+def archive_tickets_command():
+    """ Mută acum în tickets_archive biletele expirate (aplicația o face și singură, o dată pe oră) """
+    create_tables()
+    moved = ticket_store.archive_expired(db.session, Ticket, TicketArchive)
+    print(f"✅ {moved} bilete arhivate.")
+
 # ================== DB FIX & START ==================
 @app.route('/fix_db')
 def fix_db():
     try:
         with app.app_context():
-            db.create_all() # Doar creeaza daca nu exista, nu sterge
+            create_tables() # Doar creeaza daca nu exista, nu sterge
             
             if not Users.query.filter_by(username='admin').first():
                 hashed = generate_password_hash('admin123', method='sha256')
@@ -511,5 +798,5 @@ def fix_db():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        create_tables()
     app.run(debug=True)
@@ -0,0 +1,257 @@
+"""
+Benchmark-uri pentru motorul de rutare.
+
+Rulare (are nevoie de baza de date GTFS; conexiunea din variabilele de mediu PGHOST, PGDATABASE, PGUSER,
+PGPASSWORD, implicit ca în app.py):
+    python benchmark.py engines --pairs 200
+    python benchmark.py engines --mode timetable
+    python benchmark.py walking
+    python benchmark.py search --pairs 200
+    python benchmark.py segments   (după `flask build-segments`)
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import pandas as pd
+from geopy.distance import geodesic
+from sqlalchemy import create_engine, text
+
+import live_index
+import routing_engine
+import trip_segments
+from contraction import ContractionHierarchy
+
+# Nu importăm app.py (Flask, modele, workeri pornite la import): doar parametrii bazei GTFS, din mediu
+db_params_routing = {
+    "dbname": os.environ.get('PGDATABASE', 'transport_times'),
+    "user": os.environ.get('PGUSER', 'postgres'),
+    "password": os.environ.get('PGPASSWORD', ''),
+    "host": os.environ.get('PGHOST', 'localhost'),
+}
+
+
+def _quiet():
+    # find_route face print la fiecare apel; nu vrem să măsurăm și consola
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _sample_pairs(stops, n, seed):
+    rnd = random.Random(seed)
+    ids = sorted(stops)
+    pairs = []
+    for _ in range(n):
+        a, b = rnd.sample(ids, 2)
+        pairs.append(((stops[a]['lat'], stops[a]['lon']), (stops[b]['lat'], stops[b]['lon'])))
+    return pairs
+
+
+def _latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000,
+    }
+
+
+def bench_engines(args):
+    """
+    Memoria grafului încărcat și latența find_route: networkx vs CSR.
+    Graful se construiește din baza de date (fără cache): array-urile citite din cache sunt mmap și
+    tracemalloc nu le vede, deci comparația de memorie ar favoriza CSR-ul pe nedrept.
+    """
+    pairs = None
+    for engine in routing_engine.ENGINES:
+        tracemalloc.start()
+        graph = routing_engine.TransportGraph(db_params_routing, engine=engine)
+        with _quiet(), tempfile.TemporaryDirectory() as tmp:
+            graph.cache_prefix = os.path.join(tmp, os.path.basename(graph.cache_prefix))
+            graph.load_data(use_cache=False)
+            if args.mode == 'timetable':
+                graph.ensure_timetable()
+        mem_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        if pairs is None:
+            pairs = _sample_pairs(graph.stops, args.pairs, args.seed)
+
+        samples = []
+        with _quiet():
+            for start, end in pairs:
+                t0 = time.perf_counter()
+                graph.find_route(start, end, time_value=args.time, mode=args.mode)
+                samples.append(time.perf_counter() - t0)
+
+        stats = _latency_stats(samples)
+        print(f"{engine:>9}: memorie graf {mem_mb:8.1f} MB | "
+              f"medie {stats['mean_ms']:7.2f} ms | p50 {stats['p50_ms']:7.2f} ms | p95 {stats['p95_ms']:7.2f} ms")
+
+
+def bench_search(args):
+    """
+    Dijkstra vs A* vs bidirecțional vs CH pe aceleași perechi: noduri fixate, latență și costul drumului.
+    Ierarhiile se construiesc aici de la zero (fără cache), ca să se vadă timpul și memoria preprocesării.
+    """
+    period = routing_engine.DEFAULT_PERIOD
+    for engine in routing_engine.ENGINES:
+        graph = routing_engine.TransportGraph(db_params_routing, engine=engine)
+        with _quiet():
+            graph.load_data()
+
+        views = graph.views if engine == 'csr' else graph._csr_period_views()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        with _quiet():
+            graph.hierarchies = {p: (view, ContractionHierarchy.build(view)) for p, view in views.items()}
+        t_ch = time.perf_counter() - t0
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        ch_mb = sum(ch.nbytes for _, ch in graph.hierarchies.values()) / 1e6
+        shortcuts = sum(ch.num_shortcuts for _, ch in graph.hierarchies.values())
+        rnd = random.Random(args.seed)
+        ids = sorted(graph.stops)
+        pairs = [rnd.sample(ids, 2) for _ in range(args.pairs)]
+
+        print(f"{engine}:")
+        print(f"   CH preprocesare: {t_ch:.1f} s | vârf memorie {peak_mb:.1f} MB | "
+              f"ierarhii {ch_mb:.1f} MB ({shortcuts} scurtături, {len(views)} perioade)")
+        reference = None
+        for algorithm in routing_engine.ALGORITHMS:
+            samples, settled, costs = [], [], []
+            for s_node, e_node in pairs:
+                stats = {}
+                t0 = time.perf_counter()
+                try:
+                    edges = graph._shortest_path(period, s_node, e_node, algorithm, stats)
+                    costs.append(round(sum(d['weight'] for _, _, d in edges), 6))
+                except (nx.NetworkXNoPath, routing_engine.NoPath):
+                    costs.append(None)
+                samples.append(time.perf_counter() - t0)
+                settled.append(stats.get('settled', 0))
+
+            reference = reference or costs
+            mismatches = sum(a != b for a, b in zip(costs, reference))
+            stats = _latency_stats(samples)
+            # networkx nu raportează nodurile fixate (CH da, pe ambele motoare)
+            nodes = f"{statistics.mean(settled):9.0f}" if engine == 'csr' or algorithm == 'ch' else f"{'-':>9}"
+            print(f"   {algorithm:>13}: noduri fixate {nodes} | medie {stats['mean_ms']:7.2f} ms | "
+                  f"p95 {stats['p95_ms']:7.2f} ms | costuri diferite de Dijkstra: {mismatches}")
+
+
+def _legacy_walking_edges(graph):
+    """ Varianta veche (geodesic pe fiecare pereche, bucket-uri round(lat, 2)), păstrată doar pentru comparație """
+    G = nx.DiGraph()
+    name_clusters = {}
+    for stop_id, data in graph.stops.items():
+        clean = graph._clean_name(data['name'])
+        if len(clean) > 3:
+            name_clusters.setdefault(clean, []).append(stop_id)
+    for ids in name_clusters.values():
+        if len(ids) < 2: continue
+        for i in ids:
+            for j in ids:
+                if i == j: continue
+                d1, d2 = graph.stops[i], graph.stops[j]
+                if geodesic((d1['lat'], d1['lon']), (d2['lat'], d2['lon'])).meters < 600:
+                    G.add_edge(i, j, weight=2.0, actual_time=3.0, type='walking', line_name='Transfer Rapid')
+
+    buckets = {}
+    for stop_id, data in graph.stops.items():
+        buckets.setdefault((round(data['lat'], 2), round(data['lon'], 2)), []).append(stop_id)
+    for stop_ids in buckets.values():
+        for a in range(len(stop_ids)):
+            for b in range(a + 1, len(stop_ids)):
+                id1, id2 = stop_ids[a], stop_ids[b]
+                if G.has_edge(id1, id2): continue
+                d1, d2 = graph.stops[id1], graph.stops[id2]
+                dist = geodesic((d1['lat'], d1['lon']), (d2['lat'], d2['lon'])).meters
+                if dist < 450:
+                    attr = {'weight': dist / 80, 'actual_time': dist / 80, 'type': 'walking', 'line_name': 'Transfer'}
+                    G.add_edge(id1, id2, **attr)
+                    G.add_edge(id2, id1, **attr)
+    return G
+
+
+def bench_walking(args):
+    """ Timpul de generare a transferurilor pe jos (vechi vs vectorizat) și build-ul la rece complet """
+    graph = routing_engine.TransportGraph(db_params_routing)
+    with _quiet():
+        graph.load_data()
+
+    t0 = time.perf_counter()
+    legacy = _legacy_walking_edges(graph)
+    t_legacy = time.perf_counter() - t0
+
+    graph.G = nx.DiGraph()
+    t0 = time.perf_counter()
+    with _quiet():
+        graph._create_walking_edges()
+    t_new = time.perf_counter() - t0
+
+    missed = set(graph.G.edges) - set(legacy.edges)
+    print(f"{len(graph.stops)} stații")
+    print(f"   vechi (geodesic): {t_legacy:8.2f} s | {legacy.number_of_edges()} muchii")
+    print(f"   vectorizat:       {t_new:8.2f} s | {graph.G.number_of_edges()} muchii "
+          f"({len(missed)} în plus, peste granițele bucket-urilor)")
+
+    # Build la rece complet, fără cache
+    cold = routing_engine.TransportGraph(db_params_routing)
+    with tempfile.TemporaryDirectory() as tmp:
+        cold.cache_prefix = os.path.join(tmp, os.path.basename(cold.cache_prefix))
+        t0 = time.perf_counter()
+        with _quiet():
+            cold.load_data()
+        t_cold = time.perf_counter() - t0
+    print(f"   build la rece load_data: {t_cold:.2f} s "
+          f"(cu transferurile vechi ar fi ~{t_cold - t_new + t_legacy:.2f} s)")
+
+
+def bench_segments(args):
+    """ Timpul de citire a segmentelor: self-join pe stop_times vs tabela materializată trip_segments """
+    engine = create_engine(routing_engine.TransportGraph(db_params_routing).db_url)
+    queries = [
+        ('graf (load_data)', routing_engine.SEGMENTS_QUERY, routing_engine.SEGMENTS_TABLE_QUERY),
+        ('orar', routing_engine.TIMETABLE_QUERY, routing_engine.TIMETABLE_TABLE_QUERY),
+        ('hartă live', live_index.LIVE_SEGMENTS_QUERY, live_index.LIVE_SEGMENTS_TABLE_QUERY),
+    ]
+    with engine.connect().execution_options(stream_results=True) as conn:
+        if not trip_segments.has_table(conn):
+            print("Tabela trip_segments nu există; rulează întâi `flask build-segments`")
+            return
+        for label, join_query, table_query in queries:
+            timings = []
+            for query in (join_query, table_query):
+                t0 = time.perf_counter()
+                rows = sum(len(chunk) for chunk in pd.read_sql(text(query), conn,
+                                                               chunksize=routing_engine.EDGE_CHUNK_ROWS))
+                timings.append((time.perf_counter() - t0, rows))
+            (t_join, rows_join), (t_table, rows_table) = timings
+            print(f"{label:18s} join: {t_join:7.2f} s ({rows_join} rânduri) | "
+                  f"trip_segments: {t_table:7.2f} s ({rows_table} rânduri) | x{t_join / max(t_table, 1e-9):.1f}")
+
+
+BENCHMARKS = {
+    'engines': bench_engines,
+    'search': bench_search,
+    'segments': bench_segments,
+    'walking': bench_walking,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark-uri motor rutare")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--pairs', type=int, default=100, help="Număr de perechi origine-destinație")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--time', default='2025-01-01T12:00', help="time_value trimis la find_route")
+    parser.add_argument('--mode', default='graph', choices=routing_engine.MODES, help="Modul de rutare pentru find_route")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
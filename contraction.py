@@ -0,0 +1,251 @@
+"""
+Contraction Hierarchies (CH) peste view-urile CSR ale grafului stratificat.
+
+Preprocesare: nodurile se "contractă" pe rând, de la cele mai puțin importante; când scoaterea
+unui nod v ar strica un drum minim u -> v -> w, se adaugă scurtătura u -> w (cu v ca nod de mijloc).
+Interogare: Dijkstra bidirecțional doar pe muchiile care urcă în ierarhie (rang mai mare), din start
+înainte și din destinație înapoi; se vizitează câteva sute de noduri în loc de tot graful.
+Ponderile sunt statice (cele din view-ul perioadei), deci costul e identic cu Dijkstra simplu.
+"""
+import heapq
+import time
+
+import numpy as np
+
+from csr_graph import NoPath
+
+# Array-urile unei ierarhii, în ordinea parametrilor din __init__
+CH_ARRAYS = ('rank', 'src', 'dst', 'weight', 'orig', 'left', 'right',
+             'up_ptr', 'up_edge', 'down_ptr', 'down_edge')
+
+# Căutarea de martori (drum alternativ fără nodul contractat) se oprește după atâtea noduri fixate;
+# dacă nu a găsit martor, scurtătura se adaugă oricum (corect, doar puțin mai multe muchii)
+WITNESS_SETTLE_LIMIT = 60
+
+INF = float('inf')
+
+
+class ContractionHierarchy:
+    """
+    Muchiile ierarhiei (originale + scurtături) sunt în array-uri paralele src/dst/weight.
+    orig[k] = muchia din view (>= 0) sau -1 pentru scurtături, formate din muchiile left[k] + right[k].
+    up_edge[up_ptr[u]:up_ptr[u+1]]: muchiile u -> v cu rank[v] > rank[u] (căutarea înainte);
+    down_edge[down_ptr[v]:down_ptr[v+1]]: muchiile u -> v cu rank[u] > rank[v] (căutarea înapoi, din v).
+    """
+
+    def __init__(self, rank, src, dst, weight, orig, left, right, up_ptr, up_edge, down_ptr, down_edge):
+        self.rank = rank
+        self.src, self.dst, self.weight = src, dst, weight
+        self.orig, self.left, self.right = orig, left, right
+        self.up_ptr, self.up_edge = up_ptr, up_edge
+        self.down_ptr, self.down_edge = down_ptr, down_edge
+
+        self._src, self._dst, self._weight = memoryview(src), memoryview(dst), memoryview(weight)
+        self._up = (memoryview(up_ptr), memoryview(up_edge), self._dst)
+        self._down = (memoryview(down_ptr), memoryview(down_edge), self._src)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    @property
+    def num_shortcuts(self):
+        return int(np.count_nonzero(self.orig < 0))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in CH_ARRAYS)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in CH_ARRAYS}
+
+    @classmethod
+    def build(cls, csr, witness_limit=WITNESS_SETTLE_LIMIT):
+        """ Construiește ierarhia pentru un CSRGraph (de obicei view-ul unei perioade) """
+        t0 = time.perf_counter()
+        n = csr.num_nodes
+        src_all = np.repeat(np.arange(n), np.diff(csr.indptr)).tolist()
+        dst_all = csr.indices.tolist()
+        w_all = csr.weight.tolist()
+
+        # muchiile ierarhiei, pe măsură ce apar
+        e_src, e_dst, e_w, e_orig, e_left, e_right = [], [], [], [], [], []
+        out = [dict() for _ in range(n)]  # u -> {v: muchie}, doar între noduri necontractate
+        inn = [dict() for _ in range(n)]
+
+        def add_edge(u, v, w, orig, left=-1, right=-1):
+            k = len(e_src)
+            e_src.append(u); e_dst.append(v); e_w.append(w)
+            e_orig.append(orig); e_left.append(left); e_right.append(right)
+            old = out[u].get(v)
+            if old is None or w < e_w[old]:
+                out[u][v] = k
+                inn[v][u] = k
+            return k
+
+        for e, (u, v, w) in enumerate(zip(src_all, dst_all, w_all)):
+            if u != v:
+                add_edge(u, v, w, e)
+
+        def witness(u, skip, limit):
+            """ Distanțele din u fără nodul `skip`, până la costul `limit` sau witness_limit noduri """
+            dist = {u: 0.0}
+            heap = [(0.0, u)]
+            settled = 0
+            while heap and settled < witness_limit:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]: continue
+                if d > limit: break
+                settled += 1
+                for y, k in out[x].items():
+                    if y == skip: continue
+                    nd = d + e_w[k]
+                    if nd < dist.get(y, INF):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+
+        def shortcuts(v):
+            """ Scurtăturile (u, w, cost, muchie u->v, muchie v->w) necesare la contractarea lui v """
+            needed = []
+            outs = [(w, k) for w, k in out[v].items()]
+            if not outs: return needed
+            max_out = max(e_w[k] for _, k in outs)
+            for u, k_in in inn[v].items():
+                w_in = e_w[k_in]
+                dist = witness(u, v, w_in + max_out)
+                for w, k_out in outs:
+                    if w == u: continue
+                    cost = w_in + e_w[k_out]
+                    if dist.get(w, INF) > cost:
+                        needed.append((u, w, cost, k_in, k_out))
+            return needed
+
+        deleted_neighbors = [0] * n
+
+        def priority(v):
+            # diferența de muchii + numărul vecinilor deja contractați (răspândește contracția uniform)
+            return len(shortcuts(v)) - len(out[v]) - len(inn[v]) + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.zeros(n, dtype=np.int32)
+        contracted = [False] * n
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]: continue
+            # actualizare leneșă: dacă prioritatea reală a crescut peste următorul nod, îl amânăm
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            for u, w, cost, k_in, k_out in shortcuts(v):
+                add_edge(u, w, cost, -1, k_in, k_out)
+            for u in inn[v]:
+                del out[u][v]
+                deleted_neighbors[u] += 1
+            for w in out[v]:
+                del inn[w][v]
+                deleted_neighbors[w] += 1
+            out[v], inn[v] = {}, {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        src = np.asarray(e_src, dtype=np.int32)
+        dst = np.asarray(e_dst, dtype=np.int32)
+        up = rank[dst] > rank[src]
+        up_edge = np.flatnonzero(up)
+        up_edge = up_edge[np.argsort(src[up_edge], kind='stable')]
+        down_edge = np.flatnonzero(~up)
+        down_edge = down_edge[np.argsort(dst[down_edge], kind='stable')]
+        up_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src[up], minlength=n), out=up_ptr[1:])
+        down_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst[~up], minlength=n), out=down_ptr[1:])
+
+        ch = cls(rank, src, dst,
+                 np.asarray(e_w, dtype=np.float64), np.asarray(e_orig, dtype=np.int64),
+                 np.asarray(e_left, dtype=np.int64), np.asarray(e_right, dtype=np.int64),
+                 up_ptr, up_edge.astype(np.int64), down_ptr, down_edge.astype(np.int64))
+        print(f"   -> 🏔️ CH: {n} noduri, {ch.num_edges - ch.num_shortcuts} muchii + {ch.num_shortcuts} scurtături, "
+              f"{ch.nbytes / 1e6:.1f} MB, {time.perf_counter() - t0:.1f} s")
+        return ch
+
+    def shortest_path(self, source, target, stats=None):
+        """
+        Drumul minim source -> target ca listă de (u, v, e), cu e = muchia din view-ul CSR
+        (același format ca CSRGraph.shortest_path). Ridică NoPath dacă nu există drum.
+        """
+        return self.multi_source_path({source: 0.0}, {target: 0.0}, stats)[0]
+
+    def multi_source_path(self, sources, targets, stats=None):
+        """ Ca CSRGraph.multi_source_path: (drum, sursa, ținta) pentru costuri inițiale/finale date """
+        w = self._weight
+        heappush, heappop = heapq.heappush, heapq.heappop
+        dist = (dict(sources), dict(targets))
+        pred = ({}, {})
+        heaps = ([(d, u) for u, d in sources.items()], [(d, u) for u, d in targets.items()])
+        for heap in heaps:
+            heapq.heapify(heap)
+        adjacency = (self._up, self._down)
+        best, meet = INF, None
+        for u in sources.keys() & targets.keys():
+            if sources[u] + targets[u] < best:
+                best, meet = sources[u] + targets[u], u
+        settled = 0
+
+        # fiecare direcție urcă în ierarhie până când nu mai poate îmbunătăți cel mai bun drum
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, u = heappop(heaps[side])
+            if d > dist[side][u]: continue
+            if d >= best:
+                heaps[side].clear()
+                continue
+            settled += 1
+            dist_s, other = dist[side], dist[1 - side]
+            ptr, edge, nbr = adjacency[side]
+            for i in range(ptr[u], ptr[u + 1]):
+                k = edge[i]
+                v = nbr[k]
+                nd = d + w[k]
+                if nd < dist_s.get(v, INF):
+                    dist_s[v] = nd
+                    pred[side][v] = k
+                    heappush(heaps[side], (nd, v))
+                    if v in other and nd + other[v] < best:
+                        best, meet = nd + other[v], v
+
+        if meet is None:
+            raise NoPath("Nu există drum între nodurile cerute")
+        if stats is not None:
+            stats['settled'] = settled
+
+        edges = []
+        source = meet
+        while source in pred[0]:
+            k = pred[0][source]
+            edges.append(k)
+            source = self._src[k]
+        edges.reverse()
+        target = meet
+        while target in pred[1]:
+            k = pred[1][target]
+            edges.append(k)
+            target = self._dst[k]
+        path = [(self._src[k], self._dst[k], int(self.orig[k])) for k in self._unpack(edges)]
+        return path, source, target
+
+    def _unpack(self, edges):
+        """ Înlocuiește scurtăturile cu muchiile originale pe care le reprezintă (în ordine) """
+        stack = list(reversed(edges))
+        while stack:
+            k = stack.pop()
+            if self.orig[k] >= 0:
+                yield k
+            else:
+                stack.append(int(self.right[k]))
+                stack.append(int(self.left[k]))
@@ -0,0 +1,466 @@
+import heapq
+import numpy as np
+
+# Codurile tipurilor de muchii din graful stratificat (ordinea contează, e salvată în array-uri)
+EDGE_TYPES = ('travel', 'board', 'alight', 'walking')
+EDGE_TYPE_CODES = {name: code for code, name in enumerate(EDGE_TYPES)}
+
+INF = float('inf')
+
+# Array-urile per muchie (plus indptr), în ordinea parametrilor din CSRGraph.__init__
+EDGE_ARRAYS = ('indptr', 'indices', 'weight', 'actual_time', 'edge_type', 'edge_line')
+
+
+class NoPath(Exception):
+    """ Nu există drum între nodurile cerute (echivalentul nx.NetworkXNoPath) """
+
+
+class CSRGraph:
+    """
+    Varianta compactă a grafului stratificat: noduri întregi + adiacență CSR în array-uri NumPy.
+
+    - Nodurile 0..len(stop_ids)-1 sunt stațiile fizice, în ordinea din `stop_ids`.
+    - Nodurile virtuale "{stop}|{linie}" urmează după ele (node_stop + node_line).
+    - Muchiile nodului u sunt indices[indptr[u]:indptr[u+1]], cu atributele în array-uri paralele.
+    """
+
+    def __init__(self, stop_ids, lines, node_stop, node_line, indptr, indices,
+                 weight, actual_time, edge_type, edge_line):
+        self.stop_ids = list(stop_ids)
+        self.lines = list(lines)
+        self.node_stop = node_stop
+        self.node_line = node_line
+        self.indptr = indptr
+        self.indices = indices
+        self.weight = weight
+        self.actual_time = actual_time
+        self.edge_type = edge_type
+        self.edge_line = edge_line
+
+        self.stop_index = {sid: i for i, sid in enumerate(self.stop_ids)}
+        self._node_index = None
+
+        # memoryview-urile dau scalari Python direct, mult mai rapid decât indexarea NumPy în bucle
+        self._indptr_mv = memoryview(indptr)
+        self._indices_mv = memoryview(indices)
+        self._weight_mv = memoryview(weight)
+        self._actual_time_mv = memoryview(actual_time)
+        self._node_stop_mv = memoryview(node_stop)
+        self._forward_mv = self._reverse_mv = None
+
+    @property
+    def num_nodes(self):
+        return len(self.node_stop)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.node_stop, self.node_line, self.indptr, self.indices,
+                                      self.weight, self.actual_time, self.edge_type, self.edge_line))
+
+    @classmethod
+    def from_edges(cls, stop_ids, lines, node_stop, node_line, src, dst,
+                   weight, actual_time, edge_type, edge_line):
+        """ Construiește CSR-ul dintr-o listă de muchii (src, dst + atribute paralele) """
+        n = len(node_stop)
+        src = np.asarray(src, dtype=np.int64)
+        order = np.argsort(src, kind='stable')
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        return cls(
+            stop_ids, lines,
+            np.asarray(node_stop, dtype=np.int32),
+            np.asarray(node_line, dtype=np.int32),
+            indptr,
+            np.asarray(dst, dtype=np.int32)[order],
+            np.asarray(weight, dtype=np.float64)[order],
+            np.asarray(actual_time, dtype=np.float64)[order],
+            np.asarray(edge_type, dtype=np.uint8)[order],
+            np.asarray(edge_line, dtype=np.int32)[order],
+        )
+
+    @classmethod
+    def from_networkx(cls, G, stops):
+        """ Convertește graful networkx construit de TransportGraph.load_data """
+        stop_ids = list(stops.keys())
+        index = {sid: i for i, sid in enumerate(stop_ids)}
+        node_stop = list(range(len(stop_ids)))
+        node_line = [-1] * len(stop_ids)
+        lines, line_index = [], {}
+
+        def line_id(name):
+            if name not in line_index:
+                line_index[name] = len(lines)
+                lines.append(name)
+            return line_index[name]
+
+        for node in G.nodes:
+            if node in index: continue
+            phys, _, route = node.partition('|')
+            index[node] = len(node_stop)
+            node_stop.append(index[phys])
+            node_line.append(line_id(route) if route else -1)
+
+        m = G.number_of_edges()
+        src = np.empty(m, dtype=np.int64)
+        dst = np.empty(m, dtype=np.int32)
+        weight = np.empty(m, dtype=np.float64)
+        actual_time = np.empty(m, dtype=np.float64)
+        edge_type = np.empty(m, dtype=np.uint8)
+        edge_line = np.empty(m, dtype=np.int32)
+
+        for k, (u, v, d) in enumerate(G.edges(data=True)):
+            src[k] = index[u]
+            dst[k] = index[v]
+            weight[k] = d.get('weight', 0)
+            actual_time[k] = d.get('actual_time', 0)
+            edge_type[k] = EDGE_TYPE_CODES[d['type']]
+            edge_line[k] = line_id(d.get('line_name', ''))
+
+        return cls.from_edges(stop_ids, lines, node_stop, node_line, src, dst,
+                              weight, actual_time, edge_type, edge_line)
+
+    def edge_subgraph(self, mask):
+        """ Aceleași noduri, doar muchiile cu mask[e] True (array-uri noi, compacte) """
+        mask = np.asarray(mask, dtype=bool)
+        kept = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask, out=kept[1:])
+        return CSRGraph(
+            self.stop_ids, self.lines, self.node_stop, self.node_line,
+            kept[self.indptr],
+            self.indices[mask], self.weight[mask], self.actual_time[mask],
+            self.edge_type[mask], self.edge_line[mask],
+        )
+
+    def replace_line(self, line, edges):
+        """
+        Copie a grafului în care muchiile travel/board/alight ale liniei `line` sunt înlocuite cu `edges`
+        ((u, v, data) ca în networkx). Nodurile virtuale existente ale liniei se refolosesc, cele noi
+        se adaugă la final, deci indicii celorlalte noduri rămân aceiași.
+        """
+        lines = self.lines if line in self.lines else self.lines + [line]
+        line_id = lines.index(line)
+        node_stop, node_line = self.node_stop.tolist(), self.node_line.tolist()
+        layer = {node_stop[i]: i for i in np.flatnonzero(self.node_line == line_id).tolist()}
+
+        def index(node):
+            phys, _, route = node.partition('|')
+            s = self.stop_index[phys]
+            if not route:
+                return s
+            if s not in layer:
+                layer[s] = len(node_stop)
+                node_stop.append(s)
+                node_line.append(line_id)
+            return layer[s]
+
+        new_src, new_dst, new_w, new_t, new_type = [], [], [], [], []
+        for u, v, d in edges:
+            new_src.append(index(u))
+            new_dst.append(index(v))
+            new_w.append(d.get('weight', 0))
+            new_t.append(d.get('actual_time', 0))
+            new_type.append(EDGE_TYPE_CODES[d['type']])
+
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        keep = (self.edge_line != line_id) | (self.edge_type == EDGE_TYPE_CODES['walking'])
+        return CSRGraph.from_edges(
+            self.stop_ids, lines, node_stop, node_line,
+            np.concatenate([src[keep], np.asarray(new_src, dtype=np.int64)]),
+            np.concatenate([self.indices[keep], np.asarray(new_dst, dtype=np.int32)]),
+            np.concatenate([self.weight[keep], np.asarray(new_w, dtype=np.float64)]),
+            np.concatenate([self.actual_time[keep], np.asarray(new_t, dtype=np.float64)]),
+            np.concatenate([self.edge_type[keep], np.asarray(new_type, dtype=np.uint8)]),
+            np.concatenate([self.edge_line[keep], np.full(len(new_src), line_id, dtype=np.int32)]),
+        )
+
+    def line_segments(self, line):
+        """ Perechile (stație, stația următoare) parcurse de linie, din muchiile ei 'travel' """
+        if line not in self.lines:
+            return []
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        mask = (self.edge_line == self.lines.index(line)) & (self.edge_type == EDGE_TYPE_CODES['travel'])
+        u = self.node_stop[src[mask]].tolist()
+        v = self.node_stop[self.indices[mask]].tolist()
+        return [(self.stop_ids[a], self.stop_ids[b]) for a, b in zip(u, v)]
+
+    def edge_arrays(self):
+        return {name: getattr(self, name) for name in EDGE_ARRAYS}
+
+    def to_networkx(self):
+        """ Reconstruiește DiGraph-ul networkx (aceleași id-uri de noduri și atribute ca la load_data) """
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(self.stop_ids, type='physical')
+        names = [self.node_id(i) for i in range(self.num_nodes)]
+        counts = np.diff(self.indptr)
+        src = np.repeat(np.arange(self.num_nodes), counts).tolist()
+        G.add_edges_from(
+            (names[u], names[v], self._edge_attrs(w, t, code, line))
+            for u, v, w, t, code, line in zip(src, self.indices.tolist(), self.weight.tolist(),
+                                              self.actual_time.tolist(), self.edge_type.tolist(),
+                                              self.edge_line.tolist())
+        )
+        return G
+
+    # --- Identificatori noduri ---
+
+    def node_id(self, i):
+        """ Indicele intern -> id-ul text folosit de networkx ("{stop}" sau "{stop}|{linie}") """
+        sid = self.stop_ids[self.node_stop[i]]
+        line = self.node_line[i]
+        return sid if line < 0 else f"{sid}|{self.lines[line]}"
+
+    def node_index(self, node_id):
+        if self._node_index is None:
+            self._node_index = {self.node_id(i): i for i in range(self.num_nodes)}
+        return self._node_index[node_id]
+
+    def edge_data(self, e):
+        """ Atributele muchiei e, în același format ca dict-ul de muchie din networkx """
+        return self._edge_attrs(float(self.weight[e]), float(self.actual_time[e]),
+                                int(self.edge_type[e]), int(self.edge_line[e]))
+
+    def _edge_attrs(self, weight, actual_time, code, line):
+        data = {
+            'weight': weight,
+            'actual_time': actual_time,
+            'type': EDGE_TYPES[code],
+            'line_name': self.lines[line],
+        }
+        if code == EDGE_TYPE_CODES['board']:
+            data['is_night'] = data['line_name'].startswith('N')
+        return data
+
+    # --- Căutare ---
+
+    def shortest_path(self, source, target, stats=None):
+        """
+        Dijkstra între două noduri interne, pe câmpul `weight`.
+        Întoarce lista de (u, v, e) a drumului; ridică NoPath dacă ținta nu e accesibilă.
+        Dacă se dă `stats` (dict), primește 'settled' = numărul de noduri fixate.
+        """
+        return self.astar_path(source, target, None, stats)
+
+    def astar_path(self, source, target, h_stop, stats=None):
+        """
+        A*: ca shortest_path, cu estimarea h_stop[stație] a costului rămas până la țintă
+        (trebuie să fie consistentă; nodurile virtuale o moștenesc de la stația lor).
+        h_stop=None înseamnă Dijkstra simplu.
+        """
+        indptr, indices, w = self._indptr_mv, self._indices_mv, self._weight_mv
+        node_stop = self._node_stop_mv
+
+        dist = {source: 0.0}
+        pred = {}
+        done = set()
+        heap = [(0.0, source)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heap:
+            _, u = heappop(heap)
+            if u in done: continue
+            if u == target: break
+            done.add(u)
+            d = dist[u]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    pred[v] = (u, e)
+                    heappush(heap, (nd + h_stop[node_stop[v]] if h_stop is not None else nd, v))
+        else:
+            raise NoPath(f"Nu există drum {source} -> {target}")
+
+        if stats is not None:
+            stats['settled'] = len(done)
+        return self._unwind(pred, source, target)
+
+    def within_cost(self, sources, limit, cost='actual_time'):
+        """
+        Dijkstra mărginit pe câmpul `cost` ('actual_time' sau 'weight'): sources e dict nod -> cost inițial.
+        Întoarce {nod: cost minim} pentru toate nodurile atinse cu cost <= limit (căutarea se oprește acolo).
+        """
+        indptr, indices = self._indptr_mv, self._indices_mv
+        w = self._actual_time_mv if cost == 'actual_time' else self._weight_mv
+
+        dist = {u: d for u, d in sources.items() if d <= limit}
+        done = {}
+        heap = [(d, u) for u, d in dist.items()]
+        heapq.heapify(heap)
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heap:
+            d, u = heappop(heap)
+            if u in done: continue
+            done[u] = d
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd <= limit and nd < dist.get(v, INF):
+                    dist[v] = nd
+                    heappush(heap, (nd, v))
+        return done
+
+    def shortest_path_tree(self, source, targets=None):
+        """
+        Dijkstra unu-la-mulți din `source`: se oprește când toate nodurile din `targets` sunt fixate
+        (targets=None: tot graful). Întoarce (dist, pred); drumurile se scot cu tree_path.
+        Drumul până la fiecare țintă e același pe care l-ar da shortest_path.
+        """
+        indptr, indices, w = self._indptr_mv, self._indices_mv, self._weight_mv
+        remaining = set(targets) if targets is not None else None
+
+        dist = {source: 0.0}
+        pred = {}
+        done = set()
+        heap = [(0.0, source)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heap:
+            d, u = heappop(heap)
+            if u in done: continue
+            done.add(u)
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining: break
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    pred[v] = (u, e)
+                    heappush(heap, (nd, v))
+
+        return {u: dist[u] for u in done}, pred
+
+    def tree_path(self, pred, source, target):
+        """ Drumul source -> target din arborele dat de shortest_path_tree (NoPath dacă nu e atins) """
+        if target != source and target not in pred:
+            raise NoPath(f"Nu există drum {source} -> {target}")
+        return self._unwind(pred, source, target)
+
+    def multi_source_path(self, sources, targets, stats=None):
+        """
+        Dijkstra cu mai multe surse și ținte: sources/targets sunt dict nod -> cost inițial/final
+        (ex: minutele de mers pe jos până la stație). Alege combinația cu costul total minim
+        într-o singură căutare. Întoarce (drum ca la shortest_path, sursa, ținta).
+        """
+        indptr, indices, w = self._indptr_mv, self._indices_mv, self._weight_mv
+
+        dist = dict(sources)
+        pred = {}
+        done = set()
+        heap = [(d, u) for u, d in sources.items()]
+        heapq.heapify(heap)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        best, best_target = INF, None
+
+        while heap:
+            d, u = heappop(heap)
+            if d >= best: break
+            if u in done: continue
+            done.add(u)
+            if u in targets and d + targets[u] < best:
+                best, best_target = d + targets[u], u
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    pred[v] = (u, e)
+                    heappush(heap, (nd, v))
+
+        if best_target is None:
+            raise NoPath("Nu există drum între stațiile candidate")
+        if stats is not None:
+            stats['settled'] = len(done)
+
+        source = best_target
+        while source in pred:
+            source = pred[source][0]
+        return self._unwind(pred, source, best_target), source, best_target
+
+    def bidirectional_path(self, source, target, stats=None):
+        """
+        Dijkstra bidirecțional: înainte din `source` pe muchiile de ieșire, înapoi din `target` pe cele
+        de intrare; se oprește când suma vârfurilor celor două cozi nu mai poate bate cel mai bun drum.
+        """
+        if source == target:
+            return []
+        w = self._weight_mv
+        # (indptr, vecin, muchie) pentru fiecare direcție
+        adjacency = (self._forward(), self._reverse())
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({}, {})
+        done = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = INF, None
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best: break
+            # extindem direcția cu mai puține noduri în coadă
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            d, u = heappop(heaps[side])
+            if u in done[side]: continue
+            done[side].add(u)
+            dist_s, other = dist[side], dist[1 - side]
+            ptr, nbr, edge = adjacency[side]
+            for k in range(ptr[u], ptr[u + 1]):
+                v, e = nbr[k], edge[k]
+                nd = d + w[e]
+                if nd < dist_s.get(v, INF):
+                    dist_s[v] = nd
+                    pred[side][v] = (u, e)
+                    heappush(heaps[side], (nd, v))
+                if v in other and nd + other[v] < best:
+                    best, meet = nd + other[v], v
+
+        if meet is None:
+            raise NoPath(f"Nu există drum {source} -> {target}")
+        if stats is not None:
+            stats['settled'] = len(done[0]) + len(done[1])
+
+        path = self._unwind(pred[0], source, meet)
+        v = meet
+        while v != target:
+            u, e = pred[1][v]  # muchia e merge v -> u
+            path.append((v, u, e))
+            v = u
+        return path
+
+    def _unwind(self, pred, source, target):
+        path = []
+        v = target
+        while v != source:
+            u, e = pred[v]
+            path.append((u, v, e))
+            v = u
+        path.reverse()
+        return path
+
+    def _forward(self):
+        if self._forward_mv is None:
+            self._forward_mv = (self._indptr_mv, self._indices_mv,
+                                memoryview(np.arange(self.num_edges, dtype=np.int64)))
+        return self._forward_mv
+
+    def _reverse(self):
+        """ Adiacența inversă (muchiile de intrare ale fiecărui nod), calculată la prima nevoie """
+        if self._reverse_mv is None:
+            src = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind='stable')
+            rev_indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.num_nodes), out=rev_indptr[1:])
+            self._reverse_mv = (memoryview(rev_indptr), memoryview(src[order]),
+                                memoryview(order.astype(np.int64)))
+        return self._reverse_mv
@@ -0,0 +1,205 @@
+"""
+Outbox pentru emailuri: cererea (ex: buy_ticket) doar scrie un rând în tabela email_outbox, în aceeași
+tranzacție cu biletul, și răspunde imediat. Un thread în fundal golește outbox-ul pe loturi, pe o singură
+conexiune SMTP autentificată (refolosită cât timp sunt mesaje), cu reîncercări cu backoff exponențial.
+Mesajele respinse definitiv sau care epuizează încercările ajung în starea 'dead' (dead-letter).
+
+Stări: pending -> sending -> sent | pending (reîncercare) | dead.
+Un rând 'sending' e "închiriat" până la next_attempt_at; dacă procesul moare în timpul trimiterii,
+alt worker îl preia după expirare.
+"""
+import json
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import email_service
+
+BATCH_SIZE = 50
+ENQUEUE_CHUNK_ROWS = 1000  # rânduri per INSERT la enqueue_many
+POLL_SECONDS = 30          # verificare periodică pentru reîncercările scadente
+LEASE_SECONDS = 300        # cât timp e rezervat un mesaj pentru worker-ul care îl trimite
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30  # 30 s, 1 min, 2 min, ... până la BACKOFF_MAX_SECONDS
+BACKOFF_MAX_SECONDS = 3600
+SMTP_IDLE_SECONDS = 60     # conexiunea SMTP se închide după atâta timp fără mesaje
+
+# Tipul mesajului -> funcția care construiește emailul din (destinatar, payload)
+BUILDERS = {
+    'ticket': email_service.build_ticket_email,
+}
+
+
+def backoff_seconds(attempts):
+    """ Întârzierea înainte de încercarea următoare (cu jitter, ca reîncercările să nu vină toate odată) """
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxWorker:
+    """
+    `model` e modelul SQLAlchemy al tabelei email_outbox (EmailOutbox din app.py); `mailer_factory()`
+    dă un obiect cu send(msg) / close() (implicit email_service.SMTPMailer).
+    """
+
+    def __init__(self, app, db, model, mailer_factory=email_service.SMTPMailer, batch_size=BATCH_SIZE,
+                 poll=POLL_SECONDS):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.mailer_factory = mailer_factory
+        self.batch_size = batch_size
+        self.poll = poll
+        self._mailer = None
+        self._last_sent = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, to_email, kind, payload):
+        """ Adaugă mesajul în sesiunea curentă; se trimite după commit-ul cererii (apoi apelați wake()) """
+        row = self.model(to_email=to_email, kind=kind, payload=json.dumps(payload), status='pending',
+                         attempts=0, next_attempt_at=datetime.now(), created_at=datetime.now())
+        self.db.session.add(row)
+        return row
+
+    def enqueue_many(self, kind, items, chunk_size=ENQUEUE_CHUNK_ROWS):
+        """
+        Pune în outbox, în bloc, mesajele (adresă, payload) din `items` (poate fi generator): inserări
+        pe loturi de chunk_size rânduri, un commit per lot. Întoarce numărul de mesaje adăugate.
+        """
+        total = 0
+        chunk = []
+        for to_email, payload in items:
+            now = datetime.now()
+            chunk.append({'to_email': to_email, 'kind': kind, 'payload': json.dumps(payload), 'status': 'pending',
+                          'attempts': 0, 'next_attempt_at': now, 'created_at': now})
+            if len(chunk) >= chunk_size:
+                total += self._insert(chunk)
+                chunk = []
+        if chunk:
+            total += self._insert(chunk)
+        self.wake()
+        return total
+
+    def _insert(self, rows):
+        self.db.session.execute(self.db.insert(self.model), rows)
+        self.db.session.commit()
+        self.wake()
+        return len(rows)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+        self._thread.start()
+        print("📬 Worker outbox email pornit")
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.drain_once() == self.batch_size:
+                    pass
+            except Exception:
+                traceback.print_exc()
+            if self._mailer is not None and time.monotonic() - self._last_sent > SMTP_IDLE_SECONDS:
+                self._close_mailer()
+            self._wake.wait(timeout=min(self.poll, SMTP_IDLE_SECONDS))
+            self._wake.clear()
+        self._close_mailer()
+
+    def drain_once(self):
+        """
+        Revendică un lot de mesaje scadente, le trimite pe conexiunea comună și salvează rezultatul.
+        Întoarce numărul de mesaje revendicate (0 dacă serverul SMTP a căzut: restul lotului e amânat).
+        """
+        with self.app.app_context():
+            batch = self._claim()
+            for i, row in enumerate(batch):
+                if not self._deliver(row):
+                    # serverul nu răspunde: restul lotului așteaptă aceeași perioadă, fără să consume încercări
+                    retry_at = datetime.now() + timedelta(seconds=backoff_seconds(1))
+                    for rest in batch[i + 1:]:
+                        rest.status = 'pending'
+                        rest.next_attempt_at = retry_at
+                    batch = []
+                    break
+            self.db.session.commit()
+        return len(batch)
+
+    def _claim(self):
+        Outbox, session = self.model, self.db.session
+        now = datetime.now()
+        rows = (Outbox.query
+                .filter(Outbox.status.in_(('pending', 'sending')), Outbox.next_attempt_at <= now)
+                .order_by(Outbox.next_attempt_at, Outbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all())
+        for row in rows:
+            row.status = 'sending'
+            row.next_attempt_at = now + timedelta(seconds=LEASE_SECONDS)
+        session.commit()
+        return rows
+
+    def _deliver(self, row):
+        """ False dacă eroarea ține de server / conexiune (nu de mesaj) """
+        row.attempts += 1
+        try:
+            msg = BUILDERS[row.kind](row.to_email, json.loads(row.payload))
+            if self._mailer is None:
+                self._mailer = self.mailer_factory()
+            self._mailer.send(msg)
+        except email_service.PermanentEmailError as e:
+            self._fail(row, e, permanent=True)
+        except (KeyError, ValueError) as e:
+            # tip necunoscut / payload invalid: nu se va rezolva la reîncercare
+            self._fail(row, e, permanent=True)
+        except Exception as e:
+            # conexiune căzută, timeout, 4xx: conexiunea se redeschide la mesajul următor
+            self._close_mailer()
+            self._fail(row, e, permanent=False)
+            return False
+        else:
+            row.status = 'sent'
+            row.sent_at = datetime.now()
+            row.last_error = None
+            self._last_sent = time.monotonic()
+        return True
+
+    def _fail(self, row, error, permanent):
+        row.last_error = f"{type(error).__name__}: {error}"[:500]
+        if permanent or row.attempts >= MAX_ATTEMPTS:
+            row.status = 'dead'
+            print(f"☠️ Email {row.id} către {row.to_email} abandonat după {row.attempts} încercări: {row.last_error}")
+        else:
+            row.status = 'pending'
+            row.next_attempt_at = datetime.now() + timedelta(seconds=backoff_seconds(row.attempts))
+            print(f"⚠️ Email {row.id} către {row.to_email} eșuat (încercarea {row.attempts}), reîncercare la "
+                  f"{row.next_attempt_at:%H:%M:%S}: {row.last_error}")
+
+    def _close_mailer(self):
+        mailer, self._mailer = self._mailer, None
+        if mailer is not None:
+            try:
+                mailer.close()
+            except Exception:
+                traceback.print_exc()
+
+    def stats(self):
+        """ Numărul de mesaje pe stare (pentru panoul de admin) """
+        with self.app.app_context():
+            rows = (self.db.session.query(self.model.status, self.db.func.count(self.model.id))
+                    .group_by(self.model.status).all())
+        return {status: count for status, count in rows}
@@ -1,116 +1,262 @@
+import base64
+import os
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import ssl
+import textwrap
+from collections import namedtuple
+from email.header import Header
+from email.utils import formataddr, formatdate, parseaddr
+from functools import lru_cache
+from html import escape
+from string import Template
 import logging
 
-def send_ticket_email(to_email, ticket_details):
+# --- CONFIGURARE SMTP (din variabile de mediu, ca parola să nu stea în cod) ---
+SMTP_SERVER = os.environ.get('SMTP_SERVER', '')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '465'))
+SMTP_SECURITY = os.environ.get('SMTP_SECURITY', 'ssl')  # ssl | starttls | none (ex: server SMTP local de test)
+SENDER_EMAIL = os.environ.get('SENDER_EMAIL', '')
+SENDER_PASSWORD = os.environ.get('SENDER_PASSWORD', '')
+SMTP_TIMEOUT = 15  # secunde, pentru conectare și fiecare comandă SMTP
+
+
+class PermanentEmailError(Exception):
     """
-    Trimite un email HTML stilizat (Verde-Albastru) cu detaliile biletului.
+    Mesajul nu poate fi trimis: serverul l-a respins definitiv (cod 5xx pentru destinatar / conținut)
+    sau adresa nu poate fi pusă în antet; nu are rost reîncercarea
     """
-    
-    # --- CONFIGURARE SMTP ---
-    SMTP_SERVER = ""
-    SMTP_PORT =  
-    SENDER_EMAIL = ""
-    # ⚠️ Asigură-te că parola este corectă aici sau în variabile de mediu
-    SENDER_PASSWORD = "" 
-
-    # Creare container email (Multipart)
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = f"✅ Biletul tău este activ: {ticket_details['type']}"
-    msg['From'] = SENDER_EMAIL
-    msg['To'] = to_email
-
-    # --- TEMPLATE HTML (Verde-Albastru) ---
-    html_content = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #f4f7f6; margin: 0; padding: 0; }}
-            .container {{ max-width: 600px; margin: 20px auto; background-color: #ffffff; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 15px rgba(0,0,0,0.1); }}
-            .header {{ 
-                background: linear-gradient(135deg, #005eb8 0%, #009345 100%); 
-                padding: 30px; 
-                text-align: center; 
-                color: white; 
-            }}
-            .header h1 {{ margin: 0; font-size: 24px; font-weight: bold; letter-spacing: 1px; }}
-            .content {{ padding: 30px; color: #333333; }}
-            .ticket-card {{
-                background-color: #f8fcf9;
-                border-left: 5px solid #009345;
-                padding: 20px;
-                margin: 20px 0;
-                border-radius: 4px;
-            }}
-            .label {{ font-size: 12px; color: #888888; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 4px; }}
-            .value {{ font-size: 18px; font-weight: bold; color: #005eb8; margin-bottom: 15px; }}
-            .footer {{ background-color: #f0f0f0; padding: 20px; text-align: center; font-size: 12px; color: #888888; }}
-            .btn {{
-                display: inline-block;
-                padding: 12px 24px;
-                background-color: #005eb8;
-                color: #ffffff !important;
-                text-decoration: none;
-                border-radius: 25px;
-                font-weight: bold;
-                margin-top: 10px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Smart Transport București</h1>
-                <p style="margin-top: 10px; opacity: 0.9;">Confirmare Plată</p>
-            </div>
-            <div class="content">
-                <p>Salut,</p>
-                <p>Îți mulțumim că folosești serviciile noastre! Biletul tău a fost activat cu succes.</p>
-                
-                <div class="ticket-card">
-                    <div class="label">Tip Bilet</div>
-                    <div class="value" style="font-size: 22px;">{ticket_details['type']}</div>
-                    
-                    <div class="label">Preț</div>
-                    <div class="value">{ticket_details['price']} RON</div>
-                    
-                    <div class="label">Valabil Până La</div>
-                    <div class="value" style="color: #d9534f;">{ticket_details['expiry']}</div>
-                    
-                    <div class="label">ID Tranzacție</div>
-                    <div class="value" style="margin-bottom: 0; color: #333;">#{ticket_details.get('id', 'N/A')}</div>
-                </div>
-
-                <p style="text-align: center;">
-                    <a href="http://localhost:5000/tickets" class="btn">Vezi Biletul în Aplicație</a>
-                </p>
-            </div>
-            <div class="footer">
-                &copy; 2025 STB Planner. Toate drepturile rezervate.<br>
-                Acesta este un mesaj automat. Te rugăm să nu răspunzi.
-            </div>
-        </div>
-    </body>
-    </html>
+
+
+# Șabloanele emailurilor: templates/email/<nume>.html (cu $css pentru <nume>.css) și <nume>.txt
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+
+TICKET_SUBJECT = "✅ Biletul tău este activ: $type"
+
+# Scheletul MIME multipart/alternative (text + HTML, ambele base64), compilat o dată per șablon.
+# Granița e fixă: base64 nu conține niciodată '_', deci nu poate apărea în conținut.
+MIME_BOUNDARY = "===============stb_alternative=="
+MIME_SKELETON = "\r\n".join([
+    'Content-Type: multipart/alternative; boundary="$boundary"',
+    "MIME-Version: 1.0",
+    "Subject: $subject",
+    "From: $sender",
+    "To: $to",
+    "Date: $date",
+    "",
+    "--$boundary",
+    'Content-Type: text/plain; charset="utf-8"',
+    "Content-Transfer-Encoding: base64",
+    "",
+    "$text--$boundary",
+    'Content-Type: text/html; charset="utf-8"',
+    "Content-Transfer-Encoding: base64",
+    "",
+    "$html--$boundary--",
+    "",
+])
+
+# Mesaj gata de trimis: destinatarul și sursa MIME completă (bytes)
+RenderedEmail = namedtuple('RenderedEmail', 'to subject raw')
+
+
+class EmailTemplate:
+    """ Un email compilat: subiectul, textul, HTML-ul (cu CSS-ul deja inserat) și scheletul MIME """
+
+    def __init__(self, subject, html, text):
+        self.subject = Template(subject)
+        self.html = Template(html)
+        self.text = Template(text)
+        self.skeleton = Template(Template(MIME_SKELETON).safe_substitute(boundary=MIME_BOUNDARY))
+
+    def render(self, to_email, fields, sender=None):
+        """
+        Substituie doar câmpurile mesajului; câmpurile din HTML sunt escapate, adresele validate și
+        codificate (ridică PermanentEmailError pentru o adresă care nu poate fi pusă în antet)
+        """
+        to_addr, to_header = address_header(to_email)
+        if not to_addr:
+            raise PermanentEmailError("Destinatar lipsă")
+        _, sender_header = address_header(sender if sender is not None else SENDER_EMAIL)
+        subject = self.subject.substitute(fields)
+        text = self.text.substitute(fields)
+        html = self.html.substitute({k: escape(str(v)) for k, v in fields.items()})
+        raw = self.skeleton.substitute(
+            subject=Header(subject, 'utf-8').encode(linesep='\r\n'),  # antetele lungi se împart pe linii CRLF, ca restul scheletului
+            sender=sender_header,
+            to=to_header,
+            date=formatdate(localtime=True),
+            text=_base64_lines(text),
+            html=_base64_lines(html),
+        )
+        return RenderedEmail(to_addr, subject, raw.encode('ascii'))
+
+
+def address_header(value):
     """
+    Adresa ("nume <adresă>" sau doar adresa) -> (adresa pentru SMTP, valoarea ASCII pentru antet).
+    Scheletul MIME nu mai trece prin email.message, deci validarea se face aici: CR/LF ar adăuga
+    antete noi, iar o parte locală non-ASCII nu poate fi trimisă fără SMTPUTF8. Numele se codifică
+    RFC 2047, domeniile internaționale în IDNA.
+    """
+    value = value or ''
+    if '\r' in value or '\n' in value:
+        raise PermanentEmailError(f"Adresă invalidă (conține CR/LF): {value!r}")
+    name, addr = parseaddr(value)
+    if value and not addr:
+        raise PermanentEmailError(f"Adresă invalidă: {value!r}")
+    local, _, domain = addr.rpartition('@')
+    if not addr.isascii():
+        if not local.isascii():
+            raise PermanentEmailError(f"Adresă cu caractere non-ASCII înainte de @: {addr!r}")
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError as e:
+            raise PermanentEmailError(f"Domeniu invalid: {addr!r}") from e
+        addr = f"{local}@{domain}"
+    return addr, formataddr((name, addr), charset='utf-8')
+
 
-    # Versiune text simplu (fallback)
-    text_content = f"Salut! Ai cumpărat biletul: {ticket_details['type']}. Valabil până la: {ticket_details['expiry']}. Preț: {ticket_details['price']} RON."
+def _base64_lines(content):
+    """ base64 în linii de 76 de caractere terminate cu CRLF, ca în MIME """
+    return base64.encodebytes(content.encode('utf-8')).decode('ascii').replace('\n', '\r\n')
 
-    # Atașare părți
-    msg.attach(MIMEText(text_content, 'plain'))
-    msg.attach(MIMEText(html_content, 'html'))
 
+@lru_cache(maxsize=None)
+def load_template(name, subject):
+    """
+    Citește și compilează o singură dată per proces șabloanele unui email.
+    CSS-ul e inserat în <style> acum, deci la fiecare mesaj se substituie doar câmpurile lui.
+    """
+    with open(os.path.join(TEMPLATE_DIR, f'{name}.css'), encoding='utf-8') as f:
+        css = textwrap.indent(f.read().rstrip(), ' ' * 8)
+    with open(os.path.join(TEMPLATE_DIR, f'{name}.html'), encoding='utf-8') as f:
+        html = Template(f.read()).safe_substitute(css=css)
+    with open(os.path.join(TEMPLATE_DIR, f'{name}.txt'), encoding='utf-8') as f:
+        text = f.read().rstrip('\n')
+    return EmailTemplate(subject, html, text)
+
+
+def build_ticket_email(to_email, ticket_details):
+    """
+    Emailul HTML stilizat (Verde-Albastru) cu detaliile biletului, gata de trimis.
+    """
+    fields = {
+        'type': ticket_details['type'],
+        'price': ticket_details['price'],
+        'expiry': ticket_details['expiry'],
+        'id': ticket_details.get('id', 'N/A'),
+    }
+    return load_template('ticket', TICKET_SUBJECT).render(to_email, fields)
+
+
+class SMTPMailer:
+    """
+    O conexiune SMTP autentificată, deschisă la primul mesaj și refolosită pentru următoarele.
+    Dacă serverul a închis-o între timp, se reconectează o dată și retrimite.
+    """
+
+    def __init__(self, server=None, port=None, security=None, sender=None, password=None, timeout=SMTP_TIMEOUT):
+        self.server = server or SMTP_SERVER
+        self.port = port or SMTP_PORT
+        self.security = security or SMTP_SECURITY
+        self.sender = sender or SENDER_EMAIL
+        self.password = SENDER_PASSWORD if password is None else password
+        self.timeout = timeout
+        self._smtp = None
+
+    @property
+    def connected(self):
+        return self._smtp is not None
+
+    def connect(self):
+        print(f"🔌 Conectare la {self.server}:{self.port}...")
+        if self.security == 'ssl':
+            smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            if self.security == 'starttls':
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            if self.password:
+                smtp.login(self.sender, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+
+    def send(self, msg):
+        """ Trimite un mesaj (RenderedEmail sau email.message.Message); ridică PermanentEmailError pentru respingeri definitive, altfel excepția SMTP """
+        for attempt in (0, 1):
+            if self._smtp is None:
+                self.connect()
+            try:
+                if isinstance(msg, RenderedEmail):
+                    self._smtp.sendmail(self.sender, [msg.to], msg.raw)
+                else:
+                    self._smtp.send_message(msg, from_addr=self.sender or None)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if attempt: raise
+            except smtplib.SMTPRecipientsRefused as e:
+                if all(code >= 500 for code, _ in e.recipients.values()):
+                    raise PermanentEmailError(str(e)) from e
+                raise
+            except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                if e.smtp_code >= 500:
+                    raise PermanentEmailError(str(e)) from e
+                raise
+
+    def close(self):
+        if self._smtp is None: return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def send_ticket_email(to_email, ticket_details):
+    """ Trimite imediat (pe o conexiune nouă) emailul unui bilet; aplicația folosește outbox-ul (email_outbox.py) """
     try:
-        print(f"🔌 Conectare la {SMTP_SERVER}...")
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
-            
+        with SMTPMailer() as mailer:
+            mailer.send(build_ticket_email(to_email, ticket_details))
         print(f"✅ Email trimis cu succes către {to_email}!")
         return True
 
     except Exception as e:
         print(f"❌ Eroare la trimiterea emailului: {str(e)}")
         return False
+
+
+def send_ticket_emails(items, mailer=None):
+    """
+    Trimite în bloc emailurile biletelor, pe o singură conexiune SMTP; `items` e un iterabil (poate fi
+    generator) de (adresă, detalii bilet), consumat pe rând. Întoarce (trimise, [(adresă, eroare), ...]).
+    Pentru trimitere asincronă, aplicația le pune în outbox cu OutboxWorker.enqueue_many.
+    """
+    sent, failed = 0, []
+    own = mailer is None
+    mailer = mailer or SMTPMailer()
+    try:
+        for to_email, ticket_details in items:
+            try:
+                mailer.send(build_ticket_email(to_email, ticket_details))
+                sent += 1
+            except PermanentEmailError as e:
+                failed.append((to_email, str(e)))
+            except Exception as e:
+                # conexiunea e probabil pierdută: o redeschidem la mesajul următor
+                mailer.close()
+                failed.append((to_email, str(e)))
+    finally:
+        if own:
+            mailer.close()
+    print(f"✅ Emailuri bilete: {sent} trimise, {len(failed)} eșuate")
+    return sent, failed
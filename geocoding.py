@@ -0,0 +1,244 @@
+"""
+Geocodare pentru /calculate_route.
+
+Ordinea de căutare pentru o adresă:
+1. gazetarul offline construit din numele stațiilor (fără rețea);
+2. cache-ul persistent (SQLite, cu TTL și evacuare LRU), care ține și răspunsurile negative;
+3. geocoderul extern (implicit Nominatim), injectat în Geocoder - orice obiect cu .geocode(text).
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from spatial_index import local_distance_m
+
+GeocodeResult = namedtuple('GeocodeResult', 'address latitude longitude source')
+
+CACHE_TTL = 30 * 24 * 3600      # adrese găsite
+NEGATIVE_TTL = 24 * 3600        # adrese negăsite (se reîncearcă mai repede)
+CACHE_MAX_ENTRIES = 50000
+CACHE_FILE = "geocode_cache.sqlite3"
+
+DEFAULT_COUNTRY = "Romania"
+
+GEOCODE_WORKERS = 8   # apeluri externe simultane, pentru tot procesul
+GEOCODE_TIMEOUT = 10  # secunde, pentru toate adresele unei cereri
+
+HUB_CLUSTER_M = 600   # ca HUB_TRANSFER_M din routing_engine: stații cu același nume mai apropiate formează un grup
+
+# Adrese de stradă: _clean_name scoate prefixele ("Strada Victoriei 12" -> "VICTORIEI 12"), deci gazetarul
+# le-ar potrivi cu stația "Victoriei". Le verificăm pe textul brut, înainte de curățare.
+STREET_PREFIX = re.compile(r'^(strada|str|bulevardul|bulevard|blvd|bd|soseaua|sos|calea|aleea|al|intrarea|splaiul|drumul|fundatura)\b\.?', re.I)
+HOUSE_NUMBER = re.compile(r'\b(nr|numarul)\b\.?|\b\d+[a-z]?\b', re.I)
+
+
+class GeocodeTimeout(Exception):
+    """ Geocodarea nu s-a terminat în timpul alocat """
+
+
+def fold(text):
+    """ Fără diacritice (ș -> s, ă -> a), pentru comparații """
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def normalize_address(address):
+    """ Cheia de cache: fără diacritice, litere mici, spații și virgule uniformizate """
+    text = fold(address).lower()
+    text = re.sub(r'\s*,\s*', ', ', text)
+    return " ".join(text.split()).strip(' ,')
+
+
+class Gazetteer:
+    """
+    Numele stațiilor curățate cu _clean_name (ca la gruparea HUB-urilor) -> centrul stațiilor cu acel nume.
+    Răspunde la căutări de tipul "Piața Unirii" sau "Gara de Nord" fără niciun apel extern.
+    Stațiile cu același nume se grupează ca HUB-urile (la mai puțin de `cluster_m` metri una de alta);
+    numele care dau mai multe grupuri (ex: "Școala ..." în cartiere diferite) nu intră în gazetar,
+    ca să fie căutate în cache / la geocoderul extern în loc să primească un punct între ele.
+    """
+
+    def __init__(self, entries, clean):
+        self.entries = entries  # nume curat -> GeocodeResult
+        self.clean = clean
+
+    @classmethod
+    def from_stops(cls, stops, clean, cluster_m=HUB_CLUSTER_M):
+        groups = {}
+        for data in stops.values():
+            key = clean(fold(data['name']))
+            if len(key) > 3:
+                groups.setdefault(key, []).append(data)
+        entries = {}
+        for key, members in groups.items():
+            clusters = _clusters(members, cluster_m)
+            if len(clusters) != 1:
+                continue
+            entries[key] = GeocodeResult(
+                members[0]['name'],
+                sum(m['lat'] for m in members) / len(members),
+                sum(m['lon'] for m in members) / len(members),
+                'gazetteer',
+            )
+        return cls(entries, clean)
+
+    def lookup(self, address):
+        # doar prima parte a adresei ("Piata Unirii, Bucuresti" -> "Piata Unirii")
+        first = fold(address.split(',')[0]).strip()
+        if STREET_PREFIX.match(first) or HOUSE_NUMBER.search(first):
+            return None  # adresă de stradă, nu nume de stație
+        key = self.clean(first)
+        return self.entries.get(key) if len(key) > 3 else None
+
+
+def _clusters(members, meters):
+    """ Componentele conexe ale stațiilor aflate la mai puțin de `meters` una de alta (ca perechile HUB) """
+    if len(members) == 1:
+        return [members]
+    lats = np.array([m['lat'] for m in members], dtype=np.float64)
+    lons = np.array([m['lon'] for m in members], dtype=np.float64)
+    near = local_distance_m(lats[:, None], lons[:, None], lats[None, :], lons[None, :]) < meters
+    label = [-1] * len(members)
+    clusters = []
+    for seed in range(len(members)):
+        if label[seed] >= 0: continue
+        label[seed] = len(clusters)
+        stack, group = [seed], []
+        while stack:
+            k = stack.pop()
+            group.append(members[k])
+            for j in np.nonzero(near[k])[0].tolist():
+                if label[j] < 0:
+                    label[j] = label[seed]
+                    stack.append(j)
+        clusters.append(group)
+    return clusters
+
+
+class GeocodeCache:
+    """ Cache persistent adresă normalizată -> coordonate, într-un fișier SQLite """
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # o singură conexiune, folosită din mai multe thread-uri doar sub lock
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._conn as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    query TEXT PRIMARY KEY,
+                    address TEXT,
+                    lat REAL,
+                    lon REAL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_geocode_cache_last_used ON geocode_cache (last_used)")
+
+    def get(self, query):
+        """ (găsit, rezultat): (False, None) = nu e în cache; (True, None) = adresă știută ca negăsită """
+        now = time.time()
+        with self._lock, self._conn as conn:
+            row = conn.execute("SELECT address, lat, lon, expires_at FROM geocode_cache WHERE query = ?",
+                               (query,)).fetchone()
+            if row is None:
+                return False, None
+            if row[3] <= now:
+                conn.execute("DELETE FROM geocode_cache WHERE query = ?", (query,))
+                return False, None
+            conn.execute("UPDATE geocode_cache SET last_used = ? WHERE query = ?", (now, query))
+        if row[1] is None:
+            return True, None
+        return True, GeocodeResult(row[0], row[1], row[2], 'cache')
+
+    def set(self, query, result):
+        now = time.time()
+        ttl = self.ttl if result is not None else self.negative_ttl
+        values = (result.address, result.latitude, result.longitude) if result is not None else (None, None, None)
+        with self._lock, self._conn as conn:
+            conn.execute("INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?, ?)",
+                         (query, *values, now + ttl, now))
+            if self._count(conn) > self.max_entries:
+                # întâi cele expirate, apoi cele folosite cel mai demult
+                conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (now,))
+                conn.execute("""
+                    DELETE FROM geocode_cache WHERE query IN (
+                        SELECT query FROM geocode_cache ORDER BY last_used LIMIT ?
+                    )
+                """, (max(0, self._count(conn) - self.max_entries),))
+
+    def _count(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM geocode_cache")
+
+
+class Geocoder:
+    """
+    Fațada folosită de aplicație: geocode(adresă) -> GeocodeResult sau None.
+    `upstream` e orice obiect cu .geocode(text) care întoarce ceva cu .latitude/.longitude/.address
+    (ex: geopy Nominatim sau un înlocuitor local în teste); `gazetteer` e o funcție care dă
+    Gazetteer-ul curent (sau None dacă încă nu există).
+    """
+
+    def __init__(self, upstream, cache=None, gazetteer=None, country=DEFAULT_COUNTRY, workers=GEOCODE_WORKERS):
+        self.upstream = upstream
+        self.cache = cache
+        self.gazetteer = gazetteer or (lambda: None)
+        self.country = country
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geocode')
+
+    def upstream_query(self, address):
+        """ Fără virgulă (doar strada), căutarea se restrânge la țară """
+        if "," in address or not self.country: return address
+        return f"{address}, {self.country}"
+
+    def geocode(self, address):
+        address = (address or '').strip()
+        if not address:
+            return None
+
+        gazetteer = self.gazetteer()
+        if gazetteer is not None:
+            hit = gazetteer.lookup(address)
+            if hit is not None:
+                return hit
+
+        query = normalize_address(address)
+        if self.cache is not None:
+            found, result = self.cache.get(query)
+            if found:
+                return result
+
+        location = self.upstream.geocode(self.upstream_query(address))
+        result = None
+        if location is not None:
+            result = GeocodeResult(getattr(location, 'address', address), location.latitude, location.longitude,
+                                   'upstream')
+        if self.cache is not None:
+            self.cache.set(query, result)
+        return result
+
+    def geocode_many(self, addresses, timeout=GEOCODE_TIMEOUT):
+        """
+        Geocodează adresele în paralel, pe pool-ul comun (mărginit); rezultatele vin în ordinea adreselor.
+        Ridică GeocodeTimeout dacă nu s-au terminat toate în `timeout` secunde.
+        """
+        futures = [self._pool.submit(self.geocode, address) for address in addresses]
+        _, pending = wait(futures, timeout=timeout)
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise GeocodeTimeout(f"Geocodare neterminată după {timeout} s")
+        return [future.result() for future in futures]
@@ -0,0 +1,177 @@
+"""
+Cache-ul grafului pe disc.
+
+Un singur fișier: MAGIC + lungimea antetului + antet JSON + array-uri NumPy plate, aliniate la 64 de
+octeți. La citire fișierul se mapează în memorie (mmap, read-only), deci procesele care încarcă același
+cache împart aceleași pagini. Numele fișierului conține cheia (versiune format + amprenta datelor GTFS +
+parametrii de construcție), iar scrierea e atomică (fișier temporar + rename).
+
+Modificările incrementale (rute editate/șterse din admin) nu rescriu fișierul: se adaugă în jurnalul
+`{cache}.delta` (JSON lines), fiecare cu amprenta datelor de după modificare, și se reaplică la încărcare.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MAGIC = b'TGRAPH\x00\x01'
+ALIGN = 64
+SUFFIX = '.graph'
+DELTA_SUFFIX = '.delta'
+
+
+def cache_key(fingerprint, params):
+    payload = json.dumps({'format_version': FORMAT_VERSION, 'fingerprint': fingerprint, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cache_path(prefix, fingerprint, params):
+    return f"{prefix}.{cache_key(fingerprint, params)}{SUFFIX}"
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write(path, header, arrays):
+    """ Scrie antetul și array-urile; fișierul final apare doar când e complet (os.replace) """
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset = _aligned(offset + arr.nbytes)
+
+    header = dict(header, format_version=FORMAT_VERSION, arrays=layout)
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(arr.tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # un cache scris complet nu mai are nevoie de jurnalul vechi
+        if os.path.exists(delta_path(path)):
+            os.remove(delta_path(path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} nu este un cache de graf")
+        size = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(size))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: versiune format {header.get('format_version')} != {FORMAT_VERSION}")
+    header['_data_start'] = _aligned(len(MAGIC) + 8 + size)
+    return header
+
+
+def read(path):
+    """ (antet, {nume: array}); array-urile sunt view-uri read-only peste un singur mmap al fișierului """
+    header = read_header(path)
+    mm = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = header['_data_start'] + spec['offset']
+        arrays[name] = mm[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    return header, arrays
+
+
+def delta_path(path):
+    return f"{path}{DELTA_SUFFIX}"
+
+
+def append_delta(path, record):
+    """ Adaugă o modificare incrementală (o linie JSON) în jurnalul cache-ului `path` """
+    with open(delta_path(path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_deltas(path):
+    """ Modificările din jurnal, în ordine; o ultimă linie scrisă pe jumătate e ignorată """
+    deltas = []
+    try:
+        with open(delta_path(path), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    deltas.append(json.loads(line))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+    return deltas
+
+
+def deltas_for(path, fingerprint):
+    """
+    Modificările de aplicat peste cache ca să ajungă la amprenta `fingerprint`:
+    tot jurnalul până la ultima intrare cu acea amprentă (totul dacă amprenta nu e cunoscută).
+    """
+    deltas = read_deltas(path)
+    if fingerprint is None:
+        return deltas
+    matches = [i for i, d in enumerate(deltas) if d.get('fingerprint') == fingerprint]
+    return deltas[:matches[-1] + 1] if matches else []
+
+
+def truncate_deltas(path, count):
+    """ Păstrează doar primele `count` intrări din jurnal (restul nu mai corespund bazei de date) """
+    deltas = read_deltas(path)[:count]
+    tmp_path = f"{delta_path(path)}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(d) + '\n' for d in deltas)
+    os.replace(tmp_path, delta_path(path))
+
+
+def find(prefix, fingerprint, params):
+    """
+    Calea unui cache valid sau None.
+    Un cache e valid și dacă jurnalul lui de modificări ajunge la amprenta cerută.
+    Fără amprentă (baza de date nu răspunde) se folosește cel mai nou cache cu aceiași parametri.
+    """
+    candidates = sorted(glob.glob(f"{glob.escape(prefix)}.*{SUFFIX}"), key=os.path.getmtime, reverse=True)
+    if fingerprint is not None:
+        direct = cache_path(prefix, fingerprint, params)
+        candidates = [direct] + [p for p in candidates if p != direct]
+
+    for path in candidates:
+        if not os.path.exists(path): continue
+        try:
+            header = read_header(path)
+        except (ValueError, OSError):
+            continue
+        if header.get('params') != params: continue
+        if fingerprint is None or header.get('fingerprint') == fingerprint:
+            return path
+        if deltas_for(path, fingerprint):
+            return path
+    return None
+
+
+def remove_all(prefix, keep=None):
+    """ Șterge cache-urile vechi (sau toate) cu prefixul dat, împreună cu jurnalele lor """
+    for path in glob.glob(f"{glob.escape(prefix)}.*{SUFFIX}"):
+        if path != keep:
+            os.remove(path)
+            if os.path.exists(delta_path(path)):
+                os.remove(delta_path(path))
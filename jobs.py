@@ -0,0 +1,110 @@
+"""
+Job-uri în fundal pentru cererile lente (ex: calculul unei rute).
+POST pornește job-ul și primește un id; GET interoghează starea până apare rezultatul.
+
+Starea job-urilor stă într-un fișier SQLite (JobStore), nu în memoria procesului: cu mai mulți workeri
+(ex: gunicorn -w 4) interogarea poate ajunge la alt proces decât cel care calculează, și trebuie să
+vadă același job. Workerii trebuie deci să partajeze fișierul (aceeași mașină / același volum).
+"""
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DB = "route_jobs.sqlite3"  # fișierul implicit al aplicației (app.config['JOBS_DB'] / JOBS_DB din mediu)
+
+
+class JobQueueFull(Exception):
+    """ Prea multe job-uri în așteptare; cererea trebuie reîncercată mai târziu """
+
+
+class JobStore:
+    """
+    id job -> stare ('pending' | 'done' | 'failed'), rezultat (JSON) sau eroare, cu expirare.
+    `path=':memory:'` ține starea doar în procesul curent (un singur worker / teste).
+    """
+
+    def __init__(self, path=':memory:', ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # o singură conexiune, folosită din mai multe thread-uri doar sub lock
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._conn as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_expires_at ON jobs (expires_at)")
+
+    def put(self, job_id, state, result=None, error=None):
+        now = time.time()
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+                         (job_id, state, None if result is None else json.dumps(result), error, now + self.ttl))
+
+    def get(self, job_id):
+        with self._lock, self._conn as conn:
+            row = conn.execute("SELECT state, result, error FROM jobs WHERE id = ? AND expires_at > ?",
+                               (job_id, time.time())).fetchone()
+        if row is None:
+            return None
+        state, result, error = row
+        if state == 'done':
+            return {'state': state, 'result': json.loads(result)}
+        if state == 'failed':
+            return {'state': state, 'error': error}
+        return {'state': state}
+
+
+class JobRunner:
+    """
+    Pool mărginit de thread-uri + registrul job-urilor (JobStore), cu expirare.
+    Cel mult `max_pending` job-uri pot fi în lucru sau în coadă în același timp (per proces).
+    Rezultatele trebuie să fie serializabile JSON (tuplurile devin liste).
+    """
+
+    def __init__(self, max_workers=4, max_pending=64, ttl=300, name='job', store=None):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = store or JobStore(ttl=ttl)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull()
+        job_id = uuid.uuid4().hex
+        try:
+            self._jobs.put(job_id, 'pending')
+            future = self._pool.submit(self._run, job_id, fn, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._jobs.put(job_id, 'failed', error=str(e))
+            return
+        try:
+            self._jobs.put(job_id, 'done', result=result)
+        except Exception as e:
+            # ex: rezultat care nu se poate serializa
+            traceback.print_exc()
+            self._jobs.put(job_id, 'failed', error=str(e))
+
+    def status(self, job_id):
+        """ None (necunoscut/expirat) sau {'state': 'pending' | 'done' | 'failed', ...} """
+        return self._jobs.get(job_id)
@@ -0,0 +1,218 @@
+"""
+Flux live (Server-Sent Events) pentru harta vehiculelor.
+
+Un singur thread calculează, la fiecare tick, pozițiile vehiculelor o dată pe linie (doar pentru liniile
+cu abonați) și trimite același mesaj, deja serializat, tuturor abonaților liniei. Costul crește deci cu
+numărul de linii urmărite, nu cu numărul de hărți deschise.
+
+Mesaje:
+- `snapshot`: {"t": ..., "vehicles": [...]} - starea completă, la abonare (sau după ce un client a rămas în urmă);
+- `delta`: {"t": ..., "add": [...], "move": [[id, lat, lon], ...], "remove": [id, ...]} - față de tick-ul anterior.
+
+Fiecare abonat ține ocupat un worker / thread al serverului cât timp pagina e deschisă: cu workeri sync
+(ex: gunicorn -w 4 fără -k gthread / gevent) câteva hărți deschise blochează aplicația. De aceea numărul de
+abonați per proces e limitat (max_subscribers); peste limită clientul revine la polling (/api/live_vehicles).
+"""
+import json
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+LIVE_TICK_SECONDS = 5       # ca intervalul de polling al paginii /live
+HEARTBEAT_SECONDS = 15      # comentariu SSE periodic, ca proxy-urile să nu închidă conexiunea
+SUBSCRIBER_QUEUE_MAX = 8    # mesaje în așteptare per client; peste, clientul primește un snapshot nou
+COORD_DECIMALS = 6          # ~0.1 m; vehiculele oprite nu mai apar în delta
+MAX_SUBSCRIBERS = 50        # fluxuri deschise per proces (0 = fără SSE, doar polling)
+
+
+class TooManySubscribers(Exception):
+    """ Limita de fluxuri deschise a procesului a fost atinsă; clientul trebuie să folosească polling """
+
+
+def service_seconds(now=None):
+    """ Secundele de la miezul nopții (ora locală), ca în /api/live_vehicles """
+    now = now or datetime.now()
+    return now.hour * 3600 + now.minute * 60 + now.second
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """ Coada de mesaje a unui client; events() e generatorul răspunsului SSE """
+
+    def __init__(self, broadcaster, route):
+        self.broadcaster = broadcaster
+        self.route = route
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_MAX)
+
+    def push(self, message, resync):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # client lent: aruncăm ce n-a citit și îi trimitem starea completă
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(resync())
+
+    def events(self, heartbeat=HEARTBEAT_SECONDS):
+        try:
+            yield f"retry: {int(self.broadcaster.interval * 1000)}\n\n"
+            while True:
+                try:
+                    yield self.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            # generatorul se închide când clientul se deconectează
+            self.broadcaster.unsubscribe(self)
+
+
+class _RouteFeed:
+    def __init__(self):
+        self.subscribers = set()
+        self.state = None      # id vehicul -> vehicul (coordonate rotunjite), la ultimul tick
+        self.tick = None
+        self.snapshot = None   # mesajul `snapshot` serializat pentru starea curentă (construit la nevoie)
+
+
+class LiveBroadcaster:
+    """
+    `vehicles_fn(linie, secunde)` dă vehiculele unei linii în formatul /api/live_vehicles (cu 'id');
+    `clock()` dă ora curentă în secunde. Thread-ul pornește la primul abonat.
+    """
+
+    def __init__(self, vehicles_fn, interval=LIVE_TICK_SECONDS, clock=service_seconds, max_subscribers=MAX_SUBSCRIBERS):
+        self.vehicles_fn = vehicles_fn
+        self.interval = interval
+        self.clock = clock
+        self.max_subscribers = max_subscribers  # None = fără limită
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def subscribe(self, route):
+        """ Abonează un client la linie; ridică TooManySubscribers peste max_subscribers """
+        sub = Subscription(self, route)
+        with self._lock:
+            self._check_capacity()
+            feed = self._feeds.setdefault(route, _RouteFeed())
+            ready = feed.state is not None
+        if not ready:
+            # primul abonat al liniei: calculăm starea acum, nu la următorul tick
+            self._refresh(route, feed, self.clock(), notify=False)
+        with self._lock:
+            try:
+                self._check_capacity()  # alți clienți s-au abonat între timp
+            except TooManySubscribers:
+                if not feed.subscribers and self._feeds.get(route) is feed:
+                    del self._feeds[route]
+                raise
+            # snapshot-ul intră în coadă înaintea oricărei delta pentru acest abonat
+            sub.queue.put_nowait(self._snapshot_locked(feed))
+            self._feeds.setdefault(route, feed).subscribers.add(sub)
+        self._start()
+        return sub
+
+    def _check_capacity(self):
+        if self.max_subscribers is None: return
+        if sum(len(f.subscribers) for f in self._feeds.values()) >= self.max_subscribers:
+            raise TooManySubscribers(f"Prea multe fluxuri live deschise ({self.max_subscribers})")
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            feed = self._feeds.get(sub.route)
+            if feed is None: return
+            feed.subscribers.discard(sub)
+            if not feed.subscribers:
+                del self._feeds[sub.route]
+
+    def stats(self):
+        with self._lock:
+            return {'routes': len(self._feeds), 'subscribers': sum(len(f.subscribers) for f in self._feeds.values())}
+
+    def reset(self):
+        """ Datele s-au schimbat (ex: rute redenumite): abonații primesc un snapshot nou la următorul tick """
+        with self._lock:
+            for feed in self._feeds.values():
+                feed.state = None
+
+    def close(self):
+        self._stop.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+        self._thread.start()
+        print(f"📡 Flux live pornit (tick {self.interval} s)")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                traceback.print_exc()
+
+    def tick(self, t=None):
+        """ Un pas: recalculează fiecare linie urmărită o singură dată și trimite delta abonaților """
+        t = self.clock() if t is None else t
+        with self._lock:
+            feeds = list(self._feeds.items())
+        for route, feed in feeds:
+            try:
+                self._refresh(route, feed, t)
+            except Exception:
+                traceback.print_exc()
+
+    def _refresh(self, route, feed, t, notify=True):
+        state = {}
+        for v in self.vehicles_fn(route, t):
+            v = dict(v, lat=round(v['lat'], COORD_DECIMALS), lon=round(v['lon'], COORD_DECIMALS))
+            state[v['id']] = v
+
+        with self._lock:
+            previous = feed.state
+            feed.state, feed.tick, feed.snapshot = state, t, None
+            subscribers = list(feed.subscribers)
+        if not notify or not subscribers:
+            return
+
+        if previous is None:
+            message = self._snapshot(feed)
+        else:
+            delta = self._delta(previous, state)
+            if not (delta['add'] or delta['move'] or delta['remove']):
+                return
+            message = format_event('delta', dict(delta, t=t))
+        resync = lambda: self._snapshot(feed)
+        for sub in subscribers:
+            sub.push(message, resync)
+
+    def _snapshot(self, feed):
+        with self._lock:
+            return self._snapshot_locked(feed)
+
+    @staticmethod
+    def _snapshot_locked(feed):
+        if feed.snapshot is None:
+            feed.snapshot = format_event('snapshot', {'t': feed.tick, 'vehicles': list((feed.state or {}).values())})
+        return feed.snapshot
+
+    @staticmethod
+    def _delta(previous, state):
+        add, move = [], []
+        for vid, v in state.items():
+            old = previous.get(vid)
+            if old is None or old['headsign'] != v['headsign']:
+                add.append(v)
+            elif old['lat'] != v['lat'] or old['lon'] != v['lon']:
+                move.append([vid, v['lat'], v['lon']])
+        remove = [vid for vid in previous if vid not in state]
+        return {'add': add, 'move': move, 'remove': remove}
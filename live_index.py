@@ -0,0 +1,227 @@
+"""
+Index în memorie al segmentelor de orar pentru harta live (/api/live_vehicles).
+
+Fiecare segment e o cursă între două stații consecutive: [plecare, sosire] în secunde de la începutul
+zilei de serviciu (orele GTFS pot trece de 24:00:00) + cele două stații. Segmentele sunt grupate pe
+linie (format CSR: seg_ptr) și sortate după plecare, deci vehiculele active la o oră se găsesc cu
+o căutare binară, fără baza de date.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import trip_segments
+from timetable import DAY, time_to_seconds
+
+# Segmentele consecutive ale tuturor curselor, cu linia și direcția
+LIVE_SEGMENTS_QUERY = """
+    SELECT r.route_short_name, t.trip_headsign, st1.trip_id,
+           st1.stop_id as start_node, st1.departure_time,
+           st2.stop_id as end_node, st2.arrival_time
+    FROM stop_times st1
+    JOIN stop_times st2 ON st1.trip_id = st2.trip_id AND st1.stop_sequence + 1 = st2.stop_sequence
+    JOIN trips t ON st1.trip_id = t.trip_id
+    JOIN routes r ON t.route_id = r.route_id
+"""
+
+# Aceeași interogare pe tabela materializată trip_segments (orele sunt deja în secunde)
+LIVE_SEGMENTS_TABLE_QUERY = """
+    SELECT r.route_short_name, s.trip_headsign, s.trip_id,
+           s.start_stop as start_node, s.departure_sec as departure_time,
+           s.end_stop as end_node, s.arrival_sec as arrival_time
+    FROM trip_segments s
+    JOIN routes r ON s.route_id = r.route_id
+"""
+
+CHUNK_ROWS = 100000
+
+# start - max_span poate fi negativ; cheia (linie, start) are nevoie de valori pozitive
+KEY_OFFSET = 1 << 31
+
+# Viteza afișată pentru fiecare vehicul (estimare, ca până acum)
+DEFAULT_SPEED_KMH = 25
+
+
+class LiveIndex:
+    """
+    start/end/stop1/stop2/headsign/trip sunt array-uri paralele, sortate după (linie, start);
+    segmentele liniei i sunt în [seg_ptr[i], seg_ptr[i+1]), iar max_span[i] e cel mai lung segment al ei
+    (orice segment activ la ora t are start în [t - max_span, t]).
+    """
+
+    def __init__(self, routes, headsigns, stop_lats, stop_lons, seg_ptr, max_span, start, end, stop1, stop2, headsign,
+                 trip):
+        self.routes = list(routes)
+        self.route_index = {name: i for i, name in enumerate(self.routes)}
+        self.headsigns = list(headsigns)
+        self.stop_lats, self.stop_lons = stop_lats, stop_lons
+        self.seg_ptr, self.max_span = seg_ptr, max_span
+        self.start, self.end = start, end
+        self.stop1, self.stop2 = stop1, stop2
+        self.headsign = headsign
+        self.trip = trip  # codul cursei = id-ul vehiculului (stabil de la un segment la altul)
+        # linia fiecărui segment și cheia (linie, start) după care sunt sortate, pentru căutarea pe toate liniile
+        self.route = np.repeat(np.arange(len(self.routes), dtype=np.int32), np.diff(seg_ptr))
+        self._key = (self.route.astype(np.int64) << 32) | (start.astype(np.int64) + KEY_OFFSET)
+        self._network = None  # (t, idx, lat, lon) ultimul calcul pe toată rețeaua
+
+    @property
+    def num_segments(self):
+        return len(self.start)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.stop_lats, self.stop_lons, self.seg_ptr, self.max_span,
+                                      self.start, self.end, self.stop1, self.stop2, self.headsign, self.trip,
+                                      self.route, self._key))
+
+    @classmethod
+    def load(cls, conn, query=None):
+        """ Citește segmentele (pe bucăți) și stațiile din baza de date și construiește indexul """
+        t0 = time.perf_counter()
+        query = query or trip_segments.pick(conn, LIVE_SEGMENTS_TABLE_QUERY, LIVE_SEGMENTS_QUERY)
+        stops = pd.read_sql(text("SELECT stop_id, stop_lat, stop_lon FROM stops"), conn)
+        stop_index = pd.Series(np.arange(len(stops)), index=stops['stop_id'].astype(str))
+        route_codes, headsign_codes, trip_codes = {}, {}, {}
+
+        parts = []
+        for chunk in pd.read_sql(text(query), conn, chunksize=CHUNK_ROWS):
+            chunk = chunk.dropna(subset=['departure_time', 'arrival_time'])
+            s1 = chunk['start_node'].astype(str).map(stop_index)
+            s2 = chunk['end_node'].astype(str).map(stop_index)
+            known = (s1.notna() & s2.notna()).to_numpy()
+            chunk, s1, s2 = chunk[known], s1[known], s2[known]
+
+            routes = chunk['route_short_name'].astype(str)
+            headsigns = chunk['trip_headsign'].fillna('').astype(str)
+            trips = chunk['trip_id'].astype(str)
+            for name in routes.unique().tolist():
+                route_codes.setdefault(name, len(route_codes))
+            for name in headsigns.unique().tolist():
+                headsign_codes.setdefault(name, len(headsign_codes))
+            for name in trips.unique().tolist():
+                trip_codes.setdefault(name, len(trip_codes))
+
+            parts.append((routes.map(route_codes).to_numpy(np.int32),
+                          time_to_seconds(chunk['departure_time']).astype(np.int32),
+                          time_to_seconds(chunk['arrival_time']).astype(np.int32),
+                          s1.to_numpy(np.int32), s2.to_numpy(np.int32),
+                          headsigns.map(headsign_codes).to_numpy(np.int32),
+                          trips.map(trip_codes).to_numpy(np.int32)))
+
+        columns = [np.concatenate(col) for col in zip(*parts)] if parts else [np.empty(0, dtype=np.int32)] * 7
+        index = cls.from_segments(list(route_codes), list(headsign_codes),
+                                  stops['stop_lat'].astype(float).to_numpy(), stops['stop_lon'].astype(float).to_numpy(),
+                                  *columns)
+        print(f"   -> 🚌 Index live: {index.num_segments} segmente, {len(index.routes)} linii, "
+              f"{index.nbytes / 1e6:.1f} MB, {time.perf_counter() - t0:.1f} s")
+        return index
+
+    @classmethod
+    def from_segments(cls, routes, headsigns, stop_lats, stop_lons, route, start, end, stop1, stop2, headsign, trip):
+        order = np.lexsort((start, route))
+        route, start, end = route[order], start[order], end[order]
+        n = len(routes)
+        seg_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(route, minlength=n), out=seg_ptr[1:])
+        max_span = np.zeros(n, dtype=np.int32)
+        np.maximum.at(max_span, route, end - start)
+        return cls(routes, headsigns, stop_lats, stop_lons, seg_ptr, max_span,
+                   start, end, stop1[order], stop2[order], headsign[order], trip[order])
+
+    def active(self, route, t):
+        """
+        Segmentele liniei active la ora t (secunde): (indici, ora în ziua de serviciu a fiecăruia).
+        La 00:30 rulează și cursele din ziua de serviciu anterioară, cu ore de tipul 24:30:00.
+        """
+        i = self.route_index.get(route)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        lo, hi = int(self.seg_ptr[i]), int(self.seg_ptr[i + 1])
+        starts = self.start[lo:hi]
+        idx_parts, now_parts = [], []
+        for now in (t, t + DAY):
+            a = lo + int(np.searchsorted(starts, now - int(self.max_span[i]), side='left'))
+            b = lo + int(np.searchsorted(starts, now, side='right'))
+            idx = np.arange(a, b)[self.end[a:b] >= now]
+            idx_parts.append(idx)
+            now_parts.append(np.full(len(idx), now, dtype=np.int64))
+        return np.concatenate(idx_parts), np.concatenate(now_parts)
+
+    def active_all(self, t):
+        """ Ca active(), dar pentru toate liniile deodată: o căutare binară vectorizată pe cheia (linie, start) """
+        lines = np.arange(len(self.routes), dtype=np.int64)
+        idx_parts, now_parts = [], []
+        for now in (t, t + DAY):
+            a = np.searchsorted(self._key, (lines << 32) | (now - self.max_span.astype(np.int64) + KEY_OFFSET), side='left')
+            b = np.searchsorted(self._key, (lines << 32) | (now + KEY_OFFSET), side='right')
+            # toate intervalele [a, b) concatenate, fără buclă pe linii
+            counts = b - a
+            idx = np.repeat(a - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            idx = idx[self.end[idx] >= now]
+            idx_parts.append(idx)
+            now_parts.append(np.full(len(idx), now, dtype=np.int64))
+        return np.concatenate(idx_parts), np.concatenate(now_parts)
+
+    def positions(self, idx, now):
+        """ Coordonatele interpolate (lat, lon) ale segmentelor idx la orele now """
+        t1, t2 = self.start[idx], self.end[idx]
+        span = (t2 - t1).astype(np.float64)
+        ratio = np.where(span > 0, (now - t1) / np.where(span > 0, span, 1), 0.5).clip(0.0, 1.0)
+
+        s1, s2 = self.stop1[idx], self.stop2[idx]
+        lats = self.stop_lats[s1] + (self.stop_lats[s2] - self.stop_lats[s1]) * ratio
+        lons = self.stop_lons[s1] + (self.stop_lons[s2] - self.stop_lons[s1]) * ratio
+        return lats, lons
+
+    def vehicles(self, route, t):
+        """ Pozițiile interpolate ale vehiculelor liniei la ora t, în formatul /api/live_vehicles """
+        idx, now = self.active(route, t)
+        lats, lons = self.positions(idx, now)
+        return [
+            {'id': trip, 'lat': lat, 'lon': lon, 'headsign': self.headsigns[h], 'speed': DEFAULT_SPEED_KMH}
+            for trip, lat, lon, h in zip(self.trip[idx].tolist(), lats.tolist(), lons.tolist(),
+                                         self.headsign[idx].tolist())
+        ]
+
+    def network(self, t):
+        """ (idx, lat, lon) pentru toate vehiculele rețelei la ora t; calculat o dată pe secundă """
+        cached = self._network
+        if cached is not None and cached[0] == t:
+            return cached[1:]
+        idx, now = self.active_all(t)
+        lats, lons = self.positions(idx, now)
+        self._network = (t, idx, lats, lons)
+        return idx, lats, lons
+
+    def query(self, t, routes=None, bbox=None, decimals=6):
+        """
+        Vehiculele de pe liniile `routes` (None = toate) din dreptunghiul `bbox` = (vest, sud, est, nord),
+        în format pe coloane: listele id/route/headsign/lat/lon au aceeași lungime, iar route/headsign sunt
+        indici în listele `routes`/`headsigns` din răspuns.
+        """
+        idx, lats, lons = self.network(t)
+        mask = np.ones(len(idx), dtype=bool)
+        if routes is not None:
+            codes = [self.route_index[name] for name in routes if name in self.route_index]
+            mask &= np.isin(self.route[idx], codes)
+        if bbox is not None:
+            west, south, east, north = bbox
+            mask &= (lons >= west) & (lons <= east) & (lats >= south) & (lats <= north)
+        idx, lats, lons = idx[mask], lats[mask], lons[mask]
+
+        route_codes, route_col = np.unique(self.route[idx], return_inverse=True)
+        headsign_codes, headsign_col = np.unique(self.headsign[idx], return_inverse=True)
+        return {
+            'count': len(idx),
+            'speed': DEFAULT_SPEED_KMH,
+            'routes': [self.routes[i] for i in route_codes.tolist()],
+            'headsigns': [self.headsigns[i] for i in headsign_codes.tolist()],
+            'id': self.trip[idx].tolist(),
+            'route': route_col.tolist(),
+            'headsign': headsign_col.tolist(),
+            'lat': np.round(lats, decimals).tolist(),
+            'lon': np.round(lons, decimals).tolist(),
+        }
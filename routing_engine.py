@@ -1,20 +1,164 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
-from sqlalchemy import create_engine, text
-import pickle
-import os
+from sqlalchemy import create_engine, inspect, text
+import hashlib
 import re
 from datetime import datetime
 import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import graph_cache
+import trip_segments
+from caching import TTLCache, MISSING
+from geocoding import Gazetteer
+from csr_graph import CSRGraph, NoPath, EDGE_TYPE_CODES, EDGE_ARRAYS
+from spatial_index import SpatialIndex, haversine_m, local_distance_m, pairs_within
+from contraction import ContractionHierarchy, CH_ARRAYS, WITNESS_SETTLE_LIMIT
+from timetable import Timetable, ServiceCalendar, NoConnection, TIMETABLE_ARRAYS, SHIFT_HORIZON, time_to_seconds
+
+ENGINES = ('networkx', 'csr')
+
+# 'graph': timpi medii pe muchii (rapid, fără orar); 'timetable': plecările reale din stop_times (CSA)
+MODES = ('graph', 'timetable')
+
+# Căutarea drumului în modul graf; toate dau același cost optim
+#   'astar': A* cu distanța haversine până la destinație / viteza maximă din graf (estimare admisibilă)
+#   'bidirectional': Dijkstra simultan din start și din destinație
+#   'ch': Contraction Hierarchies, preprocesate după load_data pentru fiecare perioadă (contraction.py)
+ALGORITHMS = ('dijkstra', 'astar', 'bidirectional', 'ch')
+
+# --- PARAMETRI ---
+BUS_PENALTY = 15.0 
+METRO_PENALTY = 5.0  
+HUB_TRANSFER_M = 600   # stații cu același nume mai apropiate de atât formează un HUB
+WALK_TRANSFER_M = 450  # distanța maximă pentru un transfer pe jos
+SPATIAL_CELL_M = 250.0
+WALK_SPEED_M_MIN = 80  # viteza medie de mers (transferuri și drumul până la stație)
+
+# Legarea capetelor rutei de rețea (modul graf):
+#   'nearest': doar cea mai apropiată stație (mersul pe jos până la ea nu se socotește)
+#   'multi': până la SNAP_CANDIDATES stații pe o rază de SNAP_RADIUS_M, cu minutele de mers pe jos
+#            drept cost inițial/final; combinația cea mai bună iese dintr-o singură căutare
+SNAP_MODES = ('nearest', 'multi')
+SNAP_CANDIDATES = 5
+SNAP_RADIUS_M = 500
+
+# Cache-ul rezultatelor find_route: (stație start, stație final, mod, perioadă/minut) -> rezultat
+ROUTE_CACHE_SIZE = 10000
+ROUTE_CACHE_TTL = 3600  # secunde
+
+# Matricea origine-destinație (od_matrix): procesele încarcă graful din fișierul de cache (mmap, paginile
+# se partajează între ele); sub OD_POOL_MIN_ORIGINS origini calculul rămâne în procesul curent
+OD_WORKERS = min(4, os.cpu_count() or 1)
+OD_POOL_MIN_ORIGINS = 8
+
+# Izocrone: limita de minute acceptată și latura celulelor grilei opționale
+ISOCHRONE_MAX_MINUTES = 120
+ISOCHRONE_CELL_M = 250
+
+# Câte segmente consecutive (stop_times) se procesează odată la generarea grafului
+EDGE_CHUNK_ROWS = 50000
+
+# Adăugat la rezultatele modului 'timetable' când feed-ul nu are calendar (cursele nu pot fi filtrate pe zi)
+NO_CALENDAR_WARNING = ("Feed-ul GTFS nu are calendar: orarul include toate cursele, indiferent de zi "
+                       "(inclusiv cele doar de weekend sau de sărbători).")
+
+# Perioadele de serviciu: orele în care se aplică și ce linii se pot urca.
+# Pentru fiecare perioadă se construiește o singură dată un view al grafului
+# din care muchiile 'board' interzise sunt deja scoase.
+SERVICE_PERIODS = {
+    'day': {
+        'label': 'ZI',
+        'hours': range(5, 23),
+        'boards': lambda line, is_night: not is_night,
+    },
+    'night': {
+        'label': 'NOAPTE',
+        'hours': (23, 0, 1, 2, 3, 4),
+        'boards': lambda line, is_night: is_night or line == '783',  # 783 (Aeroport) circulă non-stop
+    },
+}
+DEFAULT_PERIOD = 'day'
+
+# Segmentele consecutive ale curselor (stație -> stația următoare), cu linia care le parcurge
+SEGMENTS_QUERY = """
+    SELECT DISTINCT t1.stop_id as start_node, t2.stop_id as end_node, r.route_short_name
+    FROM stop_times t1
+    JOIN stop_times t2 ON t1.trip_id = t2.trip_id AND t1.stop_sequence + 1 = t2.stop_sequence
+    JOIN trips tr ON t1.trip_id = tr.trip_id
+    JOIN routes r ON tr.route_id = r.route_id
+"""
+
+# Conexiunile orarului: fiecare segment al fiecărei curse, cu orele reale
+TIMETABLE_QUERY = """
+    SELECT t1.trip_id, t1.stop_id as start_node, t1.departure_time, t2.stop_id as end_node, t2.arrival_time,
+           r.route_short_name, tr.service_id
+    FROM stop_times t1
+    JOIN stop_times t2 ON t1.trip_id = t2.trip_id AND t1.stop_sequence + 1 = t2.stop_sequence
+    JOIN trips tr ON t1.trip_id = tr.trip_id
+    JOIN routes r ON tr.route_id = r.route_id
+"""
+
+# Aceleași interogări pe tabela materializată trip_segments (vezi trip_segments.py), când există.
+# Alias-ul `r` rămâne, ca refresh_route_layers să poată adăuga același filtru pe nume.
+SEGMENTS_TABLE_QUERY = """
+    SELECT DISTINCT s.start_stop as start_node, s.end_stop as end_node, r.route_short_name
+    FROM trip_segments s
+    JOIN routes r ON s.route_id = r.route_id
+"""
+
+TIMETABLE_TABLE_QUERY = """
+    SELECT s.trip_id, s.start_stop as start_node, s.departure_sec as departure_time,
+           s.end_stop as end_node, s.arrival_sec as arrival_time, r.route_short_name, tr.service_id
+    FROM trip_segments s
+    JOIN trips tr ON s.trip_id = tr.trip_id
+    JOIN routes r ON s.route_id = r.route_id
+"""
 
 class TransportGraph:
-    def __init__(self, db_params):
+    def __init__(self, db_params, engine='networkx', algorithm='dijkstra', snap='nearest'):
+        if engine not in ENGINES:
+            raise ValueError(f"Motor de rutare necunoscut: {engine} (disponibile: {', '.join(ENGINES)})")
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritm necunoscut: {algorithm} (disponibili: {', '.join(ALGORITHMS)})")
+        if snap not in SNAP_MODES:
+            raise ValueError(f"Mod de legare necunoscut: {snap} (disponibile: {', '.join(SNAP_MODES)})")
+        self.db_params = db_params
         self.db_url = f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}/{db_params['dbname']}"
+        self.engine = engine
+        self.algorithm = algorithm
+        self.snap = snap
         self.G = nx.DiGraph()
+        self.csr = None  # graful complet în format CSR (sursa cache-ului; singurul graf pentru engine='csr')
+        self.views = {}  # perioadă -> graf fără urcările interzise (vezi SERVICE_PERIODS)
         self.stops = {} 
+        self.spatial_index = None  # SpatialIndex peste self.stops
         self.is_loaded = False
-        self.cache_file = "transport_graph_layered.pkl"
+        self._load_lock = threading.Lock()
+        self._patch_lock = threading.RLock()  # modificările incrementale vs. căutările pe graful networkx
+        self.cache_prefix = "transport_graph_layered"  # fișierele devin {prefix}.{cheie}.graph
+        self._cache_path = None  # fișierul de cache din care provine graful (jurnalul de modificări e lângă el)
+        self.timetable = None  # Timetable (modul 'timetable'), construit la prima cerere
+        self.service_calendar = None  # ServiceCalendar al orarului; None dacă feed-ul nu are calendar
+        self.fingerprint = None  # amprenta datelor grafului curent (cheia cache-urilor de orar / CH)
+        self._content_fingerprint = None  # partea scumpă a amprentei (fără routes), calculată la încărcare
+        self.hierarchies = None  # perioadă -> (view CSR, ContractionHierarchy), pentru algorithm='ch'
+        self._ch_lock = threading.Lock()
+        self.route_cache = TTLCache(maxsize=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
+        # Crește la fiecare încărcare / modificare a grafului și intră în cheia route_cache: un rezultat
+        # calculat pe graful de dinainte și salvat după golirea cache-ului nu mai poate fi găsit
+        self.generation = 0
+        self._gazetteer = None
+        self._astar_speed = (None, None)  # (csr, viteză) - recalculată când graful se schimbă
+        self._csr_views = (None, None)  # (csr, view-uri CSR) pentru engine='networkx' (izocrone)
+        self._timetable_lock = threading.Lock()
+        self._od_pool = None  # ProcessPoolExecutor pentru od_matrix, creat la prima nevoie
+        self._od_lock = threading.Lock()
+        self._retired = False  # înlocuit de un graf nou: od_matrix nu mai pornește procese
 
     def _clean_name(self, name):
         name = name.upper()
@@ -34,261 +178,1213 @@ class TransportGraph:
 
     def _create_walking_edges(self):
         print("   -> 🚶 Generare Transferuri cu Timpi...")
+        ids = list(self.stops.keys())
+        lats = np.array([self.stops[s]['lat'] for s in ids], dtype=np.float64)
+        lons = np.array([self.stops[s]['lon'] for s in ids], dtype=np.float64)
         count = 0
         
         # 1. HUB-uri pe bază de nume
         name_clusters = {}
-        for stop_id, data in self.stops.items():
-            clean = self._clean_name(data['name'])
+        for k, stop_id in enumerate(ids):
+            clean = self._clean_name(self.stops[stop_id]['name'])
             if len(clean) > 3:
-                if clean not in name_clusters: name_clusters[clean] = []
-                name_clusters[clean].append(stop_id)
-
-        for name, ids in name_clusters.items():
-            if len(ids) > 1:
-                for i in ids:
-                    for j in ids:
-                        if i == j: continue
-                        data1, data2 = self.stops[i], self.stops[j]
-                        dist = geodesic((data1['lat'], data1['lon']), (data2['lat'], data2['lon'])).meters
-                        
-                        if dist < 600:
-                            # Transfer rapid în HUB: 2 minute cost algoritmic, 3 minute timp real
-                            attr = {
-                                'weight': 2.0, 
-                                'actual_time': 3.0, # Timp real estimat pentru scări/coridoare
-                                'type': 'walking', 
-                                'line_name': 'Transfer Rapid'
-                            }
-                            self.G.add_edge(i, j, **attr)
-                            count += 1
-
-        # 2. Conexiuni Geografice
-        buckets = {}
-        for stop_id, data in self.stops.items():
-            key = (round(data['lat'], 2), round(data['lon'], 2))
-            if key not in buckets: buckets[key] = []
-            buckets[key].append(stop_id)
-
-        for key, stop_ids in buckets.items():
-            for i in range(len(stop_ids)):
-                for j in range(i + 1, len(stop_ids)):
-                    id1, id2 = stop_ids[i], stop_ids[j]
-                    if self.G.has_edge(id1, id2): continue 
-
-                    data1, data2 = self.stops[id1], self.stops[id2]
-                    dist = geodesic((data1['lat'], data1['lon']), (data2['lat'], data2['lon'])).meters
-                    
-                    if dist < 450:
-                        minutes = (dist / 80) # Viteza medie de mers
-                        attr = {
-                            'weight': minutes, 
-                            'actual_time': minutes, # Aici timpul real = timpul calculat
-                            'type': 'walking', 
-                            'line_name': 'Transfer'
-                        }
-                        self.G.add_edge(id1, id2, **attr)
-                        self.G.add_edge(id2, id1, **attr)
-                        count += 1
+                name_clusters.setdefault(clean, []).append(k)
+
+        hub_pairs = set()
+        for members in name_clusters.values():
+            if len(members) < 2: continue
+            m = np.array(members)
+            dist = local_distance_m(lats[m][:, None], lons[m][:, None], lats[m][None, :], lons[m][None, :])
+            ii, jj = np.nonzero((dist < HUB_TRANSFER_M) & ~np.eye(len(m), dtype=bool))
+            hub_pairs.update(zip(m[ii].tolist(), m[jj].tolist()))
+
+        # Transfer rapid în HUB: 2 minute cost algoritmic, 3 minute timp real (scări/coridoare)
+        self.G.add_edges_from(((ids[a], ids[b]) for a, b in hub_pairs),
+                              weight=2.0, actual_time=3.0, type='walking', line_name='Transfer Rapid')
+        count += len(hub_pairs)
+
+        # 2. Conexiuni Geografice (grilă cu celule vecine, nu doar același bucket rotunjit)
+        src, dst, dist = pairs_within(lats, lons, WALK_TRANSFER_M)
+        walk_edges = []
+        for a, b, d in zip(src.tolist(), dst.tolist(), dist.tolist()):
+            if (a, b) in hub_pairs: continue
+            minutes = d / WALK_SPEED_M_MIN
+            attr = {
+                'weight': minutes, 
+                'actual_time': minutes, # Aici timpul real = timpul calculat
+                'type': 'walking', 
+                'line_name': 'Transfer'
+            }
+            walk_edges.append((ids[a], ids[b], attr))
+            walk_edges.append((ids[b], ids[a], dict(attr)))
+            count += 1
+        self.G.add_edges_from(walk_edges)
 
         print(f"      ✅ Total legături generate: {count}")
 
-    def load_data(self):
-        if os.path.exists(self.cache_file):
-            print("⚡ Încărcare Graf din cache...")
-            with open(self.cache_file, 'rb') as f:
-                data = pickle.load(f)
-                self.G = data['G']
-                self.stops = data['stops']
-            self.is_loaded = True
+    def load_data(self, use_cache=True, progress=None):
+        """
+        Încarcă graful din cache sau îl construiește din baza de date.
+        progress(procent, mesaj) e apelat la fiecare etapă (folosit de GraphRebuilder).
+        """
+        report = progress or (lambda pct, message: None)
+
+        report(2, "Amprentă date GTFS")
+        fingerprint, content = self._data_fingerprint()
+        # calculată o dată per încărcare; orarul și ierarhiile o refolosesc (vezi _apply_changes)
+        self.fingerprint, self._content_fingerprint = fingerprint, content
+        params = self._build_params()
+        cached = graph_cache.find(self.cache_prefix, fingerprint, params) if use_cache else None
+        if cached:
+            print(f"⚡ Încărcare Graf din cache ({cached})...")
+            report(50, "Încărcare din cache")
+            self._load_cache(cached, fingerprint)
+            self._after_load(report)
+            report(100, "Graf încărcat din cache")
             return
 
+        self.G = nx.DiGraph()
         print("⏳ Generare Graf Optimizat (Timpi Reali)...")
+        report(5, "Citire stații")
         engine = create_engine(self.db_url)
         
-        with engine.connect() as conn:
+        # stream_results = cursor pe server: rândurile vin pe bucăți, nu tot rezultatul odată
+        with engine.connect().execution_options(stream_results=True) as conn:
             # 1. Stații
             df_stops = pd.read_sql(text("SELECT stop_id, stop_name, stop_lat, stop_lon FROM stops"), conn)
-            for _, row in df_stops.iterrows():
-                s_id = str(row['stop_id'])
-                self.stops[s_id] = {
-                    'lat': row['stop_lat'], 
-                    'lon': row['stop_lon'], 
-                    'name': str(row['stop_name']).strip()
-                }
-                self.G.add_node(s_id, type='physical')
+            stop_ids = df_stops['stop_id'].astype(str).tolist()
+            self.stops = {
+                s_id: {'lat': lat, 'lon': lon, 'name': name}
+                for s_id, lat, lon, name in zip(
+                    stop_ids,
+                    df_stops['stop_lat'].astype(float).tolist(),
+                    df_stops['stop_lon'].astype(float).tolist(),
+                    df_stops['stop_name'].astype(str).str.strip().tolist(),
+                )
+            }
+            self.G.add_nodes_from(stop_ids, type='physical')
+            known_stops = pd.Index(stop_ids)
+            del df_stops
 
             # 2. Rute
-            query = """
-                SELECT DISTINCT t1.stop_id as start_node, t2.stop_id as end_node, r.route_short_name
-                FROM stop_times t1
-                JOIN stop_times t2 ON t1.trip_id = t2.trip_id AND t1.stop_sequence + 1 = t2.stop_sequence
-                JOIN trips tr ON t1.trip_id = tr.trip_id
-                JOIN routes r ON tr.route_id = r.route_id
-            """
-            df_edges = pd.read_sql(text(query), conn)
-
-        # --- PARAMETRI ---
-        BUS_PENALTY = 15.0 
-        METRO_PENALTY = 5.0  
-        
-        for _, row in df_edges.iterrows():
-            u_phys, v_phys = str(row['start_node']), str(row['end_node'])
-            route = str(row['route_short_name']).strip().upper()
-            
-            if u_phys not in self.stops or v_phys not in self.stops: continue
-
-            u_virt = f"{u_phys}|{route}"
-            v_virt = f"{v_phys}|{route}"
-
-            is_metro = route.startswith('M') or route in ['M1','M2','M3','M4','M5']
-            is_night = route.startswith('N')
-
-            # --- A. TRAVEL (Mersul efectiv cu vehiculul) ---
-            # weight: pentru algoritm (Metroul e super ieftin ca să fie ales)
-            # actual_time: realitatea (Metroul ia ~2 min, Bus ia ~4 min în trafic)
-            algo_cost = 0.5 if is_metro else 2.0
-            real_time = 2.5 if is_metro else 4.0 
-
-            self.G.add_edge(u_virt, v_virt, 
-                            weight=algo_cost, 
-                            actual_time=real_time, # <--- TIMP REAL
-                            type='travel', 
-                            line_name=route)
-
-            # --- B. BOARDING (Urcarea / Așteptarea) ---
-            # weight: penalizarea psihologică pentru schimbare
-            # actual_time: timpul mediu de așteptare în stație
-            algo_penalty = METRO_PENALTY if is_metro else BUS_PENALTY
-            wait_time = 5.0 if is_metro else 10.0 # 5 min metrou, 10 min bus
-
-            self.G.add_edge(u_phys, u_virt, 
-                            weight=algo_penalty, 
-                            actual_time=wait_time, # <--- TIMP DE AȘTEPTARE
-                            type='board', 
-                            line_name=route,
-                            is_night=is_night)
-
-            # --- C. ALIGHTING (Coborârea) ---
-            self.G.add_edge(v_virt, v_phys, weight=0, actual_time=0.5, type='alight', line_name=route)
+            report(10, "Citire segmente stop_times")
+            rows = 0
+            query = trip_segments.pick(conn, SEGMENTS_TABLE_QUERY, SEGMENTS_QUERY, source=content)
+            for chunk in pd.read_sql(text(query), conn, chunksize=EDGE_CHUNK_ROWS):
+                self._add_route_edges(chunk, known_stops)
+                rows += len(chunk)
+                report(10, f"Segmente procesate: {rows}")
 
+        report(60, "Transferuri pe jos")
         self._create_walking_edges()
+        self.spatial_index = SpatialIndex.from_stops(self.stops, cell_m=SPATIAL_CELL_M)
 
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump({'G': self.G, 'stops': self.stops}, f)
-        self.is_loaded = True
+        report(75, "Conversie CSR")
+        self.csr = CSRGraph.from_networkx(self.G, self.stops)
+        print(f"   -> 🧮 CSR: {self.csr.num_nodes} noduri, {self.csr.num_edges} muchii, {self.csr.nbytes / 1e6:.1f} MB")
+        if self.engine == 'csr':
+            self.G = nx.DiGraph()  # eliberăm DiGraph-ul, rutarea merge doar pe array-uri
+        report(85, "View-uri zi/noapte")
+        self._build_period_views()
+
+        if fingerprint is not None:
+            report(92, "Salvare cache")
+            self._save_cache(fingerprint, params)
+        self._after_load(report)
+        report(100, "Graf gata")
         print("✅ Graf GATA!")
 
-    def get_nearest_stop(self, lat, lon):
-        closest, min_dist = None, float('inf')
-        candidates = {s: d for s, d in self.stops.items() if abs(d['lat']-lat)<0.02 and abs(d['lon']-lon)<0.02}
-        if not candidates: candidates = self.stops
-        for sid, data in candidates.items():
-            d = geodesic((lat, lon), (data['lat'], data['lon'])).meters
-            if d < min_dist: min_dist, closest = d, sid
-        return closest, min_dist
-
-    def find_route(self, start_coords, end_coords, time_value=None):
-        if not self.is_loaded: self.load_data()
-
-        is_night_request = False
+    def _after_load(self, report):
+        self.generation += 1
+        self.route_cache.clear()
+        self._close_od_pool()
+        self.hierarchies = None
+        self.is_loaded = True
+        if self.algorithm == 'ch':
+            report(95, "Contraction Hierarchies")
+            self.ensure_hierarchies()
+
+    def ensure_loaded(self):
+        """ Încărcare leneșă, o singură dată chiar dacă mai multe cereri vin simultan """
+        if self.is_loaded: return
+        with self._load_lock:
+            if not self.is_loaded:
+                self.load_data()
+
+    def _build_params(self):
+        """ Parametrii care schimbă graful construit; fac parte din cheia cache-ului """
+        return {
+            'bus_penalty': BUS_PENALTY,
+            'metro_penalty': METRO_PENALTY,
+            'hub_transfer_m': HUB_TRANSFER_M,
+            'walk_transfer_m': WALK_TRANSFER_M,
+            'spatial_cell_m': SPATIAL_CELL_M,
+            'service_periods': list(SERVICE_PERIODS),
+        }
+
+    def _data_fingerprint(self, content=None):
+        """
+        Amprenta datelor GTFS din baza de date: (amprentă, amprenta conținutului), (None, None) dacă baza
+        de date nu răspunde. Conținutul (stops, trips, stop_times) e partea scumpă; tabela routes, singura
+        modificată din admin, se adaugă peste el. `content` refolosește conținutul deja calculat la încărcare.
+        """
+        try:
+            engine = create_engine(self.db_url)
+            with engine.connect() as conn:
+                if content is None:
+                    content = trip_segments.source_fingerprint(conn)
+                h = hashlib.sha256(content.encode())
+                for row in conn.execute(text("SELECT route_id, route_short_name FROM routes ORDER BY route_id")):
+                    h.update(repr(tuple(row)).encode())
+        except Exception as e:
+            print(f"⚠️ Nu pot calcula amprenta datelor GTFS: {e}")
+            return None, None
+        return h.hexdigest(), content
+
+    def _save_cache(self, fingerprint, params):
+        csr, index = self.csr, self.spatial_index
+        views = self.views if self.engine == 'csr' else self._csr_period_views()
+
+        arrays = {
+            'stops.lat': index.lats, 'stops.lon': index.lons,
+            'graph.node_stop': csr.node_stop, 'graph.node_line': csr.node_line,
+            'spatial.order': index.order, 'spatial.cell_keys': index.cell_keys, 'spatial.cell_ptr': index.cell_ptr,
+        }
+        arrays.update({f'graph.{name}': arr for name, arr in csr.edge_arrays().items()})
+        for period, view in views.items():
+            arrays.update({f'view.{period}.{name}': arr for name, arr in view.edge_arrays().items()})
+
+        header = {
+            'fingerprint': fingerprint,
+            'params': params,
+            'built_at': datetime.now().isoformat(timespec='seconds'),
+            'stop_ids': csr.stop_ids,
+            'stop_names': [self.stops[sid]['name'] for sid in csr.stop_ids],
+            'lines': csr.lines,
+        }
+        path = graph_cache.cache_path(self.cache_prefix, fingerprint, params)
+        graph_cache.write(path, header, arrays)
+        graph_cache.remove_all(self.cache_prefix, keep=path)
+        self._cache_path = path
+        print(f"   -> 💾 Cache salvat: {path}")
+
+    def _load_cache(self, path, fingerprint=None):
+        """
+        Array-urile rămân mapate din fișier (mmap); doar dicționarele mici se refac în memorie.
+        Modificările din jurnalul cache-ului se reaplică peste graful CSR înainte de view-uri.
+        """
+        header, arrays = graph_cache.read(path)
+        stop_ids, lines = header['stop_ids'], header['lines']
+        lats, lons = arrays['stops.lat'], arrays['stops.lon']
+        self.stops = {
+            sid: {'lat': lat, 'lon': lon, 'name': name}
+            for sid, lat, lon, name in zip(stop_ids, lats.tolist(), lons.tolist(), header['stop_names'])
+        }
+
+        def csr_from(prefix):
+            return CSRGraph(stop_ids, lines, arrays['graph.node_stop'], arrays['graph.node_line'],
+                            **{name: arrays[f'{prefix}.{name}'] for name in EDGE_ARRAYS})
+
+        self.csr = csr_from('graph')
+        self.spatial_index = SpatialIndex(stop_ids, lats, lons, cell_m=header['params']['spatial_cell_m'],
+                                          order=arrays['spatial.order'], cell_keys=arrays['spatial.cell_keys'],
+                                          cell_ptr=arrays['spatial.cell_ptr'])
+        self._cache_path = path
+
+        deltas = graph_cache.deltas_for(path, fingerprint)
+        if len(deltas) < len(graph_cache.read_deltas(path)):
+            graph_cache.truncate_deltas(path, len(deltas))
+        for delta in deltas:
+            for change in delta['changes']:
+                self.csr = self.csr.replace_line(change['route'], self._route_layer(change['route'], change['segments']).edges(data=True))
+        if deltas:
+            print(f"   -> 🩹 {len(deltas)} modificări reaplicate din jurnal")
+
+        if self.engine == 'csr':
+            self.G = nx.DiGraph()
+            if deltas:
+                self._build_period_views()
+            else:
+                self.views = {period: csr_from(f'view.{period}') for period in SERVICE_PERIODS}
+        else:
+            self.G = self.csr.to_networkx()
+            self._build_period_views()
+
+    # --- Contraction Hierarchies (algorithm='ch') ---
+
+    def _ch_prefix(self):
+        return f"{self.cache_prefix}_ch"
+
+    def ensure_hierarchies(self):
+        """ Ierarhiile se construiesc (sau se citesc din cache) o singură dată pentru graful curent """
+        self.ensure_loaded()
+        hierarchies = self.hierarchies
+        if hierarchies is not None: return hierarchies
+        with self._ch_lock:
+            if self.hierarchies is not None: return self.hierarchies
+            with self._patch_lock:
+                csr = self.csr
+                views = self.views if self.engine == 'csr' else self._csr_period_views()
+            hierarchies = self._load_hierarchies(views)
+            if self.csr is csr:  # altfel graful s-a modificat între timp și ierarhia e deja veche
+                self.hierarchies = hierarchies
+            return hierarchies
+
+    def _load_hierarchies(self, views):
+        # amprenta view-urilor intră în cheie: după o modificare incrementală a liniilor
+        # (aceeași amprentă GTFS) ierarhia veche nu mai corespunde
+        digest = hashlib.sha256()
+        for period in sorted(views):
+            for arr in views[period].edge_arrays().values():
+                digest.update(np.ascontiguousarray(arr).tobytes())
+        fingerprint = self.fingerprint
+        params = dict(self._build_params(), witness_settle_limit=WITNESS_SETTLE_LIMIT, views=digest.hexdigest())
+        prefix = self._ch_prefix()
+
+        cached = graph_cache.find(prefix, fingerprint, params)
+        if cached:
+            print(f"⚡ Încărcare CH din cache ({cached})...")
+            _, arrays = graph_cache.read(cached)
+            return {
+                period: (view, ContractionHierarchy(**{name: arrays[f'ch.{period}.{name}'] for name in CH_ARRAYS}))
+                for period, view in views.items()
+            }
+
+        print("⏳ Preprocesare Contraction Hierarchies...")
+        hierarchies = {}
+        for period, view in views.items():
+            hierarchies[period] = (view, ContractionHierarchy.build(view))
+
+        if fingerprint is not None:
+            arrays = {}
+            for period, (_, ch) in hierarchies.items():
+                arrays.update({f'ch.{period}.{name}': arr for name, arr in ch.arrays().items()})
+            path = graph_cache.cache_path(prefix, fingerprint, params)
+            graph_cache.write(path, {
+                'fingerprint': fingerprint,
+                'params': params,
+                'built_at': datetime.now().isoformat(timespec='seconds'),
+            }, arrays)
+            graph_cache.remove_all(prefix, keep=path)
+            print(f"   -> 💾 CH salvat: {path}")
+        return hierarchies
+
+    # --- Orar (modul 'timetable') ---
+
+    def _timetable_prefix(self):
+        return f"{self.cache_prefix}_timetable"
+
+    def ensure_timetable(self):
+        """ Orarul se construiește (sau se citește din cache) doar la prima rutare în modul 'timetable' """
+        self.ensure_loaded()
+        if self.timetable is not None: return self.timetable
+        with self._timetable_lock:
+            if self.timetable is None:
+                self.service_calendar = self._load_calendar()
+                self.timetable = self._load_timetable()
+        return self.timetable
+
+    def _load_calendar(self):
+        """ calendar / calendar_dates din GTFS (tabele mici, citite la fiecare construire a orarului) """
+        engine = create_engine(self.db_url)
+        with engine.connect() as conn:
+            frames = {table: pd.read_sql(text(f"SELECT * FROM {table}"), conn)
+                      for table in ('calendar', 'calendar_dates') if inspect(conn).has_table(table)}
+        if not frames:
+            print("⚠️ Feed-ul GTFS nu are calendar / calendar_dates: orarul folosește toate cursele în fiecare zi")
+            return None
+        calendar = ServiceCalendar.from_frames(frames.get('calendar'), frames.get('calendar_dates'))
+        print(f"   -> 📅 Calendar: {len(calendar.weekly)} servicii, excepții în {len(calendar.exceptions)} zile")
+        return calendar
+
+    def _load_timetable(self):
+        fingerprint = self.fingerprint
+        params = dict(self._build_params(), shift_horizon=SHIFT_HORIZON, services=True)
+        prefix = self._timetable_prefix()
+        cached = graph_cache.find(prefix, fingerprint, params)
+        if cached:
+            print(f"⚡ Încărcare Orar din cache ({cached})...")
+            header, arrays = graph_cache.read(cached)
+            return Timetable(header['stop_ids'], header['lines'], header['services'],
+                             **{name: arrays[name] for name in TIMETABLE_ARRAYS})
+
+        timetable = self._build_timetable()
+        if fingerprint is not None:
+            path = graph_cache.cache_path(prefix, fingerprint, params)
+            graph_cache.write(path, {
+                'fingerprint': fingerprint,
+                'params': params,
+                'built_at': datetime.now().isoformat(timespec='seconds'),
+                'stop_ids': timetable.stop_ids,
+                'lines': timetable.lines,
+                'services': timetable.services,
+            }, timetable.arrays())
+            graph_cache.remove_all(prefix, keep=path)
+            print(f"   -> 💾 Orar salvat: {path}")
+        return timetable
+
+    def _build_timetable(self):
+        print("⏳ Generare Orar (conexiuni stop_times)...")
+        stop_index = self.csr.stop_index
+        trip_codes, line_codes, service_codes = {}, {}, {}
+        parts = []
+        engine = create_engine(self.db_url)
+        with engine.connect().execution_options(stream_results=True) as conn:
+            query = trip_segments.pick(conn, TIMETABLE_TABLE_QUERY, TIMETABLE_QUERY, source=self._content_fingerprint)
+            for chunk in pd.read_sql(text(query), conn, chunksize=EDGE_CHUNK_ROWS):
+                chunk = chunk.dropna(subset=['departure_time', 'arrival_time'])
+                dep = chunk['start_node'].astype(str).map(stop_index)
+                arr = chunk['end_node'].astype(str).map(stop_index)
+                known = (dep.notna() & arr.notna()).to_numpy()
+                chunk, dep, arr = chunk[known], dep[known], arr[known]
+
+                trips = chunk['trip_id'].astype(str)
+                route = chunk['route_short_name'].astype(str).str.strip().str.upper()
+                service = chunk['service_id'].fillna('').astype(str)
+                for trip in trips.unique().tolist():
+                    trip_codes.setdefault(trip, len(trip_codes))
+                for line in route.unique().tolist():
+                    line_codes.setdefault(line, len(line_codes))
+                for sid in service.unique().tolist():
+                    service_codes.setdefault(sid, len(service_codes))
+
+                parts.append((dep.to_numpy(np.int32), arr.to_numpy(np.int32),
+                              time_to_seconds(chunk['departure_time']), time_to_seconds(chunk['arrival_time']),
+                              trips.map(trip_codes).to_numpy(np.int32), route.map(line_codes).to_numpy(np.int32),
+                              service.map(service_codes).to_numpy(np.int32)))
+
+        columns = [np.concatenate(col) for col in zip(*parts)] if parts else [np.empty(0, dtype=np.int32)] * 7
+
+        # transferurile pe jos: muchiile 'walking' ale grafului (nodurile fizice = indicii stațiilor)
+        csr = self.csr
+        walk = csr.edge_type == EDGE_TYPE_CODES['walking']
+        src = np.repeat(np.arange(csr.num_nodes), np.diff(csr.indptr))[walk]
+        hub = csr.edge_line[walk] == (csr.lines.index('Transfer Rapid') if 'Transfer Rapid' in csr.lines else -1)
+
+        timetable = Timetable.from_connections(
+            csr.stop_ids, list(line_codes), list(service_codes), *columns,
+            src, csr.indices[walk], np.ceil(csr.actual_time[walk] * 60), hub,
+        )
+        print(f"   -> 🗓️ Orar: {timetable.num_connections} conexiuni, {len(trip_codes)} curse, {len(service_codes)} servicii, "
+              f"{timetable.nbytes / 1e6:.1f} MB")
+        return timetable
+
+    def _departure_time(self, time_value):
+        """ Momentul cererii (data și ora; implicit: acum) """
+        if time_value:
+            try:
+                return datetime.fromisoformat(time_value)
+            except ValueError:
+                pass
+        return datetime.now()
+
+    def _clock(self, seconds):
+        h, m = divmod(int(seconds) // 60 % (24 * 60), 60)
+        return f"{h:02d}:{m:02d}"
+
+    def _timetable_route(self, s_node, e_node, t0, day):
+        timetable = self.ensure_timetable()
+        print(f"🕒 Mod Rutare: ORAR (plecare {day:%d.%m.%Y} {self._clock(t0)})")
+        active = timetable.active_mask(self.service_calendar, day)
+        legs = timetable.earliest_arrival(timetable.stop_index[s_node], timetable.stop_index[e_node], t0, active)
+        result = self._build_timetable_result(legs, s_node, e_node, t0)
+        if self.service_calendar is None:
+            result['warning'] = NO_CALENDAR_WARNING
+        return result
+
+    def _build_timetable_result(self, legs, s_node, e_node, t0):
+        """ Aceeași structură ca _build_route_result, cu orele reale de plecare pe fiecare etapă """
+        tt = self.timetable
+        stop_ids = tt.stop_ids
+        route_details = []
+        full_coords = []
+        now = t0
+
+        for leg in legs:
+            if leg[0] == 'walk':
+                _, u, v, seconds, hub = leg
+                stop = self.stops[stop_ids[u]]
+                full_coords.append([stop['lat'], stop['lon']])
+                now += seconds
+                if route_details and route_details[-1]['type'] == 'transfer':
+                    route_details[-1]['duration'] += seconds / 60
+                else:
+                    route_details.append({
+                        'line': 'Transfer Metrou' if hub else 'Mers pe jos',
+                        'from': stop['name'],
+                        'type': 'transfer',
+                        'duration': seconds / 60
+                    })
+            else:
+                conns = leg[1]
+                first, last = conns[0], conns[-1]
+                for c in conns:
+                    stop = self.stops[stop_ids[tt.dep_stop[c]]]
+                    full_coords.append([stop['lat'], stop['lon']])
+                now = int(tt.arr_time[last])
+                route_details.append({
+                    'line': tt.lines[tt.line[first]],
+                    'from': self.stops[stop_ids[tt.dep_stop[first]]]['name'],
+                    'type': 'transit',
+                    'duration': (int(tt.arr_time[last]) - int(tt.dep_time[first])) / 60,
+                    'stops_count': len(conns),
+                    'departure': self._clock(tt.dep_time[first])
+                })
+
+        for step in route_details:
+            step['duration_fmt'] = self._format_duration(step['duration'])
+
+        last = self.stops[e_node]
+        full_coords.append([last['lat'], last['lon']])
+        total_time_min = (now - t0) / 60
+
+        return {
+            "path_coords": full_coords,
+            "details": route_details,
+            "start_stop": self.stops[s_node]['name'],
+            "end_stop": self.stops[e_node]['name'],
+            "total_duration": self._format_duration(total_time_min),
+            "total_minutes": int(total_time_min),
+            "arrival": self._clock(now)
+        }
+
+    # --- Modificări incrementale (editare / ștergere rută din admin) ---
+
+    def route_segments(self, route):
+        """ Segmentele (stație, stația următoare) pe care linia le are acum în graf """
+        self.ensure_loaded()
+        return self.csr.line_segments(self._route_name(route))
+
+    def add_route_layer(self, route, segments):
+        """ Adaugă segmente (stație, stația următoare) la stratul liniei; îl creează dacă nu există """
+        route = self._route_name(route)
+        merged = dict.fromkeys(self.route_segments(route) + [tuple(seg) for seg in segments])
+        self._apply_changes([(route, list(merged))])
+
+    def remove_route_layer(self, route):
+        """ Scoate din graf stratul liniei (muchiile travel/board/alight) """
+        self.ensure_loaded()
+        self._apply_changes([(self._route_name(route), [])])
+
+    def rename_route_layer(self, old, new):
+        """ Mută stratul liniei `old` sub numele `new` (costurile se recalculează: metrou/noapte) """
+        old, new = self._route_name(old), self._route_name(new)
+        if old == new: return
+        merged = dict.fromkeys(self.route_segments(new) + self.route_segments(old))
+        self._apply_changes([(old, []), (new, list(merged))])
+
+    def refresh_route_layers(self, *routes):
+        """
+        Reface din baza de date straturile liniilor date (ex: numele vechi și cel nou după o editare).
+        Corect și când mai multe route_id au același nume scurt.
+        """
+        self.ensure_loaded()
+        routes = list(dict.fromkeys(self._route_name(r) for r in routes))
+        changes = []
+        engine = create_engine(self.db_url)
+        with engine.connect() as conn:
+            query = text(trip_segments.pick(conn, SEGMENTS_TABLE_QUERY, SEGMENTS_QUERY, source=self._content_fingerprint)
+                         + " WHERE UPPER(TRIM(r.route_short_name)) = :route")
+            for route in routes:
+                rows = conn.execute(query, {'route': route}).fetchall()
+                changes.append((route, [(str(u), str(v)) for u, v, _ in rows]))
+        self._apply_changes(changes)
+
+    def _route_name(self, route):
+        return str(route).strip().upper()
+
+    def _route_layer(self, route, segments):
+        """ Stratul unei linii ca DiGraph mic, cu aceleași muchii și costuri ca la construcția completă """
+        layer = nx.DiGraph()
+        if segments:
+            chunk = pd.DataFrame(list(segments), columns=['start_node', 'end_node'])
+            chunk['route_short_name'] = route
+            self._add_route_edges(chunk, pd.Index(self.csr.stop_ids), G=layer)
+        return layer
+
+    def _apply_changes(self, changes):
+        """ changes: listă de (linie, segmente); fiecare strat e înlocuit complet, apoi se scrie jurnalul """
+        t0 = time.perf_counter()
+        # routes e deja modificată în baza de date; conținutul GTFS nu, deci se refolosește cel de la încărcare
+        fingerprint = self._data_fingerprint(self._content_fingerprint)[0] if self._content_fingerprint else None
+        with self._patch_lock:
+            for route, segments in changes:
+                self._patch_layer(route, segments)
+            self.fingerprint = fingerprint  # orarul / ierarhiile reconstruite de acum au cheia datelor noi
+            self.timetable = None  # liniile s-au schimbat; orarul se reconstruiește la următoarea cerere
+            self.hierarchies = None  # la fel ierarhiile (până atunci 'ch' caută cu Dijkstra)
+            self.generation += 1
+            self.route_cache.clear()
+        self._close_od_pool()  # procesele au graful de dinainte de modificare
+        if self.algorithm == 'ch':
+            threading.Thread(target=self.ensure_hierarchies, name='ch-rebuild', daemon=True).start()
+        self._record_delta(changes, fingerprint)
+        print(f"🩹 Graf actualizat incremental ({', '.join(r for r, _ in changes)}) "
+              f"în {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    def _patch_layer(self, route, segments):
+        layer = self._route_layer(route, segments)
+        old_csr = self.csr
+        new_csr = old_csr.replace_line(route, layer.edges(data=True))
+
+        if self.engine == 'csr':
+            # obiecte noi, schimbate prin atribuire: căutările în curs rămân pe versiunea veche
+            self.csr = new_csr
+            self._build_period_views()
+            return
+
+        self.csr = new_csr
+        if route in old_csr.lines:
+            line_id = old_csr.lines.index(route)
+            stale = [old_csr.node_id(i) for i in np.flatnonzero(old_csr.node_line == line_id).tolist()]
+            self.G.remove_nodes_from(stale)
+            for view in self.views.values():
+                view.remove_nodes_from(stale)
+        self.G.add_edges_from(layer.edges(data=True))
+        for period, view in self.views.items():
+            self._add_view_edges(view, SERVICE_PERIODS[period], layer)
+
+    def _record_delta(self, changes, fingerprint):
+        """ Adaugă modificarea în jurnalul cache-ului, cu amprenta datelor de după ea """
+        if fingerprint is None or not self._cache_path or not os.path.exists(self._cache_path): return
+        graph_cache.append_delta(self._cache_path, {
+            'fingerprint': fingerprint,
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'changes': [{'route': route, 'segments': [list(seg) for seg in segments]} for route, segments in changes],
+        })
+
+    def _add_route_edges(self, chunk, known_stops, G=None):
+        """ Muchiile travel/board/alight pentru un lot de segmente (start_node, end_node, route_short_name) """
+        G = self.G if G is None else G
+        u_phys = chunk['start_node'].astype(str)
+        v_phys = chunk['end_node'].astype(str)
+        route = chunk['route_short_name'].astype(str).str.strip().str.upper()
+
+        known = u_phys.isin(known_stops) & v_phys.isin(known_stops)
+        u_phys, v_phys, route = u_phys[known], v_phys[known], route[known]
+
+        u_virt = u_phys + '|' + route
+        v_virt = v_phys + '|' + route
+
+        is_metro = (route.str.startswith('M') | route.isin(['M1','M2','M3','M4','M5'])).to_numpy()
+        is_night = route.str.startswith('N').tolist()
+
+        # --- A. TRAVEL (Mersul efectiv cu vehiculul) ---
+        # weight: pentru algoritm (Metroul e super ieftin ca să fie ales)
+        # actual_time: realitatea (Metroul ia ~2 min, Bus ia ~4 min în trafic)
+        algo_cost = np.where(is_metro, 0.5, 2.0).tolist()
+        real_time = np.where(is_metro, 2.5, 4.0).tolist()
+
+        # --- B. BOARDING (Urcarea / Așteptarea) ---
+        # weight: penalizarea psihologică pentru schimbare
+        # actual_time: timpul mediu de așteptare în stație (5 min metrou, 10 min bus)
+        algo_penalty = np.where(is_metro, METRO_PENALTY, BUS_PENALTY).tolist()
+        wait_time = np.where(is_metro, 5.0, 10.0).tolist()
+
+        u_phys, v_phys, route = u_phys.tolist(), v_phys.tolist(), route.tolist()
+        u_virt, v_virt = u_virt.tolist(), v_virt.tolist()
+
+        G.add_edges_from(
+            (u, v, {'weight': w, 'actual_time': t, 'type': 'travel', 'line_name': r})
+            for u, v, w, t, r in zip(u_virt, v_virt, algo_cost, real_time, route)
+        )
+        G.add_edges_from(
+            (u, v, {'weight': w, 'actual_time': t, 'type': 'board', 'line_name': r, 'is_night': n})
+            for u, v, w, t, r, n in zip(u_phys, u_virt, algo_penalty, wait_time, route, is_night)
+        )
+        # --- C. ALIGHTING (Coborârea) ---
+        G.add_edges_from(
+            (u, v, {'weight': 0, 'actual_time': 0.5, 'type': 'alight', 'line_name': r})
+            for u, v, r in zip(v_virt, v_phys, route)
+        )
+
+    def _build_period_views(self):
+        """ Câte un graf de rutare pe perioadă de serviciu, cu urcările interzise eliminate """
+        if self.engine == 'csr':
+            self.views = self._csr_period_views()
+            return
+
+        self.views = {}
+        for period, spec in SERVICE_PERIODS.items():
+            view = nx.DiGraph()
+            view.add_nodes_from(self.G)
+            self._add_view_edges(view, spec, self.G)
+            self.views[period] = view
+
+    def _add_view_edges(self, view, spec, G):
+        """ Copiază în view muchiile din G permise în perioada `spec` (doar weight-ul) """
+        view.add_weighted_edges_from(
+            (u, v, d.get('weight', 0)) for u, v, d in G.edges(data=True)
+            if d.get('type') != 'board' or spec['boards'](d.get('line_name', ''), d.get('is_night', False))
+        )
+
+    def _csr_period_views(self):
+        csr = self.csr
+        views = {}
+        for period, spec in SERVICE_PERIODS.items():
+            line_ok = np.array([spec['boards'](line, line.startswith('N')) for line in csr.lines], dtype=bool)
+            mask = (csr.edge_type != EDGE_TYPE_CODES['board']) | line_ok[csr.edge_line]
+            views[period] = csr.edge_subgraph(mask)
+        return views
+
+    def _service_period(self, time_value):
+        """ Perioada de serviciu pentru ora cerută (implicit: zi) """
         if time_value:
             try:
                 h = datetime.fromisoformat(time_value).hour
-                if h >= 23 or h < 5: is_night_request = True
+                for period, spec in SERVICE_PERIODS.items():
+                    if h in spec['hours']: return period
             except: pass
-        
-        print(f"🕒 Mod Rutare: {'NOAPTE' if is_night_request else 'ZI'}")
+        return DEFAULT_PERIOD
 
-        def layered_weight(u, v, d):
-            edge_type = d.get('type')
-            
-            if edge_type == 'board':
-                is_night_line = d.get('is_night', False)
-                route_name = d.get('line_name', '')
-                if not is_night_request:
-                    if is_night_line: return float('inf')
-                else:
-                    if not (is_night_line or route_name == '783'): return float('inf')
-            
-            return d.get('weight', 0)
+    def gazetteer(self):
+        """ Gazetarul offline din numele stațiilor (geocodare fără rețea); None până se încarcă graful """
+        if self._gazetteer is None and self.is_loaded:
+            self._gazetteer = Gazetteer.from_stops(self.stops, self._clean_name, cluster_m=HUB_TRANSFER_M)
+        return self._gazetteer
 
-        s_node, _ = self.get_nearest_stop(*start_coords)
-        e_node, _ = self.get_nearest_stop(*end_coords)
+    def get_nearest_stop(self, lat, lon):
+        return self.spatial_index.nearest(lat, lon)
+
+    def find_route(self, start_coords, end_coords, time_value=None, mode='graph', algorithm=None, snap=None):
+        if mode not in MODES:
+            return {"error": f"Mod de rutare necunoscut: {mode}"}
+        algorithm = algorithm or self.algorithm
+        if algorithm not in ALGORITHMS:
+            return {"error": f"Algoritm necunoscut: {algorithm}"}
+        snap = snap or self.snap
+        if snap not in SNAP_MODES:
+            return {"error": f"Mod de legare necunoscut: {snap}"}
+        self.ensure_loaded()
+        generation = self.generation  # citită înainte de căutare (vezi __init__)
+
+        # Modul graf depinde doar de perioada de serviciu, orarul de minutul plecării
+        # (algoritmul nu intră în cheie: toate dau același cost).
+        # Cu snap='multi' costul depinde de distanțele până la stații, deci cheia e pe coordonate (~1 m).
+        multi = snap == 'multi' and mode == 'graph'
+        if multi:
+            period = self._service_period(time_value)
+            key = (generation, snap, *(round(c, 5) for c in (*start_coords, *end_coords)), mode, period)
+        else:
+            s_node, _ = self.get_nearest_stop(*start_coords)
+            e_node, _ = self.get_nearest_stop(*end_coords)
+            if mode == 'timetable':
+                when = self._departure_time(time_value)
+                day, t0 = when.date(), when.hour * 3600 + when.minute * 60
+                key = (generation, s_node, e_node, mode, day, t0)
+            else:
+                period = self._service_period(time_value)
+                key = (generation, s_node, e_node, mode, period)
+        cached = self.route_cache.get(key)
+        if cached is not MISSING:
+            return cached  # rezultatele din cache sunt partajate, nu se modifică
 
         try:
-            path = nx.dijkstra_path(self.G, s_node, e_node, weight=layered_weight)
-            
-            route_details = []
-            full_coords = []
+            if mode == 'timetable':
+                result = self._timetable_route(s_node, e_node, t0, day)
+            elif multi:
+                print(f"🕒 Mod Rutare: {SERVICE_PERIODS[period]['label']} (stații multiple)")
+                sources = self._snap_candidates(*start_coords)
+                targets = self._snap_candidates(*end_coords)
+                edges, s_node, e_node = self._multi_shortest_path(period, sources, targets, algorithm)
+                result = self._build_route_result(edges, s_node, e_node,
+                                                  access=(start_coords, sources[s_node]),
+                                                  egress=(end_coords, targets[e_node]))
+            else:
+                print(f"🕒 Mod Rutare: {SERVICE_PERIODS[period]['label']}")
+                edges = self._shortest_path(period, s_node, e_node, algorithm)
+                result = self._build_route_result(edges, s_node, e_node)
+
+        except (nx.NetworkXNoPath, NoPath, NoConnection):
+            result = {"error": "Nu există rută validă."}
+        except Exception as e:
+            return {"error": str(e)}
+
+        if self.generation == generation:
+            self.route_cache.set(key, result)
+        return result
+
+    def _snap_candidates(self, lat, lon):
+        """ Stațiile candidate pentru un capăt al rutei: {stop_id: minute de mers pe jos până la ea} """
+        found = [(sid, m) for sid, m in self.spatial_index.k_nearest(lat, lon, SNAP_CANDIDATES) if m <= SNAP_RADIUS_M]
+        if not found:
+            found = [self.get_nearest_stop(lat, lon)]  # nicio stație pe rază: rămâne cea mai apropiată
+        return {sid: m / WALK_SPEED_M_MIN for sid, m in found}
+
+    def _multi_shortest_path(self, period, sources, targets, algorithm='dijkstra', stats=None):
+        """
+        O singură căutare de la toate stațiile din `sources` către toate din `targets`
+        (dict stop_id -> minute de mers pe jos, adăugate la cost). Întoarce (muchii, stație start, stație final).
+        'ch' folosește ierarhia; celelalte algoritme fac Dijkstra multi-sursă.
+        """
+        hierarchies = self.hierarchies if algorithm == 'ch' else None
+        if hierarchies is not None or self.engine == 'csr':
+            view, search = hierarchies[period] if hierarchies is not None else (self.views[period], None)
+            search = search or view
+            path, s, e = search.multi_source_path({view.stop_index[sid]: c for sid, c in sources.items()},
+                                                  {view.stop_index[sid]: c for sid, c in targets.items()}, stats)
+            edges = [(view.node_id(u), view.node_id(v), view.edge_data(k)) for u, v, k in path]
+            return edges, view.stop_ids[s], view.stop_ids[e]  # nodurile fizice au indicele stației
+
+        # networkx: o sursă și o destinație virtuale, legate de candidați, doar pe durata căutării
+        view = self.views[period]
+        start, end = ('snap', 'start'), ('snap', 'end')
+        with self._patch_lock:
+            view.add_weighted_edges_from((start, sid, c) for sid, c in sources.items())
+            view.add_weighted_edges_from((sid, end, c) for sid, c in targets.items())
+            try:
+                path = nx.dijkstra_path(view, start, end, weight='weight')
+            finally:
+                view.remove_nodes_from((start, end))
+            path = path[1:-1]
+            return [(u, v, self.G.get_edge_data(u, v)) for u, v in zip(path, path[1:])], path[0], path[-1]
+
+    # --- Matrice origine-destinație ---
+
+    def od_matrix(self, origins, destinations, time_value=None, paths=False, workers=None):
+        """
+        Durata (total_minutes, ca la find_route) pentru fiecare pereche origine x destinație.
+        Punctele sunt stop_id sau (lat, lon) (legate de cea mai apropiată stație). O singură căutare
+        unu-la-mulți per origine; pentru multe origini, căutările se împart pe un pool de procese.
+        Întoarce {'origins', 'destinations' (stațiile), 'period', 'total_minutes': [[minute sau None]]}
+        plus 'paths' (rezultatul complet ca la find_route, sau None) dacă paths=True.
+        """
+        self.ensure_loaded()
+        period = self._service_period(time_value)
+        o_nodes = [self._resolve_point(p) for p in origins]
+        d_nodes = [self._resolve_point(p) for p in destinations]
+        rows = self._one_to_many_rows(period, o_nodes, d_nodes, paths, workers)
+
+        result = {
+            'origins': o_nodes,
+            'destinations': d_nodes,
+            'period': period,
+            'total_minutes': [[rows[o][d][0] for d in d_nodes] for o in o_nodes],
+        }
+        if paths:
+            result['paths'] = [[rows[o][d][1] for d in d_nodes] for o in o_nodes]
+        return result
+
+    def od_pairs(self, pairs, time_value=None, paths=False, workers=None):
+        """ Ca od_matrix, pentru o listă de perechi (origine, destinație); perechile cu aceeași origine se grupează """
+        self.ensure_loaded()
+        period = self._service_period(time_value)
+        nodes = [(self._resolve_point(o), self._resolve_point(d)) for o, d in pairs]
+        wanted = {}
+        for o, d in nodes:
+            wanted.setdefault(o, {})[d] = None
+        rows = self._one_to_many_rows(period, list(wanted), {o: list(ds) for o, ds in wanted.items()}, paths, workers)
+
+        out = []
+        for o, d in nodes:
+            minutes, result = rows[o][d]
+            item = {'origin': o, 'destination': d, 'total_minutes': minutes}
+            if paths:
+                item['path'] = result
+            out.append(item)
+        return {'period': period, 'pairs': out}
+
+    def _resolve_point(self, point):
+        """ stop_id existent sau (lat, lon) -> stop_id """
+        if isinstance(point, str):
+            if point not in self.stops:
+                raise KeyError(f"Stație necunoscută: {point}")
+            return point
+        lat, lon = point
+        return self.get_nearest_stop(float(lat), float(lon))[0]
+
+    def _one_to_many_rows(self, period, origins, destinations, paths, workers=None):
+        """
+        origine -> {destinație: (minute, rezultat)}; destinations e lista comună sau dict origine -> listă.
+        """
+        origins = list(dict.fromkeys(origins))
+        targets_of = destinations if isinstance(destinations, dict) else dict.fromkeys(origins, destinations)
+        tasks = [(o, list(dict.fromkeys(targets_of[o]))) for o in origins]
+
+        workers = OD_WORKERS if workers is None else workers
+        pool = self._get_od_pool(workers) if workers > 1 and len(tasks) >= OD_POOL_MIN_ORIGINS else None
+        if pool is None:
+            return {o: self._one_to_many(period, o, targets, paths) for o, targets in tasks}
+
+        # câteva loturi per proces: mai puține mesaje între procese, dar sarcina rămâne echilibrată
+        size = max(1, len(tasks) // (workers * 4))
+        chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+        try:
+            parts = pool.map(_od_worker_rows, [(period, chunk, paths) for chunk in chunks])
+        except RuntimeError:
+            # pool-ul tocmai a fost oprit (graf înlocuit / modificat): calculul rămâne în procesul curent
+            return {o: self._one_to_many(period, o, targets, paths) for o, targets in tasks}
+        rows = {}
+        for part in parts:
+            rows.update(part)
+        return rows
+
+    def _one_to_many(self, period, s_node, targets, paths=False):
+        """ {destinație: (minute sau None, rezultat find_route sau None)} dintr-o singură căutare din s_node """
+        row = {}
+        if self.engine == 'csr':
+            view = self.views[period]
+            s = view.stop_index[s_node]
+            _, pred = view.shortest_path_tree(s, [view.stop_index[t] for t in targets])
+            for t in targets:
+                try:
+                    path = view.tree_path(pred, s, view.stop_index[t])
+                except NoPath:
+                    row[t] = (None, None)
+                    continue
+                row[t] = self._od_cell([(view.node_id(u), view.node_id(v), view.edge_data(e)) for u, v, e in path],
+                                       s_node, t, paths)
+            return row
+
+        with self._patch_lock:
+            _, found = nx.single_source_dijkstra(self.views[period], s_node, weight='weight')
+            for t in targets:
+                path = found.get(t)
+                if path is None:
+                    row[t] = (None, None)
+                    continue
+                edges = [(u, v, self.G.get_edge_data(u, v)) for u, v in zip(path, path[1:])]
+                row[t] = self._od_cell(edges, s_node, t, paths)
+        return row
+
+    def _od_cell(self, edges, s_node, e_node, paths):
+        if paths:
+            result = self._build_route_result(edges, s_node, e_node)
+            return result['total_minutes'], result
+        return int(sum(d.get('actual_time', 0) for _, _, d in edges)), None
+
+    def _get_od_pool(self, workers):
+        """ Pool-ul de procese (None dacă graful nu are fișier de cache din care să-l încarce procesele) """
+        if not self._cache_path or not os.path.exists(self._cache_path): return None
+        with self._od_lock:
+            if self._retired: return None
+            if self._od_pool is None:
+                # 'spawn': procese curate, fără lock-urile thread-urilor serverului moștenite prin fork
+                self._od_pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_od_worker, initargs=(self.db_params, self._cache_path),
+                )
+            return self._od_pool
+
+    def _close_od_pool(self, cancel=True):
+        """ Oprește procesele od_matrix; cu cancel=False termină întâi loturile deja trimise """
+        with self._od_lock:
+            pool, self._od_pool = self._od_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=cancel)
+
+    def retire(self):
+        """
+        Graful a fost înlocuit (GraphRebuilder): nu mai primește cereri noi, deci procesele od_matrix
+        se opresc după ce termină loturile cererilor în curs, în loc să rămână pornite cu mmap-ul lor.
+        """
+        with self._od_lock:
+            self._retired = True
+        self._close_od_pool(cancel=False)
+
+    # --- Izocrone ---
+
+    def isochrone(self, origin, minutes, time_value=None, grid=False, cell_m=ISOCHRONE_CELL_M):
+        """
+        Tot ce se poate atinge în `minutes` minute din `origin` (stop_id sau (lat, lon)), în perioada
+        orei `time_value`. Un singur Dijkstra mărginit pe actual_time (timpul real, cu așteptările),
+        pornit din stațiile candidate din jurul originii (minutele de mers pe jos sunt costul inițial).
+        Întoarce stațiile atinse cu minutul sosirii și, cu grid=True, celulele de `cell_m` metri
+        atinse apoi pe jos din ele (fiecare cu minutul cel mai devreme).
+        """
+        if not 0 < minutes <= ISOCHRONE_MAX_MINUTES:
+            raise ValueError(f"minutes trebuie să fie între 0 și {ISOCHRONE_MAX_MINUTES}")
+        self.ensure_loaded()
+        period = self._service_period(time_value)
+        if isinstance(origin, str):
+            if origin not in self.stops:
+                raise KeyError(f"Stație necunoscută: {origin}")
+            sources = {origin: 0.0}
+        else:
+            sources = self._snap_candidates(float(origin[0]), float(origin[1]))
+
+        view = self._period_csr_views()[period]
+        reached = view.within_cost({view.stop_index[sid]: c for sid, c in sources.items()}, minutes)
+        n_stops = len(view.stop_ids)
+        stops = sorted((t, view.stop_ids[u]) for u, t in reached.items() if u < n_stops)  # doar nodurile fizice
+
+        result = {
+            'period': period,
+            'minutes': minutes,
+            'origin_stops': list(sources),
+            'stops': [
+                {'stop_id': sid, 'name': self.stops[sid]['name'], 'lat': self.stops[sid]['lat'],
+                 'lon': self.stops[sid]['lon'], 'minutes': round(t, 1)}
+                for t, sid in stops
+            ],
+        }
+        if grid:
+            result['grid'] = self._isochrone_grid(stops, minutes, cell_m)
+        return result
+
+    def _isochrone_grid(self, stops, minutes, cell_m):
+        """ Celulele atinse pe jos (WALK_SPEED_M_MIN) din stațiile atinse, cu timpul rămas din fiecare """
+        index = self.spatial_index
+        if not stops:
+            return {'cell_m': cell_m, 'cells': []}
+        idx = np.array([self.csr.stop_index[sid] for _, sid in stops])  # aceeași ordine ca în indexul spațial
+        t = np.array([t for t, _ in stops])
+        xs, ys = index.xs[idx], index.ys[idx]
+        radius = (minutes - t) * WALK_SPEED_M_MIN
+
+        cells, times = [], []
+        for x, y, r, t0 in zip(xs.tolist(), ys.tolist(), radius.tolist(), t.tolist()):
+            cx = np.arange(math.floor((x - r) / cell_m), math.floor((x + r) / cell_m) + 1)
+            cy = np.arange(math.floor((y - r) / cell_m), math.floor((y + r) / cell_m) + 1)
+            gx, gy = np.meshgrid(cx, cy)
+            d = np.hypot((gx + 0.5) * cell_m - x, (gy + 0.5) * cell_m - y)
+            inside = d <= r
+            cells.append(np.column_stack([gx[inside], gy[inside]]))
+            times.append(t0 + d[inside] / WALK_SPEED_M_MIN)
+
+        # minutul cel mai devreme pe celulă
+        cells, inverse = np.unique(np.concatenate(cells), axis=0, return_inverse=True)
+        best = np.full(len(cells), np.inf)
+        np.minimum.at(best, inverse.ravel(), np.concatenate(times))
+        gx, gy = cells[:, 0], cells[:, 1]
+        lats = (gy + 0.5) * cell_m / index.ky
+        lons = (gx + 0.5) * cell_m / index.kx
+        return {
+            'cell_m': cell_m,
+            'cells': [[round(lat, 6), round(lon, 6), round(m, 1)]
+                      for lat, lon, m in zip(lats.tolist(), lons.tolist(), best.tolist())],
+        }
+
+    def _period_csr_views(self):
+        """ View-urile perioadelor în format CSR (cu actual_time), pentru ambele motoare """
+        if self.engine == 'csr':
+            return self.views
+        csr, views = self._csr_views
+        if csr is not self.csr:
+            csr = self.csr
+            views = self._csr_period_views()
+            self._csr_views = (csr, views)
+        return views
+
+    def _shortest_path(self, period, s_node, e_node, algorithm='dijkstra', stats=None):
+        """
+        Drumul de cost minim pe view-ul perioadei; întoarce muchiile drumului ca (u, v, edge_data).
+        stats (dict, doar engine='csr') primește numărul de noduri fixate de căutare.
+        """
+        if algorithm == 'ch':
+            hierarchies = self.hierarchies
+            if hierarchies is not None:
+                view, ch = hierarchies[period]
+                path = ch.shortest_path(view.stop_index[s_node], view.stop_index[e_node], stats)
+                return [(view.node_id(u), view.node_id(v), view.edge_data(e)) for u, v, e in path]
+            algorithm = 'dijkstra'
+
+        view = self.views[period]
+        if self.engine == 'csr':
+            s, e = view.stop_index[s_node], view.stop_index[e_node]
+            if algorithm == 'astar':
+                path = view.astar_path(s, e, self._stop_heuristic(e_node), stats)
+            elif algorithm == 'bidirectional':
+                path = view.bidirectional_path(s, e, stats)
+            else:
+                path = view.shortest_path(s, e, stats)
+            return [(view.node_id(u), view.node_id(v), view.edge_data(e)) for u, v, e in path]
+
+        with self._patch_lock:
+            if algorithm == 'astar':
+                h, stop_index = self._stop_heuristic(e_node), self.csr.stop_index
+                path = nx.astar_path(view, s_node, e_node, weight='weight',
+                                     heuristic=lambda u, _: h[stop_index[u.partition('|')[0]]])
+            elif algorithm == 'bidirectional':
+                _, path = nx.bidirectional_dijkstra(view, s_node, e_node, weight='weight')
+            else:
+                path = nx.dijkstra_path(view, s_node, e_node, weight='weight')
+            return [(u, v, self.G.get_edge_data(u, v)) for u, v in zip(path, path[1:])]
+
+    def _heuristic_speed(self):
+        """
+        Cea mai mare "viteză" din graf: max(distanța haversine dintre stații / weight) pe toate muchiile.
+        Cu ea, distanța până la destinație / viteză nu depășește niciodată costul rămas (A* rămâne optim).
+        None dacă o muchie cu weight 0 leagă stații diferite (atunci nu există o margine utilă).
+        """
+        csr, speed = self._astar_speed
+        if csr is self.csr:
+            return speed
+        csr = self.csr
+        src = np.repeat(np.arange(csr.num_nodes), np.diff(csr.indptr))
+        a, b = csr.node_stop[src], csr.node_stop[csr.indices]
+        lats, lons = self.spatial_index.lats, self.spatial_index.lons
+        dist = haversine_m(lats[a], lons[a], lats[b], lons[b])
+        moving = dist > 0
+        if np.any(moving & (csr.weight <= 0)):
+            speed = None
+        else:
+            speed = float(np.max(dist[moving] / csr.weight[moving])) if moving.any() else None
+        self._astar_speed = (csr, speed)
+        return speed
+
+    def _stop_heuristic(self, e_node):
+        """ Estimarea costului rămas din fiecare stație până la e_node (listă în ordinea stațiilor) """
+        speed = self._heuristic_speed()
+        if speed is None:
+            return [0.0] * len(self.csr.stop_ids)
+        i = self.csr.stop_index[e_node]
+        lats, lons = self.spatial_index.lats, self.spatial_index.lons
+        # marjă pentru rotunjiri: estimarea trebuie să rămână sub costul real
+        return (haversine_m(lats, lons, lats[i], lons[i]) / (speed * (1 + 1e-9))).tolist()
+
+    def _build_route_result(self, edges, s_node, e_node, access=None, egress=None):
+        """
+        Transformă muchiile drumului (u, v, edge_data) în structura trimisă către interfață.
+        access/egress = (coordonate, minute): mersul pe jos de la punctul de plecare la s_node și
+        de la e_node la destinație (snap='multi'); intră în pași și în durata totală.
+        """
+        route_details = []
+        full_coords = []
+        
+        total_time_min = 0
+        if access:
+            coords, minutes = access
+            full_coords.append(list(coords))
+            route_details.append({'line': 'Mers pe jos', 'from': 'Punctul de plecare', 'type': 'transfer',
+                                  'duration': minutes})
+            total_time_min += minutes
+        
+        for u, v, edge_data in edges:
+            edge_type = edge_data.get('type')
             
-            total_time_min = 0
+            # ADUNĂM TIMPUL REAL (nu weight-ul)
+            segment_time = edge_data.get('actual_time', 0)
+            total_time_min += segment_time
             
-            for i in range(len(path) - 1):
-                u, v = path[i], path[i+1]
-                edge_data = self.G.get_edge_data(u, v)
-                edge_type = edge_data.get('type')
-                
-                # ADUNĂM TIMPUL REAL (nu weight-ul)
-                segment_time = edge_data.get('actual_time', 0)
-                total_time_min += segment_time
-                
-                phys_id = u.split('|')[0]
-                if phys_id in self.stops:
-                    full_coords.append([self.stops[phys_id]['lat'], self.stops[phys_id]['lon']])
-
-                if edge_type == 'travel':
-                    line = edge_data.get('line_name')
-                    from_stop = self.stops[phys_id]['name']
-                    
-                    # Dacă continuăm pe aceeași linie, adunăm timpul la pasul existent
-                    if route_details and route_details[-1]['line'] == line and route_details[-1]['type'] == 'transit':
-                        route_details[-1]['duration'] += segment_time
-                        route_details[-1]['stops_count'] += 1
-                    else:
-                        route_details.append({
-                            'line': line, 
-                            'from': from_stop, 
-                            'type': 'transit',
-                            'duration': segment_time,
-                            'stops_count': 1
-                        })
-                
-                elif edge_type == 'walking':
-                    display = 'Transfer Metrou' if edge_data.get('line_name') == 'Transfer Rapid' else 'Mers pe jos'
-                    if not route_details or route_details[-1]['type'] != 'transfer':
-                        route_details.append({
-                            'line': display, 
-                            'from': self.stops[phys_id]['name'], 
-                            'type': 'transfer',
-                            'duration': segment_time
-                        })
-                    else:
-                        route_details[-1]['duration'] += segment_time
+            phys_id = u.split('|')[0]
+            if phys_id in self.stops:
+                full_coords.append([self.stops[phys_id]['lat'], self.stops[phys_id]['lon']])
+
+            if edge_type == 'travel':
+                line = edge_data.get('line_name')
+                from_stop = self.stops[phys_id]['name']
                 
-                elif edge_type == 'board':
-                    # Adăugăm timpul de așteptare la următorul segment de tranzit sau îl afișăm ca "Așteptare"
-                    # Cel mai simplu: îl adăugăm la timpul total, dar nu facem pas separat în UI
-                    # (sau putem adăuga un pas mic de "Așteptare")
-                    pass
+                # Dacă continuăm pe aceeași linie, adunăm timpul la pasul existent
+                if route_details and route_details[-1]['line'] == line and route_details[-1]['type'] == 'transit':
+                    route_details[-1]['duration'] += segment_time
+                    route_details[-1]['stops_count'] += 1
+                else:
+                    route_details.append({
+                        'line': line, 
+                        'from': from_stop, 
+                        'type': 'transit',
+                        'duration': segment_time,
+                        'stops_count': 1
+                    })
+            
+            elif edge_type == 'walking':
+                display = 'Transfer Metrou' if edge_data.get('line_name') == 'Transfer Rapid' else 'Mers pe jos'
+                if not route_details or route_details[-1]['type'] != 'transfer':
+                    route_details.append({
+                        'line': display, 
+                        'from': self.stops[phys_id]['name'], 
+                        'type': 'transfer',
+                        'duration': segment_time
+                    })
+                else:
+                    route_details[-1]['duration'] += segment_time
+            
+            elif edge_type == 'board':
+                # Adăugăm timpul de așteptare la următorul segment de tranzit sau îl afișăm ca "Așteptare"
+                # Cel mai simplu: îl adăugăm la timpul total, dar nu facem pas separat în UI
+                # (sau putem adăuga un pas mic de "Așteptare")
+                pass
 
-            # Formatăm duratele pentru fiecare pas
-            for step in route_details:
-                step['duration_fmt'] = self._format_duration(step['duration'])
+        last_node = edges[-1][1] if edges else s_node
+        last = self.stops[last_node.split('|')[0]]
+        full_coords.append([last['lat'], last['lon']])
 
-            last = self.stops[path[-1].split('|')[0]]
-            full_coords.append([last['lat'], last['lon']])
+        if egress:
+            coords, minutes = egress
+            if route_details and route_details[-1]['type'] == 'transfer':
+                route_details[-1]['duration'] += minutes
+            else:
+                route_details.append({'line': 'Mers pe jos', 'from': last['name'], 'type': 'transfer',
+                                      'duration': minutes})
+            full_coords.append(list(coords))
+            total_time_min += minutes
 
-            return {
-                "path_coords": full_coords,
-                "details": route_details,
-                "start_stop": self.stops[s_node]['name'],
-                "end_stop": self.stops[e_node]['name'],
-                "total_duration": self._format_duration(total_time_min),
-                "total_minutes": int(total_time_min)
-            }
+        # Formatăm duratele pentru fiecare pas
+        for step in route_details:
+            step['duration_fmt'] = self._format_duration(step['duration'])
+
+        return {
+            "path_coords": full_coords,
+            "details": route_details,
+            "start_stop": self.stops[s_node]['name'],
+            "end_stop": self.stops[e_node]['name'],
+            "total_duration": self._format_duration(total_time_min),
+            "total_minutes": int(total_time_min)
+        }
+
+
+# --- Procesele pool-ului od_matrix ---
+
+_od_graph = None
 
-        except nx.NetworkXNoPath:
-            return {"error": "Nu există rută validă."}
+
+def _init_od_worker(db_params, cache_path):
+    """ Fiecare proces citește graful din cache (mmap, motorul CSR) o singură dată, la pornire """
+    global _od_graph
+    graph = TransportGraph(db_params, engine='csr')
+    graph._load_cache(cache_path)
+    graph.is_loaded = True
+    _od_graph = graph
+
+
+def _od_worker_rows(task):
+    period, chunk, paths = task
+    return {o: _od_graph._one_to_many(period, o, targets, paths) for o, targets in chunk}
+
+
+class GraphRebuilder:
+    """
+    Reconstruiește graful în fundal, pe o instanță TransportGraph nouă.
+    Cererile de rutare merg pe graful vechi până când `on_ready(graf_nou)` face schimbul
+    (o simplă atribuire de referință, deci atomică pentru celelalte thread-uri).
+    """
+
+    def __init__(self, factory, on_ready):
+        self.factory = factory  # () -> TransportGraph gol
+        self.on_ready = on_ready
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {'state': 'idle', 'progress': 0, 'message': '', 'started_at': None, 'finished_at': None, 'error': None}
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def start(self):
+        """ Pornește o regenerare; False dacă una e deja în curs """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = {'state': 'running', 'progress': 0, 'message': 'Pornire', 'error': None,
+                            'started_at': datetime.now().isoformat(timespec='seconds'), 'finished_at': None}
+            self._thread = threading.Thread(target=self._run, name='graph-rebuild', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self):
+        try:
+            graph = self.factory()
+            graph.load_data(use_cache=False, progress=lambda pct, message: self._update(progress=pct, message=message))
+            self.on_ready(graph)
+            self._update(state='done', progress=100, message='Graful nou este activ')
+            print("🔁 [Admin] Graf regenerat și activat")
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            self._update(state='failed', error=str(e), message='Regenerare eșuată')
+            print(f"❌ [Admin] Eroare regenerare graf: {e}")
+        finally:
+            self._update(finished_at=datetime.now().isoformat(timespec='seconds'))
@@ -0,0 +1,103 @@
+"""
+Totalurile vânzărilor de bilete, ținute la zi odată cu fiecare cumpărare (tabela sales_rollup).
+
+Fiecare vânzare incrementează trei rânduri (tip bilet x perioadă): ora, ziua și totalul ('all').
+Panoul de admin citește doar rândurile 'all' (câte unul per tip de bilet) și rândurile 'day' ale
+ultimelor zile, în loc să agrege toată tabela tickets la fiecare încărcare.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+TABLE = 'sales_rollup'
+PERIODS = ('hour', 'day', 'all')
+ALL_TIME = datetime(1970, 1, 1)  # bucket-ul unic al perioadei 'all'
+
+# Incrementare atomică (aceeași sintaxă în PostgreSQL și SQLite)
+UPSERT_SQL = f"""
+    INSERT INTO {TABLE} (period, bucket, ticket_type, count, revenue)
+    VALUES (:period, :bucket, :ticket_type, :count, :revenue)
+    ON CONFLICT (period, bucket, ticket_type)
+    DO UPDATE SET count = {TABLE}.count + excluded.count, revenue = {TABLE}.revenue + excluded.revenue
+"""
+
+BACKFILL_CHUNK_ROWS = 10000
+
+
+def buckets(when):
+    """ Începutul orei, al zilei și bucket-ul 'all' pentru momentul vânzării """
+    hour = when.replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0), 'all': ALL_TIME}
+
+
+def record_sale(session, ticket_type, price, when, count=1):
+    """
+    Adaugă o vânzare în sesiunea curentă (se salvează la commit, în aceeași tranzacție cu biletul).
+    Rulează într-un SAVEPOINT: dacă tabela lipsește (ex: /fix_db nerulat după actualizare), eroarea e doar
+    logată și biletul se vinde oricum; totalurile se refac apoi cu `flask backfill-sales`.
+    """
+    try:
+        with session.begin_nested():
+            session.execute(text(UPSERT_SQL), [
+                {'period': period, 'bucket': bucket, 'ticket_type': ticket_type, 'count': count,
+                 'revenue': price * count}
+                for period, bucket in buckets(when).items()
+            ])
+    except SQLAlchemyError as e:
+        print(f"⚠️ {TABLE} indisponibil, vânzarea nu e numărată (rulați flask backfill-sales): "
+              f"{getattr(e, 'orig', None) or e}")
+
+
+def backfill(session, *ticket_models):
+    """
+    Reface tabela din toate biletele existente (după instalare sau dacă totalurile sunt suspecte).
+    `ticket_models`: tabelele cu bilete (tickets și arhiva lor). Biletele se citesc pe bucăți și se
+    agregă în memorie; totul într-o singură tranzacție.
+    Întoarce numărul de bilete numărate.
+    """
+    t0 = time.perf_counter()
+    totals = defaultdict(lambda: [0, 0.0])
+    tickets = 0
+    for model in ticket_models:
+        query = (session.query(model.type, model.price, model.timestamp)
+                 .execution_options(yield_per=BACKFILL_CHUNK_ROWS))
+        for ticket_type, price, when in query:
+            for period, bucket in buckets(when or ALL_TIME).items():
+                entry = totals[(period, bucket, ticket_type)]
+                entry[0] += 1
+                entry[1] += price or 0.0
+            tickets += 1
+
+    session.execute(text(f"DELETE FROM {TABLE}"))
+    rows = [{'period': period, 'bucket': bucket, 'ticket_type': ticket_type, 'count': count, 'revenue': revenue}
+            for (period, bucket, ticket_type), (count, revenue) in totals.items()]
+    for i in range(0, len(rows), BACKFILL_CHUNK_ROWS):
+        session.execute(text(UPSERT_SQL), rows[i:i + BACKFILL_CHUNK_ROWS])
+    session.commit()
+    print(f"   -> 📊 {TABLE}: {tickets} bilete, {len(rows)} rânduri, {time.perf_counter() - t0:.1f} s")
+    return tickets
+
+
+def summary(session, rollup_model):
+    """ (încasări totale, (cel mai vândut tip, număr) sau None, {tip: (număr, încasări)}) """
+    rows = (session.query(rollup_model.ticket_type, rollup_model.count, rollup_model.revenue)
+            .filter(rollup_model.period == 'all').all())
+    by_type = {ticket_type: (count, revenue) for ticket_type, count, revenue in rows}
+    total = sum(revenue for _, revenue in by_type.values())
+    popular = max(((t, c) for t, (c, _) in by_type.items()), key=lambda x: x[1], default=None)
+    return total, popular, by_type
+
+
+def daily(session, rollup_model, days=14, now=None):
+    """ Vânzările pe zi și pe tip pentru ultimele `days` zile: [(zi, {tip: (număr, încasări)})], cele mai noi primele """
+    today = buckets(now or datetime.now())['day']
+    start = today - timedelta(days=days - 1)
+    rows = (session.query(rollup_model.bucket, rollup_model.ticket_type, rollup_model.count, rollup_model.revenue)
+            .filter(rollup_model.period == 'day', rollup_model.bucket >= start).all())
+    series = {start + timedelta(days=i): {} for i in range(days)}
+    for bucket, ticket_type, count, revenue in rows:
+        series.setdefault(bucket, {})[ticket_type] = (count, revenue)
+    return sorted(series.items(), reverse=True)
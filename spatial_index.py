@@ -0,0 +1,194 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Elipsoidul WGS84 (același ca geopy.distance.geodesic)
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+
+# Dincolo de atâtea inele de celule e mai ieftin un calcul vectorizat pe toate stațiile
+MAX_RINGS = 12
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """ Distanța pe sferă în metri; acceptă scalari sau array-uri NumPy (broadcast) """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def local_distance_m(lat1, lon1, lat2, lon2):
+    """
+    Distanța pe elipsoidul WGS84 pentru puncte apropiate (sub câțiva km), vectorizată.
+    Folosește razele de curbură la latitudinea medie; diferă de geodesic cu câțiva cm.
+    """
+    phi = np.radians((np.asarray(lat1) + np.asarray(lat2)) / 2)
+    w = 1 - WGS84_E2 * np.sin(phi) ** 2
+    meridian = WGS84_A * (1 - WGS84_E2) / w ** 1.5
+    normal = WGS84_A / np.sqrt(w)
+    dy = meridian * np.radians(np.asarray(lat2) - np.asarray(lat1))
+    dx = normal * np.cos(phi) * np.radians(np.asarray(lon2) - np.asarray(lon1))
+    return np.hypot(dx, dy)
+
+
+def project(lats, lons):
+    """ Factorii (kx, ky) ai proiecției echirectangulare centrate pe latitudinea medie (grade -> metri) """
+    lat0 = float(np.mean(lats)) if len(lats) else 0.0
+    ky = EARTH_RADIUS_M * math.pi / 180
+    return ky * math.cos(math.radians(lat0)), ky
+
+
+def pairs_within(lats, lons, meters):
+    """
+    Toate perechile (i, j), i < j, de puncte aflate la mai puțin de `meters` metri.
+    Punctele se grupează pe o grilă cu latura `meters`, deci fiecare celulă se compară doar
+    cu ea însăși și cu 4 vecine (jumătate din vecinătate, ca fiecare pereche să apară o dată).
+    Întoarce trei array-uri: i, j și distanța în metri (local_distance_m).
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    kx, ky = project(lats, lons)
+    cell = meters * 1.01  # marjă pentru diferența proiecție / elipsoid
+    cx = np.floor(lons * kx / cell).astype(np.int64)
+    cy = np.floor(lats * ky / cell).astype(np.int64)
+
+    order = np.argsort(cx * (1 << 32) + cy, kind='stable')
+    cells = {}
+    for k in order.tolist():
+        cells.setdefault((int(cx[k]), int(cy[k])), []).append(k)
+    cells = {c: np.array(members) for c, members in cells.items()}
+
+    out_i, out_j, out_d = [], [], []
+    for (x, y), block in cells.items():
+        for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            other = cells.get((x + dx, y + dy))
+            if other is None: continue
+            d = local_distance_m(lats[block][:, None], lons[block][:, None], lats[other][None, :], lons[other][None, :])
+            mask = d < meters
+            if dx == 0 and dy == 0:
+                mask &= np.triu(np.ones_like(mask), k=1)
+            ii, jj = np.nonzero(mask)
+            out_i.append(block[ii])
+            out_j.append(other[jj])
+            out_d.append(d[ii, jj])
+
+    if not out_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    i, j, d = np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_d)
+    return np.minimum(i, j), np.maximum(i, j), d
+
+
+class SpatialIndex:
+    """
+    Index pe grilă pentru stații, în coordonate proiectate (metri, proiecție echirectangulară
+    centrată pe rețea). Stațiile sunt sortate pe celule; `cell_keys`/`cell_ptr` dau intervalul
+    fiecărei celule în `order`, deci tot indexul stă în câteva array-uri plate.
+    """
+
+    def __init__(self, stop_ids, lats, lons, cell_m=250.0, order=None, cell_keys=None, cell_ptr=None):
+        self.stop_ids = list(stop_ids)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_m = float(cell_m)
+
+        self.kx, self.ky = project(self.lats, self.lons)
+        self.xs = self.lons * self.kx
+        self.ys = self.lats * self.ky
+
+        if order is None:
+            order, cell_keys, cell_ptr = self._build_cells()
+        self.order, self.cell_keys, self.cell_ptr = order, cell_keys, cell_ptr
+
+        self._cells = {}
+        for k in range(len(self.cell_keys)):
+            start, end = int(self.cell_ptr[k]), int(self.cell_ptr[k + 1])
+            first = self.order[start]
+            self._cells[self._cell_of(self.xs[first], self.ys[first])] = (start, end)
+        if self._cells:
+            cx, cy = zip(*self._cells)
+            self._bounds = (min(cx), max(cx), min(cy), max(cy))
+
+    @classmethod
+    def from_stops(cls, stops, cell_m=250.0):
+        ids = list(stops.keys())
+        return cls(ids, [stops[s]['lat'] for s in ids], [stops[s]['lon'] for s in ids], cell_m=cell_m)
+
+    def _cell_of(self, x, y):
+        return int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+
+    def _build_cells(self):
+        cx = np.floor(self.xs / self.cell_m).astype(np.int64)
+        cy = np.floor(self.ys / self.cell_m).astype(np.int64)
+        # cheie unică pe celulă, doar pentru sortare
+        keys = cx * (1 << 32) + cy
+        order = np.argsort(keys, kind='stable')
+        cell_keys, starts = np.unique(keys[order], return_index=True)
+        cell_ptr = np.append(starts, len(order)).astype(np.int64)
+        return order.astype(np.int32), cell_keys, cell_ptr
+
+    def _ring(self, cx, cy, r):
+        """ Indicii stațiilor din celulele aflate exact la distanța r (în celule) de (cx, cy) """
+        if r == 0:
+            cells = [(cx, cy)]
+        else:
+            cells = [(cx + dx, cy - r) for dx in range(-r, r + 1)] + [(cx + dx, cy + r) for dx in range(-r, r + 1)]
+            cells += [(cx - r, cy + dy) for dy in range(-r + 1, r)] + [(cx + r, cy + dy) for dy in range(-r + 1, r)]
+        spans = [self._cells[c] for c in cells if c in self._cells]
+        if not spans:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self.order[a:b] for a, b in spans])
+
+    def _max_ring(self, cx, cy):
+        min_cx, max_cx, min_cy, max_cy = self._bounds
+        return max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy)
+
+    def _distances(self, idx, lat, lon):
+        return haversine_m(lat, lon, self.lats[idx], self.lons[idx])
+
+    def _result(self, idx, dists, k=None):
+        if k is not None and k < len(dists):
+            part = np.argpartition(dists, k - 1)[:k]
+            idx, dists = idx[part], dists[part]
+        rank = np.argsort(dists, kind='stable')
+        return [(self.stop_ids[idx[i]], float(dists[i])) for i in rank]
+
+    def k_nearest(self, lat, lon, k):
+        """ Cele mai apropiate k stații, ca listă de (stop_id, metri) crescător după distanță """
+        if not self._cells or k <= 0:
+            return []
+        cx, cy = self._cell_of(lon * self.kx, lat * self.ky)
+
+        found = []
+        for r in range(min(self._max_ring(cx, cy), MAX_RINGS) + 1):
+            found.append(self._ring(cx, cy, r))
+            idx = np.concatenate(found)
+            # orice stație din afara inelelor parcurse e la cel puțin r celule distanță
+            if len(idx) >= k:
+                dists = self._distances(idx, lat, lon)
+                if np.partition(dists, k - 1)[k - 1] <= r * self.cell_m:
+                    return self._result(idx, dists, k)
+
+        # zonă fără stații în jur (sau k mare): calcul direct pe toate stațiile
+        idx = np.arange(len(self.stop_ids))
+        return self._result(idx, self._distances(idx, lat, lon), k)
+
+    def nearest(self, lat, lon):
+        """ Cea mai apropiată stație: (stop_id, metri) sau (None, inf) dacă indexul e gol """
+        res = self.k_nearest(lat, lon, 1)
+        return res[0] if res else (None, float('inf'))
+
+    def within_radius(self, lat, lon, meters):
+        """ Toate stațiile pe o rază dată, ca listă de (stop_id, metri) crescător după distanță """
+        if not self._cells:
+            return []
+        cx, cy = self._cell_of(lon * self.kx, lat * self.ky)
+        rings = min(int(math.ceil(meters / self.cell_m)), self._max_ring(cx, cy))
+        if rings > MAX_RINGS:
+            idx = np.arange(len(self.stop_ids))
+        else:
+            idx = np.concatenate([self._ring(cx, cy, r) for r in range(rings + 1)])
+        dists = self._distances(idx, lat, lon)
+        keep = dists <= meters
+        return self._result(idx[keep], dists[keep])
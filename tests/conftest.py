@@ -0,0 +1,134 @@
+"""
+Fixture-uri comune: un feed GTFS sintetic (SQLite) și grafurile construite din el, pentru ambele motoare.
+Testele rulează din rădăcina proiectului: python -m pytest -q
+"""
+import os
+import random
+import sqlite3
+import sys
+
+import networkx as nx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing_engine
+from csr_graph import NoPath
+
+GRID = 12            # GRID x GRID stații, la ~300 m una de alta (transferurile pe jos se leagă între vecini)
+STOPS_PER_LINE = 14
+HEADWAY_MIN = 20
+PAIRS = 40
+
+
+def _clock(seconds):
+    hh, rem = divmod(seconds, 3600)
+    mm, ss = divmod(rem, 60)
+    return f"{hh:02d}:{mm:02d}:{ss:02d}"
+
+
+def make_gtfs(path, n_lines=12, seed=1):
+    """
+    Feed sintetic: stații pe o grilă, linii de zi (05-24), de noapte (N...), metrou (M...) și 783,
+    curse din HEADWAY_MIN în HEADWAY_MIN minute în ambele sensuri. Cursele de seară trec de 24:00
+    (ore GTFS de tipul 24:10:00), ca în feed-urile reale.
+    """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE stops (stop_id TEXT, stop_name TEXT, stop_lat REAL, stop_lon REAL);
+        CREATE TABLE routes (route_id TEXT, route_short_name TEXT, route_long_name TEXT);
+        CREATE TABLE trips (trip_id TEXT, route_id TEXT, trip_headsign TEXT, service_id TEXT);
+        CREATE TABLE stop_times (trip_id TEXT, stop_id TEXT, stop_sequence INTEGER,
+                                 arrival_time TEXT, departure_time TEXT);
+    """)
+    stops = [(str(i * GRID + j), f"Statia {i}-{j}",
+              44.40 + i * 0.0027 + rnd.uniform(-0.0003, 0.0003),
+              26.05 + j * 0.0038 + rnd.uniform(-0.0003, 0.0003))
+             for i in range(GRID) for j in range(GRID)]
+    conn.executemany("INSERT INTO stops VALUES (?, ?, ?, ?)", stops)
+
+    names = [str(100 + k) for k in range(n_lines)] + ['M1', 'N101', 'N102', 'N103', 'N104', '783']
+    trip_id = 0
+    for k, name in enumerate(names):
+        conn.execute("INSERT INTO routes VALUES (?, ?, ?)", (f"r{k}", name, f"Linia {name}"))
+        i, j = rnd.randrange(GRID), rnd.randrange(GRID)
+        seq = []
+        while len(seq) < STOPS_PER_LINE:
+            if i * GRID + j not in seq:
+                seq.append(i * GRID + j)
+            if rnd.random() < 0.5:
+                i = min(GRID - 1, max(0, i + rnd.choice((-1, 1))))
+            else:
+                j = min(GRID - 1, max(0, j + rnd.choice((-1, 1))))
+        hop = 150 if name.startswith('M') else 240
+        hours = range(0, 24) if name.startswith('N') or name == '783' else range(5, 24)
+        for direction in (seq, seq[::-1]):
+            for h in hours:
+                for m in range(0, 60, HEADWAY_MIN):
+                    trip = f"t{trip_id}"
+                    trip_id += 1
+                    conn.execute("INSERT INTO trips VALUES (?, ?, ?, ?)", (trip, f"r{k}", f"Spre {direction[-1]}", 'LV'))
+                    t = h * 3600 + m * 60
+                    conn.executemany("INSERT INTO stop_times VALUES (?, ?, ?, ?, ?)",
+                                     [(trip, str(stop), q + 1, _clock(t + q * hop), _clock(t + q * hop))
+                                      for q, stop in enumerate(direction)])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope='session')
+def gtfs_db(tmp_path_factory):
+    path = tmp_path_factory.mktemp('gtfs') / 'gtfs.sqlite3'
+    make_gtfs(str(path))
+    return path
+
+
+@pytest.fixture(scope='session')
+def load_graph(gtfs_db, tmp_path_factory):
+    """ load_graph(engine, algorithm='dijkstra') -> TransportGraph încărcat din feed-ul sintetic (fără cache comun) """
+    def load(engine, algorithm='dijkstra'):
+        graph = routing_engine.TransportGraph({'user': 'test', 'password': '', 'host': 'localhost', 'dbname': 'gtfs'},
+                                              engine=engine, algorithm=algorithm)
+        graph.db_url = f"sqlite:///{gtfs_db}"
+        graph.cache_prefix = str(tmp_path_factory.mktemp('cache') / 'graph')
+        graph.load_data(use_cache=False)
+        return graph
+    return load
+
+
+@pytest.fixture(scope='session')
+def csr_graph(load_graph):
+    graph = load_graph('csr')
+    yield graph
+    graph.retire()
+
+
+@pytest.fixture(scope='session')
+def nx_graph(load_graph):
+    graph = load_graph('networkx')
+    yield graph
+    graph.retire()
+
+
+@pytest.fixture(scope='session')
+def stop_pairs(csr_graph):
+    """ Perechi (plecare, destinație) de stații, aceleași la fiecare rulare """
+    rnd = random.Random(7)
+    stops = sorted(csr_graph.stops)
+    return [tuple(rnd.sample(stops, 2)) for _ in range(PAIRS)]
+
+
+def path_cost(edges):
+    return sum(data['weight'] for _, _, data in edges)
+
+
+@pytest.fixture(scope='session')
+def shortest_cost():
+    """ shortest_cost(graph, perioadă, s, e, algoritm='dijkstra') -> costul drumului sau None dacă nu există """
+    def cost(graph, period, s_node, e_node, algorithm='dijkstra'):
+        try:
+            return path_cost(graph._shortest_path(period, s_node, e_node, algorithm))
+        except (NoPath, nx.NetworkXNoPath):
+            return None
+    return cost
@@ -0,0 +1,29 @@
+"""
+TTLCache: ordinea LRU la depășirea capacității și expirarea intrărilor.
+"""
+import caching
+from caching import MISSING, TTLCache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' devine cea folosită cel mai demult
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    now[0] += 59
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert cache.get('a', None) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
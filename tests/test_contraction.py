@@ -0,0 +1,20 @@
+"""
+Ierarhiile de contracție (algorithm='ch') trebuie să dea același cost ca Dijkstra pe graful necontractat.
+"""
+import pytest
+
+from routing_engine import SERVICE_PERIODS
+
+
+@pytest.mark.parametrize('engine', ['csr', 'networkx'])
+@pytest.mark.parametrize('period', sorted(SERVICE_PERIODS))
+def test_ch_matches_dijkstra(csr_graph, nx_graph, stop_pairs, shortest_cost, engine, period):
+    graph = csr_graph if engine == 'csr' else nx_graph
+    assert graph.ensure_hierarchies() is not None
+    for s_node, e_node in stop_pairs:
+        expected = shortest_cost(graph, period, s_node, e_node)
+        actual = shortest_cost(graph, period, s_node, e_node, 'ch')
+        if expected is None:
+            assert actual is None, (s_node, e_node)
+        else:
+            assert actual == pytest.approx(expected), (s_node, e_node)
@@ -0,0 +1,142 @@
+"""
+Outbox-ul de emailuri cu un server SMTP local (aiosmtpd) în locul celui real: un lot pleacă pe o singură
+conexiune, adresele respinse / invalide ajung 'dead', iar cu serverul căzut mesajele rămân în așteptare.
+"""
+import socket
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+controller_module = pytest.importorskip('aiosmtpd.controller')
+
+import email_outbox
+import email_service
+
+TICKET = {'type': 'Abonament 24h', 'price': 8.0, 'expiry': '2026-10-19 12:00', 'id': 42}
+
+
+class Recorder:
+    """ Handler aiosmtpd: ține mesajele primite și numărul de sesiuni; refuză destinatarii rejected@... """
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        self.sessions += 1
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('rejected@'):
+            return '550 5.1.1 Destinatar inexistent'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return '250 Mesaj acceptat'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    recorder = Recorder()
+    controller = controller_module.Controller(recorder, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller.port, recorder
+    controller.stop()
+
+
+@pytest.fixture(scope='module')
+def flask_app(tmp_path_factory):
+    """ app.py pe o bază SQLite temporară; configurația vine din mediu, deci se setează înainte de import """
+    if 'app' in sys.modules:
+        pytest.skip("app.py e deja importat cu altă configurație")
+    workdir = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f"sqlite:///{workdir / 'app.sqlite3'}")
+        mp.setenv('JOBS_DB', str(workdir / 'jobs.sqlite3'))
+        mp.setenv('GEOCODE_CACHE', str(workdir / 'geocode.sqlite3'))
+        import app as web
+    with web.app.app_context():
+        web.create_tables()
+    return web
+
+
+@pytest.fixture
+def outbox(flask_app):
+    web = flask_app
+    with web.app.app_context():
+        web.EmailOutbox.query.delete()
+        web.db.session.commit()
+    return web
+
+
+def make_worker(web, port):
+    mailer = lambda: email_service.SMTPMailer(server='127.0.0.1', port=port, security='none',
+                                              sender='bilete@example.com', password='')
+    return email_outbox.OutboxWorker(web.app, web.db, web.EmailOutbox, mailer_factory=mailer)
+
+
+def enqueue(web, worker, addresses):
+    with web.app.app_context():
+        for address in addresses:
+            worker.enqueue(address, 'ticket', TICKET)
+        web.db.session.commit()
+
+
+def statuses(web):
+    with web.app.app_context():
+        return {row.to_email: (row.status, row.attempts) for row in web.EmailOutbox.query.all()}
+
+
+def test_batch_sent_on_one_connection(outbox, smtp_server):
+    port, recorder = smtp_server
+    worker = make_worker(outbox, port)
+    good = [f"client{i}@example.com" for i in range(3)]
+    injected = "client@example.com\r\nBcc: victima@example.com"
+    enqueue(outbox, worker, good + ['rejected@example.com', injected])
+
+    assert worker.drain_once() == 5
+    worker._close_mailer()
+
+    assert [rcpt for rcpt, _ in recorder.messages] == [[address] for address in good]
+    assert recorder.sessions == 1
+    assert all(b'Bcc:' not in content for _, content in recorder.messages)
+    result = statuses(outbox)
+    assert all(result[address] == ('sent', 1) for address in good)
+    assert result['rejected@example.com'] == ('dead', 1)
+    assert result[injected] == ('dead', 1)
+    assert worker.stats() == {'sent': 3, 'dead': 2}
+
+
+def test_server_down_keeps_messages_pending(outbox, smtp_server):
+    port, recorder = smtp_server
+    worker = make_worker(outbox, free_port())  # niciun server pe acest port
+    addresses = [f"client{i}@example.com" for i in range(3)]
+    enqueue(outbox, worker, addresses)
+
+    before = datetime.now()
+    assert worker.drain_once() == 0
+    result = statuses(outbox)
+    # doar primul mesaj consumă o încercare; restul lotului e amânat la fel
+    assert [result[address] for address in addresses] == [('pending', 1), ('pending', 0), ('pending', 0)]
+    with outbox.app.app_context():
+        rows = outbox.EmailOutbox.query.all()
+        assert all(row.next_attempt_at > before for row in rows)
+        # serverul revine: reîncercările devin scadente
+        for row in rows:
+            row.next_attempt_at = datetime.now() - timedelta(seconds=1)
+        outbox.db.session.commit()
+
+    worker = make_worker(outbox, port)
+    assert worker.drain_once() == 3
+    worker._close_mailer()
+    assert len(recorder.messages) == 3 and recorder.sessions == 1
+    assert statuses(outbox)['client0@example.com'] == ('sent', 2)
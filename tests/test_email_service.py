@@ -0,0 +1,33 @@
+"""
+Emailurile randate din șabloane: sursa MIME trebuie să folosească doar CRLF și să nu permită antete injectate.
+"""
+import re
+from email import message_from_bytes, policy
+
+import pytest
+
+from email_service import PermanentEmailError, build_ticket_email
+
+TICKET = {'type': 'Abonament 72h', 'price': 20.0, 'expiry': '2026-10-21 12:00', 'id': 7}
+
+
+def test_long_subject_folded_with_crlf():
+    ticket = dict(TICKET, type='Abonament metropolitan lunar valabil pe toate liniile ' * 3)
+    msg = build_ticket_email('Ion Popescu <ion@example.com>', ticket)
+    assert re.search(rb'(?<!\r)\n', msg.raw) is None
+    parsed = message_from_bytes(msg.raw, policy=policy.SMTP)
+    assert not parsed.defects
+    assert parsed['Subject'] == f"✅ Biletul tău este activ: {ticket['type']}"
+    assert msg.to == 'ion@example.com'
+
+
+@pytest.mark.parametrize('address', ['ion@example.com\r\nBcc: altcineva@example.com', 'ionuț@example.com', ''])
+def test_unusable_recipient_rejected(address):
+    with pytest.raises(PermanentEmailError):
+        build_ticket_email(address, TICKET)
+
+
+def test_international_domain_encoded():
+    msg = build_ticket_email('Ștefan <stefan@bucurești.ro>', TICKET)
+    assert msg.to == 'stefan@' + 'bucurești.ro'.encode('idna').decode('ascii')
+    assert msg.raw.isascii()
@@ -0,0 +1,36 @@
+"""
+Echivalența motoarelor: CSR și networkx trebuie să dea același cost minim pe același feed.
+"""
+import pytest
+
+from routing_engine import DEFAULT_PERIOD, SERVICE_PERIODS
+
+
+def uses_transit(edges):
+    return any(data.get('type') != 'walking' for _, _, data in edges)
+
+
+@pytest.mark.parametrize('period', sorted(SERVICE_PERIODS))
+def test_csr_matches_networkx(csr_graph, nx_graph, stop_pairs, shortest_cost, period):
+    transit = 0
+    for s_node, e_node in stop_pairs:
+        expected = shortest_cost(nx_graph, period, s_node, e_node)
+        actual = shortest_cost(csr_graph, period, s_node, e_node)
+        if expected is None:
+            assert actual is None, (s_node, e_node)
+            continue
+        assert actual == pytest.approx(expected), (s_node, e_node)
+        transit += uses_transit(csr_graph._shortest_path(period, s_node, e_node))
+    # noaptea sunt puține linii și urcarea costă BUS_PENALTY: drumurile scurte pot fi doar pe jos
+    assert transit or period != DEFAULT_PERIOD, "o parte din rute ar trebui să folosească liniile"
+
+
+def test_find_route_same_duration_on_both_engines(csr_graph, nx_graph, stop_pairs):
+    for s_node, e_node in stop_pairs[:10]:
+        start = (csr_graph.stops[s_node]['lat'], csr_graph.stops[s_node]['lon'])
+        end = (csr_graph.stops[e_node]['lat'], csr_graph.stops[e_node]['lon'])
+        expected = nx_graph.find_route(start, end, "12:00")
+        actual = csr_graph.find_route(start, end, "12:00")
+        assert ('error' in actual) == ('error' in expected)
+        if 'error' not in expected:
+            assert actual['total_minutes'] == expected['total_minutes']
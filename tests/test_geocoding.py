@@ -0,0 +1,24 @@
+"""
+Gazetarul offline: nume de stații da, adrese de stradă nu.
+"""
+import pytest
+
+from geocoding import Gazetteer
+
+
+@pytest.fixture(scope='module')
+def gazetteer(csr_graph):
+    stops = {'u': {'name': 'Piața Unirii', 'lat': 44.4268, 'lon': 26.1025},
+             'v': {'name': 'Victoriei', 'lat': 44.4525, 'lon': 26.0860}}
+    return Gazetteer.from_stops(stops, csr_graph._clean_name)
+
+
+@pytest.mark.parametrize('query', ['Piața Unirii', 'Piata Unirii, Bucuresti', 'Victoriei'])
+def test_stop_names_resolve(gazetteer, query):
+    assert gazetteer.lookup(query).source == 'gazetteer'
+
+
+@pytest.mark.parametrize('query', ['Strada Victoriei 12', 'Str. Victoriei', 'Bulevardul Unirii',
+                                   'Bd. Unirii, Bucuresti', 'Victoriei 12', 'Victoriei nr. 5'])
+def test_street_addresses_skip_gazetteer(gazetteer, query):
+    assert gazetteer.lookup(query) is None
@@ -0,0 +1,30 @@
+"""
+Fluxul live (SSE): limita de abonați per proces.
+"""
+import pytest
+
+import live_feed
+
+
+def make_broadcaster(max_subscribers):
+    vehicles = lambda route, t: [{'id': 't1', 'lat': 44.4, 'lon': 26.1}]
+    return live_feed.LiveBroadcaster(vehicles, clock=lambda: 0, max_subscribers=max_subscribers)
+
+
+def test_subscribers_capped():
+    broadcaster = make_broadcaster(2)
+    broadcaster._start = lambda: None  # fără thread de fundal
+    first = broadcaster.subscribe('133')
+    broadcaster.subscribe('M2')
+    with pytest.raises(live_feed.TooManySubscribers):
+        broadcaster.subscribe('336')
+    assert '336' not in broadcaster._feeds  # linia refuzată nu rămâne urmărită
+    broadcaster.unsubscribe(first)
+    broadcaster.subscribe('336')
+
+
+def test_zero_means_polling_only():
+    broadcaster = make_broadcaster(0)
+    with pytest.raises(live_feed.TooManySubscribers):
+        broadcaster.subscribe('133')
+    assert not broadcaster._feeds
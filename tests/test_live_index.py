@@ -0,0 +1,66 @@
+"""
+Harta live: interpolarea pozițiilor peste 24:00 și echivalența căutării pe toată rețeaua cu cea pe linii.
+"""
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from live_index import LiveIndex
+from timetable import DAY
+
+
+def segments(*rows):
+    """ (linie, start, end, stație1, stație2, cursă) -> coloanele pentru LiveIndex.from_segments """
+    route, start, end, stop1, stop2, trip = (np.array(col, dtype=np.int32) for col in zip(*rows))
+    return route, start, end, stop1, stop2, np.zeros(len(route), dtype=np.int32), trip
+
+
+@pytest.fixture
+def night_index():
+    # cursa 7 a liniei N1: stația 0 la 24:00, stația 1 la 24:10 (în ziua de serviciu anterioară)
+    return LiveIndex.from_segments(['N1'], ['Spre B'], np.array([44.40, 44.50]), np.array([26.00, 26.10]),
+                                   *segments((0, DAY, DAY + 600, 0, 1, 7)))
+
+
+def test_interpolation_past_midnight(night_index):
+    # la 00:05 cursa de ieri e la jumătatea segmentului
+    vehicles = night_index.vehicles('N1', 300)
+    assert len(vehicles) == 1
+    assert vehicles[0]['id'] == 7
+    assert vehicles[0]['lat'] == pytest.approx(44.45)
+    assert vehicles[0]['lon'] == pytest.approx(26.05)
+    # aceeași poziție cu ora scrisă ca în GTFS (24:05)
+    assert night_index.vehicles('N1', DAY + 300) == vehicles
+
+
+def test_no_vehicle_outside_segment(night_index):
+    assert night_index.vehicles('N1', 700) == []
+    assert night_index.vehicles('N1', DAY - 60) == []
+    assert night_index.vehicles('N2', 300) == []
+
+
+def test_network_query_past_midnight(night_index):
+    result = night_index.query(300)
+    assert result['count'] == 1
+    assert result['routes'] == ['N1']
+    assert result['lat'] == [pytest.approx(44.45)]
+
+
+@pytest.fixture(scope='module')
+def live_index(gtfs_db):
+    engine = create_engine(f"sqlite:///{gtfs_db}")
+    with engine.connect() as conn:
+        return LiveIndex.load(conn)
+
+
+@pytest.mark.parametrize('clock', ['00:10', '05:30', '12:00', '23:55'])
+def test_query_matches_vehicles_per_route(live_index, clock):
+    hh, mm = map(int, clock.split(':'))
+    t = hh * 3600 + mm * 60
+    result = live_index.query(t)
+    from_query = sorted((result['routes'][r], trip, round(lat, 6), round(lon, 6))
+                        for r, trip, lat, lon in zip(result['route'], result['id'], result['lat'], result['lon']))
+    per_route = sorted((route, v['id'], round(v['lat'], 6), round(v['lon'], 6))
+                       for route in live_index.routes for v in live_index.vehicles(route, t))
+    assert from_query == per_route
+    assert result['count'] == len(per_route) > 0
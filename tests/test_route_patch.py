@@ -0,0 +1,59 @@
+"""
+Modificarea unei rute din admin: stratul liniei se înlocuiește pe loc, iar jurnalul cache-ului primește
+amprenta datelor de după modificare fără să recitească stop_times.
+"""
+import shutil
+import sqlite3
+
+import pytest
+
+import graph_cache
+import routing_engine
+import trip_segments
+
+
+@pytest.fixture
+def patched_db(gtfs_db, tmp_path):
+    path = tmp_path / 'gtfs.sqlite3'
+    shutil.copy(gtfs_db, path)
+    return path
+
+
+def load(db_path, prefix):
+    graph = routing_engine.TransportGraph({'user': 'test', 'password': '', 'host': 'localhost', 'dbname': 'gtfs'},
+                                          engine='csr')
+    graph.db_url = f"sqlite:///{db_path}"
+    graph.cache_prefix = str(prefix)
+    graph.load_data()
+    return graph
+
+
+def test_route_edit_journaled_with_cheap_fingerprint(patched_db, tmp_path, monkeypatch):
+    graph = load(patched_db, tmp_path / 'graph')
+    assert '100' in graph.csr.lines
+
+    with sqlite3.connect(patched_db) as conn:
+        conn.execute("UPDATE routes SET route_short_name = '999' WHERE route_short_name = '100'")
+
+    scans = []
+    original = trip_segments.content_checksum
+    monkeypatch.setattr(trip_segments, 'content_checksum',
+                        lambda *args: scans.append(args) or original(*args))
+    graph.refresh_route_layers('100', '999')
+    assert scans == []  # stop_times / trips nu se recitesc la o editare din admin
+    monkeypatch.undo()
+
+    assert '999' in graph.csr.lines
+    deltas = graph_cache.read_deltas(graph._cache_path)
+    assert len(deltas) == 1
+    # aceeași amprentă ca la o pornire nouă pe datele modificate: jurnalul se reaplică, fără reconstrucție
+    assert deltas[0]['fingerprint'] == graph.fingerprint == graph._data_fingerprint()[0]
+
+    reloaded = load(patched_db, tmp_path / 'graph')
+    assert reloaded._cache_path == graph._cache_path
+    assert reloaded.csr.line_segments('999') == graph.csr.line_segments('999') != []
+    assert reloaded.csr.line_segments('100') == []
+    for s_node, e_node in [('0', '143'), ('12', '100'), ('77', '5')]:
+        expected = graph._shortest_path('day', s_node, e_node)
+        actual = reloaded._shortest_path('day', s_node, e_node)
+        assert sum(d['weight'] for *_, d in actual) == pytest.approx(sum(d['weight'] for *_, d in expected))
@@ -0,0 +1,29 @@
+"""
+A* și căutarea bidirecțională trebuie să dea același cost ca Dijkstra, pe ambele motoare.
+"""
+import pytest
+
+from routing_engine import SERVICE_PERIODS
+
+
+@pytest.mark.parametrize('algorithm', ['astar', 'bidirectional'])
+@pytest.mark.parametrize('period', sorted(SERVICE_PERIODS))
+def test_csr_search_matches_dijkstra(csr_graph, stop_pairs, shortest_cost, algorithm, period):
+    for s_node, e_node in stop_pairs:
+        expected = shortest_cost(csr_graph, period, s_node, e_node)
+        actual = shortest_cost(csr_graph, period, s_node, e_node, algorithm)
+        if expected is None:
+            assert actual is None, (s_node, e_node)
+        else:
+            assert actual == pytest.approx(expected), (s_node, e_node)
+
+
+@pytest.mark.parametrize('algorithm', ['astar', 'bidirectional'])
+def test_networkx_search_matches_dijkstra(nx_graph, stop_pairs, shortest_cost, algorithm):
+    for s_node, e_node in stop_pairs[:10]:
+        expected = shortest_cost(nx_graph, 'day', s_node, e_node)
+        actual = shortest_cost(nx_graph, 'day', s_node, e_node, algorithm)
+        if expected is None:
+            assert actual is None, (s_node, e_node)
+        else:
+            assert actual == pytest.approx(expected), (s_node, e_node)
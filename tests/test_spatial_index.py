@@ -0,0 +1,49 @@
+"""
+Indexul spațial și perechile apropiate (transferurile pe jos) trebuie să dea același rezultat ca un calcul direct pe toate stațiile.
+"""
+import numpy as np
+import pytest
+
+from spatial_index import SpatialIndex, haversine_m, local_distance_m, pairs_within
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = np.random.default_rng(3)
+    lats = 44.40 + rng.uniform(0, 0.05, 400)
+    lons = 26.05 + rng.uniform(0, 0.07, 400)
+    return lats, lons
+
+
+@pytest.fixture(scope='module')
+def index(points):
+    lats, lons = points
+    return SpatialIndex([str(i) for i in range(len(lats))], lats, lons)
+
+
+@pytest.mark.parametrize('k', [1, 5])
+def test_k_nearest_matches_brute_force(index, points, k):
+    lats, lons = points
+    rng = np.random.default_rng(4)
+    # inclusiv puncte din afara zonei stațiilor
+    for lat, lon in zip(44.38 + rng.uniform(0, 0.09, 50), 26.03 + rng.uniform(0, 0.11, 50)):
+        expected = np.sort(haversine_m(lat, lon, lats, lons))[:k]
+        found = index.k_nearest(lat, lon, k)
+        assert [d for _, d in found] == pytest.approx(expected.tolist())
+    assert index.nearest(lats[17], lons[17]) == ('17', pytest.approx(0.0))
+
+
+def test_within_radius_matches_brute_force(index, points):
+    lats, lons = points
+    d = haversine_m(lats[0], lons[0], lats, lons)
+    found = index.within_radius(lats[0], lons[0], 600)
+    assert sorted(int(s) for s, _ in found) == np.nonzero(d <= 600)[0].tolist()
+
+
+def test_pairs_within_matches_brute_force(points):
+    lats, lons = points
+    i, j, d = pairs_within(lats, lons, 450)
+    dist = local_distance_m(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+    ei, ej = np.nonzero(np.triu(dist < 450, k=1))
+    assert sorted(zip(i.tolist(), j.tolist())) == sorted(zip(ei.tolist(), ej.tolist()))
+    assert d == pytest.approx(dist[i, j])
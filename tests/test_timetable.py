@@ -0,0 +1,113 @@
+"""
+Orarul (CSA) lângă miezul nopții: cursele cu ore GTFS peste 24:00 și cele de dimineață din ziua următoare,
+cu și fără calendar.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from timetable import NoConnection, ServiceCalendar, Timetable, time_to_seconds
+
+A, B, C, D = range(4)
+FRIDAY, SATURDAY, SUNDAY = date(2026, 10, 16), date(2026, 10, 17), date(2026, 10, 18)
+
+
+def hms(value):
+    return int(time_to_seconds([value])[0])
+
+
+@pytest.fixture
+def timetable():
+    """
+    Cursa 0 (serviciul FRI): A 23:50 -> B 24:10 -> C 24:30, adică trece de miezul nopții.
+    Cursa 1 (serviciul DAILY): C 00:40 -> D 01:00, dimineața devreme.
+    """
+    conns = [  # (din, în, plecare, sosire, cursă, linie, serviciu)
+        (A, B, '23:50:00', '24:10:00', 0, 0, 0),
+        (B, C, '24:10:00', '24:30:00', 0, 0, 0),
+        (C, D, '00:40:00', '01:00:00', 1, 1, 1),
+    ]
+    dep_stop, arr_stop, dep, arr, trip, line, service = zip(*conns)
+    return Timetable.from_connections(
+        ['A', 'B', 'C', 'D'], ['N1', 'N2'], ['FRI', 'DAILY'],
+        dep_stop, arr_stop, [hms(t) for t in dep], [hms(t) for t in arr], trip, line, service,
+        [], [], [], [],
+    )
+
+
+@pytest.fixture
+def calendar():
+    week = {day: 0 for day in ServiceCalendar.WEEKDAYS}
+    weekly = pd.DataFrame([
+        {'service_id': 'FRI', 'start_date': '20260101', 'end_date': '20261231', **week, 'friday': 1},
+        {'service_id': 'DAILY', 'start_date': '20260101', 'end_date': '20261231', **{d: 1 for d in week}},
+    ])
+    return ServiceCalendar.from_frames(weekly)
+
+
+def arrival(tt, legs):
+    kind, conns = legs[-1]
+    assert kind == 'ride'
+    return int(tt.arr_time[conns[-1]])
+
+
+def test_time_to_seconds_past_midnight():
+    assert time_to_seconds(['24:10:00', '25:10:00', '07:05:03']).tolist() == [87000, 90600, 25503]
+
+
+def test_trip_from_previous_day_after_midnight(timetable):
+    # la 00:05 cursa 0 e încă pe drum (24:10 la B): copia de -24 h pleacă din B la 00:10
+    legs = timetable.earliest_arrival(B, C, hms('00:05:00'))
+    assert arrival(timetable, legs) == hms('00:30:00')
+
+
+def test_early_trip_of_next_day_before_midnight(timetable):
+    # de la 23:45: cursa 0 până la C (24:30), apoi cursa 1 a zilei următoare (copia de +24 h, 24:40 -> 25:00)
+    legs = timetable.earliest_arrival(A, D, hms('23:45:00'))
+    assert [kind for kind, _ in legs] == ['ride', 'ride']
+    assert arrival(timetable, legs) == hms('25:00:00')
+
+
+def test_trip_already_gone_is_not_found(timetable):
+    with pytest.raises(NoConnection):
+        timetable.earliest_arrival(B, C, hms('00:15:00'))
+
+
+def test_calendar_uses_previous_day_service_after_midnight(timetable, calendar):
+    # sâmbătă la 00:05 circulă încă cursa de vineri seara
+    active = timetable.active_mask(calendar, SATURDAY)
+    legs = timetable.earliest_arrival(B, C, hms('00:05:00'), active)
+    assert arrival(timetable, legs) == hms('00:30:00')
+    # duminică la 00:05 nu: sâmbătă seara cursa 0 nu circulă
+    with pytest.raises(NoConnection):
+        timetable.earliest_arrival(B, C, hms('00:05:00'), timetable.active_mask(calendar, SUNDAY))
+
+
+def test_calendar_uses_next_day_service_before_midnight(timetable, calendar):
+    legs = timetable.earliest_arrival(A, D, hms('23:45:00'), timetable.active_mask(calendar, FRIDAY))
+    assert arrival(timetable, legs) == hms('25:00:00')
+    with pytest.raises(NoConnection):
+        timetable.earliest_arrival(A, D, hms('23:45:00'), timetable.active_mask(calendar, SATURDAY))
+
+
+def test_calendar_dates_remove_next_day_service(timetable):
+    week = {day: 1 for day in ServiceCalendar.WEEKDAYS}
+    weekly = pd.DataFrame([{'service_id': sid, 'start_date': '20260101', 'end_date': '20261231', **week}
+                           for sid in ('FRI', 'DAILY')])
+    removed = pd.DataFrame([{'service_id': 'DAILY', 'date': '20261017', 'exception_type': 2}])
+    calendar = ServiceCalendar.from_frames(weekly, removed)
+    active = timetable.active_mask(calendar, FRIDAY)
+    assert active.shape == (3 * len(timetable.services),)
+    with pytest.raises(NoConnection):
+        timetable.earliest_arrival(A, D, hms('23:45:00'), active)
+    # fără calendar toate cursele sunt active
+    assert timetable.active_mask(None, FRIDAY) is None
+    assert arrival(timetable, timetable.earliest_arrival(A, D, hms('23:45:00'))) == hms('25:00:00')
+
+
+def test_connections_sorted_with_shifted_copies(timetable):
+    # 3 conexiuni + 2 copii de -24 h (cursa 0) + 1 copie de +24 h (cursa 1)
+    assert timetable.num_connections == 6
+    assert np.all(np.diff(timetable.dep_time) >= 0)
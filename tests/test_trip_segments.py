@@ -0,0 +1,54 @@
+"""
+Tabela trip_segments: aceleași segmente ca join-ul pe stop_times, și folosită doar cât timp corespunde
+datelor GTFS din care a fost construită.
+"""
+import shutil
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import routing_engine
+import trip_segments
+
+TABLE, JOIN = 'table', 'join'
+
+
+@pytest.fixture
+def segments_db(gtfs_db, tmp_path):
+    path = tmp_path / 'gtfs.sqlite3'
+    shutil.copy(gtfs_db, path)
+    engine = create_engine(f"sqlite:///{path}")
+    trip_segments.build(engine)
+    return path, engine
+
+
+def picked(engine):
+    with engine.connect() as conn:
+        return trip_segments.pick(conn, TABLE, JOIN)
+
+
+def test_table_matches_join(segments_db):
+    _, engine = segments_db
+    with engine.connect() as conn:
+        rows = lambda query: sorted(map(tuple, conn.execute(text(query)).fetchall()))
+        assert rows(routing_engine.SEGMENTS_TABLE_QUERY) == rows(routing_engine.SEGMENTS_QUERY)
+
+
+def test_stale_table_falls_back_to_join(segments_db):
+    path, engine = segments_db
+    assert picked(engine) == TABLE
+    # reimport GTFS (aici: o oră schimbată) fără flask build-segments
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE stop_times SET arrival_time = '05:01:00', departure_time = '05:01:00' "
+                     "WHERE trip_id = 't0' AND stop_sequence = 1")
+    assert picked(engine) == JOIN
+    trip_segments.build(engine)
+    assert picked(engine) == TABLE
+
+
+def test_table_without_source_is_not_trusted(segments_db):
+    _, engine = segments_db
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {trip_segments.META_TABLE}"))
+    assert picked(engine) == JOIN
@@ -0,0 +1,144 @@
+"""
+Biletele active pentru portofel (/tickets) și arhivarea celor expirate.
+
+- ActiveTickets: cache per utilizator cu biletele încă valabile (index compus tickets(user_id, expire_time)
+  la citire). Cumpărarea invalidează intrarea utilizatorului; biletele care expiră între timp sunt filtrate
+  la citire, deci cache-ul nu trebuie invalidat la expirare.
+- archive_expired / ArchiveJob: mută periodic biletele expirate de mai mult de ARCHIVE_GRACE în
+  tickets_archive, pe loturi, ca tabela tickets să conțină doar biletele recente.
+"""
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, literal, select
+
+from caching import TTLCache, MISSING
+
+ACTIVE_CACHE_SIZE = 10000
+ACTIVE_CACHE_TTL = 60            # secunde; limitează cât de vechi poate fi cache-ul altui proces
+ARCHIVE_GRACE = timedelta(days=1)
+ARCHIVE_BATCH_ROWS = 5000
+ARCHIVE_INTERVAL_SECONDS = 3600
+
+# Ce afișează tickets.html, fără obiectul ORM (care nu poate fi ținut între cereri)
+ActiveTicket = namedtuple('ActiveTicket', 'id type price timestamp expire_time')
+
+
+class ActiveTickets:
+    """
+    user_id -> (momentul încărcării, biletele active la acel moment), în ordinea expirării (descrescător).
+    `changed_at` (de ex. din sesiunea utilizatorului) forțează reîncărcarea dacă utilizatorul a cumpărat
+    ceva după ce intrarea a fost încărcată, chiar dacă cumpărarea a fost servită de alt proces.
+    """
+
+    def __init__(self, ticket_model, maxsize=ACTIVE_CACHE_SIZE, ttl=ACTIVE_CACHE_TTL):
+        self.model = ticket_model
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = {}  # user_id -> numărul de invalidări, ca o încărcare începută înainte să nu fie salvată
+        self._lock = threading.Lock()
+
+    def get(self, user_id, now=None, changed_at=None):
+        now = now or datetime.now()
+        cached = self.cache.get(user_id)
+        if cached is MISSING or (changed_at is not None and cached[0] < changed_at):
+            with self._lock:
+                version = self._versions.get(user_id, 0)
+            loaded_at = time.time()
+            tickets = self._load(user_id, now)
+            with self._lock:
+                if self._versions.get(user_id, 0) == version:
+                    self.cache.set(user_id, (loaded_at, tickets))
+            cached = (loaded_at, tickets)
+        return [ticket for ticket in cached[1] if ticket.expire_time > now]
+
+    def _load(self, user_id, now):
+        Ticket = self.model
+        rows = (Ticket.query
+                .with_entities(Ticket.id, Ticket.type, Ticket.price, Ticket.timestamp, Ticket.expire_time)
+                .filter(Ticket.user_id == user_id, Ticket.expire_time > now)
+                .order_by(Ticket.expire_time.desc())
+                .all())
+        return [ActiveTicket(*row) for row in rows]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self.cache.pop(user_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def archive_expired(session, ticket_model, archive_model, before=None, batch=ARCHIVE_BATCH_ROWS):
+    """
+    Mută în arhivă biletele expirate înainte de `before` (implicit acum - ARCHIVE_GRACE), câte `batch`
+    pe tranzacție: INSERT ... SELECT în arhivă, apoi DELETE din tickets. Întoarce numărul de bilete mutate.
+    """
+    t0 = time.perf_counter()
+    before = before or datetime.now() - ARCHIVE_GRACE
+    tickets, archive = ticket_model.__table__, archive_model.__table__
+    columns = [c.name for c in tickets.columns]
+    total = 0
+    while True:
+        ids = [row[0] for row in session.execute(
+            select(tickets.c.id).where(tickets.c.expire_time < before).order_by(tickets.c.id).limit(batch))]
+        if not ids:
+            break
+        archived_at = literal(datetime.now(), archive.c.archived_at.type)
+        session.execute(insert(archive).from_select(
+            columns + ['archived_at'],
+            select(*[tickets.c[name] for name in columns], archived_at).where(tickets.c.id.in_(ids))))
+        session.execute(delete(tickets).where(tickets.c.id.in_(ids)))
+        session.commit()
+        total += len(ids)
+    if total:
+        print(f"   -> 🗄️ Bilete arhivate: {total} (expirate înainte de {before:%d.%m.%Y %H:%M}), "
+              f"{time.perf_counter() - t0:.1f} s")
+    return total
+
+
+class ArchiveJob:
+    """
+    Rulează archive_expired într-un thread, în contextul aplicației Flask: o dată la pornire (ca un
+    proces repornit des să arhiveze totuși), apoi la fiecare `interval` secunde
+    """
+
+    def __init__(self, app, db, ticket_model, archive_model, interval=ARCHIVE_INTERVAL_SECONDS):
+        self.app = app
+        self.db = db
+        self.ticket_model = ticket_model
+        self.archive_model = archive_model
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._run, name='ticket-archive', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                return archive_expired(self.db.session, self.ticket_model, self.archive_model)
+            except Exception:
+                # ex: alt proces arhivează aceleași bilete în același timp (cheie duplicată în arhivă)
+                self.db.session.rollback()
+                raise
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                traceback.print_exc()
+            if self._stop.wait(self.interval):
+                break
@@ -0,0 +1,267 @@
+"""
+Rutare pe orarul real (stop_times) cu Connection Scan Algorithm (CSA).
+
+Fiecare segment al unei curse (stație -> stația următoare, cu ora de plecare și de sosire) e o
+"conexiune". Conexiunile sunt sortate după ora de plecare în array-uri NumPy plate; o căutare
+parcurge o singură dată intervalul [ora cererii, sosirea cea mai bună] și dă sosirea cea mai devreme.
+Transferurile pe jos vin din muchiile 'walking' ale grafului (aceleași ca în modul graf).
+
+Fiecare conexiune ține service_id-ul cursei; o căutare pentru o anumită zi folosește doar cursele
+care circulă în acea zi după calendar / calendar_dates (ServiceCalendar). Fără calendar în feed,
+toate cursele sunt considerate active în fiecare zi (zile lucrătoare, weekend și sărbători amestecate).
+"""
+from datetime import date, datetime, timedelta
+from heapq import heappush, heappop
+
+import numpy as np
+import pandas as pd
+
+DAY = 86400
+
+# Cursele care trec de miezul nopții (ore GTFS >= 24:00) se copiază și cu -24 h, iar cele care
+# pleacă devreme (sub SHIFT_HORIZON) și cu +24 h, ca o căutare lângă miezul nopții să le vadă pe amândouă.
+SHIFT_HORIZON = 6 * 3600
+
+# O călătorie mai lungă de atât (de la ora cererii) nu mai e căutată
+MAX_JOURNEY = 4 * 3600
+
+# Array-urile unui Timetable, în ordinea parametrilor din __init__ (după stop_ids, lines, services)
+TIMETABLE_ARRAYS = ('dep_stop', 'arr_stop', 'dep_time', 'arr_time', 'trip', 'line', 'service',
+                    'foot_ptr', 'foot_stop', 'foot_time', 'foot_hub')
+
+
+class NoConnection(Exception):
+    """ Nicio călătorie nu ajunge la destinație în fereastra căutată """
+
+
+def time_to_seconds(values):
+    """ Orele GTFS ("HH:MM:SS", pot depăși 24:00), time, timedelta sau deja secunde -> secunde de la începutul zilei """
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s):
+        return s.to_numpy(dtype=np.int64)
+    if pd.api.types.is_timedelta64_dtype(s) or (len(s) and isinstance(s.iloc[0], timedelta)):
+        return pd.to_timedelta(s).dt.total_seconds().to_numpy(dtype=np.int64)
+    parts = s.astype(str).str.split(':', expand=True).astype(np.int64)
+    return (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy()
+
+
+def gtfs_date(value):
+    """ Data GTFS ("YYYYMMDD", întreg, "YYYY-MM-DD" sau date) -> date """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip().replace('-', '')[:8], '%Y%m%d').date()
+
+
+class ServiceCalendar:
+    """
+    Zilele în care circulă fiecare service_id: tabela `calendar` (zilele săptămânii între start_date și
+    end_date) plus excepțiile din `calendar_dates` (1 = adăugat în ziua respectivă, 2 = scos).
+    """
+
+    WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+    def __init__(self, weekly, exceptions):
+        self.weekly = weekly          # service_id -> (start, end, zilele săptămânii ca 7 bool)
+        self.exceptions = exceptions  # zi -> {service_id: 1 | 2}
+        self._active = {}
+
+    @classmethod
+    def from_frames(cls, calendar=None, calendar_dates=None):
+        """ Din tabelele GTFS citite cu pandas (oricare poate lipsi) """
+        weekly, exceptions = {}, {}
+        if calendar is not None:
+            for row in calendar.itertuples(index=False):
+                weekly[str(row.service_id)] = (gtfs_date(row.start_date), gtfs_date(row.end_date),
+                                               tuple(bool(int(getattr(row, day))) for day in cls.WEEKDAYS))
+        if calendar_dates is not None:
+            for row in calendar_dates.itertuples(index=False):
+                exceptions.setdefault(gtfs_date(row.date), {})[str(row.service_id)] = int(row.exception_type)
+        return cls(weekly, exceptions)
+
+    def active(self, day):
+        """ Mulțimea service_id-urilor care circulă în ziua `day` """
+        if day not in self._active:
+            running = {sid for sid, (start, end, weekdays) in self.weekly.items()
+                       if start <= day <= end and weekdays[day.weekday()]}
+            for sid, kind in self.exceptions.get(day, {}).items():
+                if kind == 1:
+                    running.add(sid)
+                elif kind == 2:
+                    running.discard(sid)
+            self._active[day] = running
+        return self._active[day]
+
+
+class Timetable:
+    """
+    Conexiunile orarului, sortate după dep_time. Stațiile sunt indici în `stop_ids` (aceeași ordine
+    ca nodurile fizice din CSRGraph), liniile indici în `lines`, cursele întregi, serviciile indici în
+    `services` (service_id din trips), deplasați cu len(services) pentru copiile de -24 h (ziua anterioară)
+    și cu 2 * len(services) pentru cele de +24 h (ziua următoare).
+    Transferurile pe jos sunt în format CSR: foot_stop/foot_time[foot_ptr[s]:foot_ptr[s+1]].
+    """
+
+    def __init__(self, stop_ids, lines, services, dep_stop, arr_stop, dep_time, arr_time, trip, line, service,
+                 foot_ptr, foot_stop, foot_time, foot_hub):
+        self.stop_ids = list(stop_ids)
+        self.lines = list(lines)
+        self.services = list(services)
+        self.dep_stop, self.arr_stop = dep_stop, arr_stop
+        self.dep_time, self.arr_time = dep_time, arr_time
+        self.trip, self.line, self.service = trip, line, service
+        self.foot_ptr, self.foot_stop, self.foot_time, self.foot_hub = foot_ptr, foot_stop, foot_time, foot_hub
+        self.stop_index = {sid: i for i, sid in enumerate(self.stop_ids)}
+
+        # memoryview-uri pentru bucla de scanare (scalari Python direct, fără obiecte NumPy)
+        self._dep_stop = memoryview(dep_stop)
+        self._arr_stop = memoryview(arr_stop)
+        self._dep_time = memoryview(dep_time)
+        self._arr_time = memoryview(arr_time)
+        self._trip = memoryview(trip)
+        self._service = memoryview(service)
+        self._foot_ptr = memoryview(foot_ptr)
+        self._foot_stop = memoryview(foot_stop)
+        self._foot_time = memoryview(foot_time)
+
+    @property
+    def num_connections(self):
+        return len(self.dep_time)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in TIMETABLE_ARRAYS)
+
+    @classmethod
+    def from_connections(cls, stop_ids, lines, services, dep_stop, arr_stop, dep_time, arr_time, trip, line, service,
+                         foot_src, foot_dst, foot_time, foot_hub):
+        """ Sortează conexiunile, adaugă copiile decalate cu o zi și construiește CSR-ul transferurilor """
+        dep_stop, arr_stop = np.asarray(dep_stop, dtype=np.int32), np.asarray(arr_stop, dtype=np.int32)
+        dep_time, arr_time = np.asarray(dep_time, dtype=np.int32), np.asarray(arr_time, dtype=np.int32)
+        trip, line = np.asarray(trip, dtype=np.int32), np.asarray(line, dtype=np.int32)
+        service = np.asarray(service, dtype=np.int32)
+        n_services = len(services)
+
+        # copiile se fac pe curse întregi, ca o cursă să poată fi urmată până la capăt
+        n_trips = int(trip.max()) + 1 if len(trip) else 0
+        trip_first = np.full(n_trips, np.iinfo(np.int32).max, dtype=np.int32)
+        trip_last = np.full(n_trips, -1, dtype=np.int32)
+        np.minimum.at(trip_first, trip, dep_time)
+        np.maximum.at(trip_last, trip, dep_time)
+        late = trip_last[trip] >= DAY
+        early = trip_first[trip] < SHIFT_HORIZON
+        cols = [dep_stop, arr_stop, dep_time, arr_time, trip, line, service]
+        copies = [cols,
+                  [dep_stop[late], arr_stop[late], dep_time[late] - DAY, arr_time[late] - DAY,
+                   trip[late] + n_trips, line[late], service[late] + n_services],
+                  [dep_stop[early], arr_stop[early], dep_time[early] + DAY, arr_time[early] + DAY,
+                   trip[early] + 2 * n_trips, line[early], service[early] + 2 * n_services]]
+        dep_stop, arr_stop, dep_time, arr_time, trip, line, service = (np.concatenate(parts) for parts in zip(*copies))
+
+        order = np.lexsort((arr_time, dep_time))
+        foot_src = np.asarray(foot_src, dtype=np.int64)
+        foot_order = np.argsort(foot_src, kind='stable')
+        foot_ptr = np.zeros(len(stop_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(foot_src, minlength=len(stop_ids)), out=foot_ptr[1:])
+
+        return cls(
+            stop_ids, lines, services,
+            dep_stop[order], arr_stop[order], dep_time[order], arr_time[order], trip[order], line[order],
+            service[order],
+            foot_ptr,
+            np.asarray(foot_dst, dtype=np.int32)[foot_order],
+            np.asarray(foot_time, dtype=np.int32)[foot_order],
+            np.asarray(foot_hub, dtype=np.uint8)[foot_order],
+        )
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in TIMETABLE_ARRAYS}
+
+    def active_mask(self, calendar, day):
+        """
+        Ce coduri de serviciu circulă pentru o căutare în ziua `day` (argumentul `active` din
+        earliest_arrival): conexiunile originale după ziua `day`, copiile de -24 h după ziua anterioară,
+        cele de +24 h după ziua următoare. None (toate active) dacă nu există calendar.
+        """
+        if calendar is None:
+            return None
+        days = (day, day - timedelta(days=1), day + timedelta(days=1))
+        return np.array([sid in calendar.active(d) for d in days for sid in self.services], dtype=bool)
+
+    def earliest_arrival(self, source, target, t, active=None):
+        """
+        CSA de la stația `source` la ora `t` (secunde) către `target` (indici de stații).
+        `active` (din active_mask) limitează căutarea la cursele care circulă în ziua cerută.
+        Întoarce etapele călătoriei, în ordine:
+          ('ride', [conexiuni ale aceleiași curse]) sau ('walk', din_stație, în_stație, secunde, hub).
+        """
+        dep_stop, arr_stop = self._dep_stop, self._arr_stop
+        dep_time, arr_time, trip, service = self._dep_time, self._arr_time, self._trip, self._service
+        running = None if active is None else active.tolist()
+        foot_ptr, foot_stop, foot_time = self._foot_ptr, self._foot_stop, self._foot_time
+
+        inf = t + MAX_JOURNEY
+        earliest = [inf] * len(self.stop_ids)
+        came_from = {}  # stație -> ('ride', ultima conexiune) / ('walk', stație, index transfer)
+
+        def walk_from(stop):
+            # Dijkstra pe transferurile pe jos: se pot înlănțui, ca muchiile 'walking' din graf
+            heap = [(earliest[stop], stop)]
+            while heap:
+                tu, u = heappop(heap)
+                if tu > earliest[u]: continue
+                for f in range(foot_ptr[u], foot_ptr[u + 1]):
+                    tv = tu + foot_time[f]
+                    v = foot_stop[f]
+                    if tv < earliest[v]:
+                        earliest[v] = tv
+                        came_from[v] = ('walk', u, f)
+                        heappush(heap, (tv, v))
+
+        earliest[source] = t
+        walk_from(source)
+
+        boarded = {}  # cursă -> ultima conexiune parcursă
+        prev_conn = {}  # conexiune -> conexiunea anterioară a aceleiași curse (-1 = urcare)
+        for c in range(int(np.searchsorted(self.dep_time, t)), len(self.dep_time)):
+            dt = dep_time[c]
+            if dt >= earliest[target]: break
+            if running is not None and not running[service[c]]: continue
+
+            tr = trip[c]
+            last = boarded.get(tr)
+            if last is None:
+                if earliest[dep_stop[c]] > dt: continue
+                last = -1
+            prev_conn[c] = last
+            boarded[tr] = c
+
+            a, at = arr_stop[c], arr_time[c]
+            if at < earliest[a]:
+                earliest[a] = at
+                came_from[a] = ('ride', c)
+                walk_from(a)
+
+        if target != source and target not in came_from:
+            raise NoConnection(f"Nicio cursă {source} -> {target} în {MAX_JOURNEY // 3600} h")
+
+        legs = []
+        s = target
+        while s != source:
+            step = came_from[s]
+            if step[0] == 'walk':
+                _, u, f = step
+                legs.append(('walk', u, s, int(self.foot_time[f]), bool(self.foot_hub[f])))
+                s = u
+            else:
+                conns = []
+                c = step[1]
+                while c != -1:
+                    conns.append(c)
+                    c = prev_conn[c]
+                conns.reverse()
+                legs.append(('ride', conns))
+                s = int(self.dep_stop[conns[0]])
+        legs.reverse()
+        return legs
@@ -0,0 +1,149 @@
+"""
+Tabela materializată `trip_segments`: segmentele consecutive ale tuturor curselor (stație -> stația următoare).
+
+Graful (load_data / refresh_route_layers), orarul și harta live aveau fiecare self-join-ul
+`stop_times t1 JOIN stop_times t2 ON trip_id AND stop_sequence + 1`, fără niciun index care să-l ajute.
+Tabela se construiește o dată (`flask build-segments`, după fiecare import GTFS), cu orele deja în secunde
+și coordonatele stațiilor. Numele liniei NU e copiat: consumatorii fac join cu `routes` (câteva sute de
+rânduri), deci editarea / ștergerea unei rute din admin rămâne vizibilă fără reconstruirea tabelei.
+Dacă tabela lipsește, consumatorii folosesc în continuare join-ul pe stop_times.
+
+Tabela ține minte amprenta datelor sursă (stops, trips, stop_times) din care a fost construită, în
+`trip_segments_meta`; după un reimport GTFS fără `flask build-segments` amprenta nu mai corespunde și
+consumatorii revin la join, în loc să servească orarul vechi.
+"""
+import hashlib
+import time
+
+from sqlalchemy import inspect, text
+
+TABLE = 'trip_segments'
+META_TABLE = f'{TABLE}_meta'
+
+# Conținutul tabelelor mari care intră în amprenta datelor sursă (nu doar COUNT(*): un reimport cu același
+# număr de rânduri dar cu alte stații, secvențe sau ore trebuie să invalideze tabela și cache-ul grafului)
+FINGERPRINT_CONTENT = {
+    'trips': ('trip_id', 'route_id', 'trip_headsign', 'service_id'),
+    'stop_times': ('trip_id', 'stop_sequence', 'stop_id', 'arrival_time', 'departure_time'),
+}
+# Suma de control calculată în baza de date: suma (independentă de ordine) a primilor 60 de biți din md5-ul
+# fiecărui rând, plus numărul de rânduri
+CONTENT_CHECKSUM_SQL = {
+    'postgresql': ("SELECT COUNT(*), SUM(CAST(CAST('x' || substr(md5(CONCAT_WS('|', {columns})), 1, 15) AS bit(60))"
+                   " AS bigint)) FROM {table}"),
+}
+FINGERPRINT_CHUNK_ROWS = 50000  # celelalte dialecte (SQLite de test): rândurile se citesc pe bucăți
+
+# Orele GTFS (text "HH:MM:SS" care poate trece de 24:00, time sau interval) -> secunde, în SQL
+SECONDS_SQL = {
+    'postgresql': "CAST(EXTRACT(EPOCH FROM CAST({col} AS interval)) AS INTEGER)",
+    # doar pentru baze de test; "H:MM:SS" și "HH:MM:SS" au mereu MM:SS la final
+    'sqlite': ("CAST(substr({col}, 1, instr({col}, ':') - 1) AS INTEGER) * 3600"
+               " + CAST(substr({col}, -5, 2) AS INTEGER) * 60 + CAST(substr({col}, -2) AS INTEGER)"),
+}
+
+BUILD_QUERY = """
+    CREATE TABLE {table} AS
+    SELECT t1.trip_id, t1.stop_sequence, tr.route_id, tr.trip_headsign,
+           t1.stop_id AS start_stop, t2.stop_id AS end_stop,
+           {departure} AS departure_sec, {arrival} AS arrival_sec,
+           s1.stop_lat AS start_lat, s1.stop_lon AS start_lon,
+           s2.stop_lat AS end_lat, s2.stop_lon AS end_lon
+    FROM stop_times t1
+    JOIN stop_times t2 ON t1.trip_id = t2.trip_id AND t1.stop_sequence + 1 = t2.stop_sequence
+    JOIN trips tr ON t1.trip_id = tr.trip_id
+    LEFT JOIN stops s1 ON t1.stop_id = s1.stop_id
+    LEFT JOIN stops s2 ON t2.stop_id = s2.stop_id
+"""
+
+# Indexul care face self-join-ul (construcția tabelei și varianta fără tabelă) un index scan, nu un sort
+SOURCE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_stop_times_trip_seq ON stop_times (trip_id, stop_sequence)",
+)
+
+TABLE_INDEXES = (
+    f"CREATE UNIQUE INDEX ix_{TABLE}_trip_seq ON {TABLE} (trip_id, stop_sequence)",
+    # refresh_route_layers: segmentele unei singure linii
+    f"CREATE INDEX ix_{TABLE}_route ON {TABLE} (route_id)",
+)
+
+
+def content_checksum(conn, table, columns):
+    """
+    Rândurile care intră în amprentă pentru o tabelă mare: în PostgreSQL o sumă de control calculată
+    în baza de date (numărul de rânduri + suma md5-urilor pe rând), altfel toate rândurile, în ordine.
+    """
+    query = CONTENT_CHECKSUM_SQL.get(conn.dialect.name)
+    if query is not None:
+        return conn.execute(text(query.format(table=table, columns=", ".join(columns))))
+    return conn.execution_options(yield_per=FINGERPRINT_CHUNK_ROWS).execute(
+        text(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {', '.join(columns[:2])}"))
+
+
+def source_fingerprint(conn):
+    """ Amprenta datelor sursă: stații rând cu rând + conținutul trips / stop_times (hex sha256) """
+    h = hashlib.sha256()
+    for row in conn.execute(text("SELECT stop_id, stop_name, stop_lat, stop_lon FROM stops ORDER BY stop_id")):
+        h.update(repr(tuple(row)).encode())
+    for table, columns in FINGERPRINT_CONTENT.items():
+        h.update(table.encode())
+        for row in content_checksum(conn, table, columns):
+            h.update(repr(tuple(row)).encode())
+    return h.hexdigest()
+
+
+def has_table(conn):
+    return inspect(conn).has_table(TABLE)
+
+
+def built_from(conn):
+    """ Amprenta datelor sursă din care a fost construită tabela (None dacă nu e cunoscută) """
+    if not inspect(conn).has_table(META_TABLE):
+        return None
+    return conn.execute(text(f"SELECT source FROM {META_TABLE}")).scalar()
+
+
+def pick(conn, table_query, join_query, source=None):
+    """
+    Interogarea pe tabela materializată dacă există și e construită din datele curente, altfel cea cu
+    self-join. `source` e amprenta datelor curente (source_fingerprint), dacă apelantul o are deja.
+    """
+    if not has_table(conn):
+        return join_query
+    built = built_from(conn)
+    if built is not None and built == (source or source_fingerprint(conn)):
+        return table_query
+    print(f"⚠️ {TABLE} nu corespunde datelor GTFS curente (reimport fără `flask build-segments`?): "
+          f"se folosește join-ul pe stop_times")
+    return join_query
+
+
+def build(engine):
+    """
+    (Re)construiește tabela într-o singură tranzacție: tabela nouă se creează alături și o înlocuiește
+    pe cea veche doar la final, deci cititorii văd mereu o tabelă completă. Întoarce numărul de rânduri.
+    """
+    seconds = SECONDS_SQL.get(engine.dialect.name)
+    if seconds is None:
+        raise ValueError(f"Dialect SQL nesuportat pentru {TABLE}: {engine.dialect.name}")
+    staging = f"{TABLE}_new"
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        for ddl in SOURCE_INDEXES:
+            conn.execute(text(ddl))
+        source = source_fingerprint(conn)
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        conn.execute(text(BUILD_QUERY.format(table=staging,
+                                             departure=seconds.format(col='t1.departure_time'),
+                                             arrival=seconds.format(col='t2.arrival_time'))))
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"ALTER TABLE {staging} RENAME TO {TABLE}"))
+        for ddl in TABLE_INDEXES:
+            conn.execute(text(ddl))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (source TEXT NOT NULL)"))
+        conn.execute(text(f"DELETE FROM {META_TABLE}"))
+        conn.execute(text(f"INSERT INTO {META_TABLE} (source) VALUES (:source)"), {'source': source})
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar()
+    print(f"   -> 🧱 {TABLE}: {rows} segmente, {time.perf_counter() - t0:.1f} s")
+    return rows